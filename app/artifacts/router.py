@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from app.auth.config import current_user
+from app.auth.models import User
+from app.artifacts.service import (
+    ArtifactNotFound,
+    UpstreamError,
+    artifact_cache,
+    get_content_type,
+    is_allowed_client,
+    is_index,
+)
+
+router = APIRouter(
+    prefix="/artifacts",
+    tags=["artifacts"]
+)
+
+
+@router.get("/stats")
+async def get_artifact_cache_stats(
+        user: User = Depends(current_user),
+):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return artifact_cache.get_stats()
+
+
+# VMs fetch packages without gateway credentials, access is limited to the tenant networks instead
+@router.get("/{upstream}/{path:path}")
+async def get_artifact(
+        upstream: str,
+        path: str,
+        request: Request,
+):
+    if not is_allowed_client(request.client.host if request.client else None):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    content_type = get_content_type(path)
+    try:
+        if is_index(path):
+            body = await artifact_cache.get_index(upstream, path, request.url.query)
+            return Response(content=body, media_type=content_type)
+
+        file_path, stream, content_length = await artifact_cache.open_artifact(upstream, path)
+    except ArtifactNotFound:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    except UpstreamError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch artifact: {e}")
+
+    if file_path is not None:
+        return FileResponse(file_path, media_type=content_type)
+
+    headers = {'Content-Length': str(content_length)} if content_length is not None else {}
+    return StreamingResponse(stream, media_type=content_type, headers=headers)
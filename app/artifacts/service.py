@@ -0,0 +1,380 @@
+import asyncio
+import hashlib
+import ipaddress
+import mimetypes
+import os
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from app.config import settings
+
+READ_SIZE = 64 * 1024
+INDEX_SUFFIXES = ('/', '.html', 'repomd.xml', '.asc')
+
+
+class ArtifactNotFound(Exception):
+    pass
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f'Upstream responded with {status_code}')
+        self.status_code = status_code
+
+
+class _Download:
+    def __init__(self, path: str):
+        self.path = path
+        self.written = 0
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.headers: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.changed = asyncio.Condition()
+
+
+class _CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.index_hits = 0
+        self.index_misses = 0
+        self.bytes_served_from_cache = 0
+        self.bytes_fetched = 0
+        self.evictions = 0
+
+
+def is_index(path: str) -> bool:
+    return path == '' or path.endswith(INDEX_SUFFIXES)
+
+
+def get_content_type(path: str) -> str:
+    if path == '' or path.endswith('/'):
+        return 'text/html'
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def is_allowed_client(host: Optional[str]) -> bool:
+    if not settings.artifact_allowed_networks:
+        return True
+    if host is None:
+        return False
+
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+
+    return any(
+        address in ipaddress.ip_network(network) for network in settings.artifact_allowed_networks
+    )
+
+
+# Pull-through cache for the package repositories VMs install from, served on the tenant network.
+# Packages are immutable and kept on disk under a size limit with LRU eviction; index pages and
+# repo metadata change upstream and are only reused for a short TTL. A package that is still
+# downloading is streamed to every client asking for it from the growing file, so the uplink
+# carries each artifact once. Disk access runs in threads, the event loop only keeps the index.
+class ArtifactCache:
+    def __init__(
+            self,
+            root: str,
+            max_size: int,
+            index_ttl: int,
+            upstreams: dict[str, str],
+            public_url: str,
+    ):
+        self.root = root
+        self.max_size = max_size
+        self.index_ttl = index_ttl
+        self.upstreams = upstreams
+        self.public_url = public_url.rstrip('/')
+
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._downloads: dict[str, _Download] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._index_locks: dict[str, asyncio.Lock] = {}
+        self._stats = _CacheStats()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        files = await asyncio.to_thread(self._scan_files)
+        # rebuild the LRU order from modification times, which are bumped on every hit
+        self._entries.clear()
+        self._size = 0
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+        await self._evict()
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=httpx.Timeout(settings.artifact_upstream_timeout),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_upstream_url(self, upstream: str, path: str) -> str:
+        base = self.upstreams.get(upstream)
+        if base is None or '..' in path.split('/'):
+            raise ArtifactNotFound(f'{upstream}/{path}')
+
+        return f'{base.rstrip("/")}/{path}'
+
+    async def get_index(self, upstream: str, path: str, query: str = '') -> bytes:
+        url = self.get_upstream_url(upstream, path)
+        if query:
+            url = f'{url}?{query}'
+        key = self._key(upstream, url)
+        file_path = os.path.join(self.root, 'index', key)
+
+        lock = self._index_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            body = await asyncio.to_thread(self._read_fresh, file_path)
+            if body is not None:
+                self._stats.index_hits += 1
+                return body
+
+            self._stats.index_misses += 1
+            response = await self._client.get(url)
+            if response.status_code != 200:
+                raise UpstreamError(response.status_code)
+
+            body = self._rewrite(response.content)
+            self._stats.bytes_fetched += len(response.content)
+            await asyncio.to_thread(self._write_atomic, file_path, body)
+            return body
+
+    async def open_artifact(
+            self,
+            upstream: str,
+            path: str,
+    ) -> (Optional[str], Optional[AsyncIterator[bytes]], Optional[int]):
+        # returns the cached file path, or a stream of a download in progress and its length
+        url = self.get_upstream_url(upstream, path)
+        key = self._key(upstream, url)
+        file_path = self._path(key)
+
+        if await self._is_cached(key, file_path):
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            self._stats.bytes_served_from_cache += self._entries[key]
+            return file_path, None, None
+
+        self._stats.misses += 1
+        download = self._downloads.get(key)
+        if download is None:
+            download = _Download(os.path.join(self.root, 'tmp', f'{key}.{os.getpid()}'))
+            self._downloads[key] = download
+            task = asyncio.create_task(self._download(key, url, download))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        content_length = await download.headers
+        return None, self._tail(download), content_length
+
+    async def _download(self, key: str, url: str, download: _Download):
+        file_path = self._path(key)
+        try:
+            # identity keeps the stored bytes equal to the upstream file and its length
+            headers = {'Accept-Encoding': 'identity'}
+            async with self._client.stream('GET', url, headers=headers) as response:
+                if response.status_code != 200:
+                    raise UpstreamError(response.status_code)
+
+                content_length = response.headers.get('content-length')
+                file = await asyncio.to_thread(open, download.path, 'wb')
+                download.headers.set_result(int(content_length) if content_length else None)
+
+                try:
+                    async for chunk in response.aiter_bytes(READ_SIZE):
+                        await asyncio.to_thread(_append, file, chunk)
+                        download.written += len(chunk)
+                        self._stats.bytes_fetched += len(chunk)
+                        async with download.changed:
+                            download.changed.notify_all()
+                finally:
+                    await asyncio.to_thread(file.close)
+
+            await asyncio.to_thread(_move, download.path, file_path)
+            download.path = file_path
+            await self._add_entry(key, download.written)
+        except Exception as e:
+            settings.error_logger.error(f'Failed to download artifact {url}: {e}')
+            download.error = e
+            if not download.headers.done():
+                download.headers.set_exception(e)
+            await asyncio.to_thread(_remove_files, [download.path])
+        finally:
+            download.done = True
+            self._downloads.pop(key, None)
+            async with download.changed:
+                download.changed.notify_all()
+
+    async def _tail(self, download: _Download) -> AsyncIterator[bytes]:
+        file = await asyncio.to_thread(open, download.path, 'rb')
+        try:
+            position = 0
+            while True:
+                if position < download.written:
+                    size = min(READ_SIZE, download.written - position)
+                    chunk = await asyncio.to_thread(file.read, size)
+                    position += len(chunk)
+                    yield chunk
+                    continue
+
+                if download.error is not None:
+                    raise download.error
+                if download.done:
+                    return
+
+                async with download.changed:
+                    await download.changed.wait_for(
+                        lambda: download.written > position or download.done
+                    )
+        finally:
+            # no await here, the generator may be closed without its consumer
+            file.close()
+
+    async def _is_cached(self, key: str, file_path: str) -> bool:
+        # every worker keeps its own index of the shared directory. Downloads are renamed into place
+        # once complete, so a file another worker fetched is adopted and one it evicted is dropped
+        size = await asyncio.to_thread(_touch, file_path)
+        if size is None:
+            self._remove_entry(key)
+            return False
+
+        if key not in self._entries:
+            await self._add_entry(key, size)
+        return True
+
+    def _remove_entry(self, key: str):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._size -= size
+
+    async def _add_entry(self, key: str, size: int):
+        if key in self._entries:
+            self._size -= self._entries[key]
+        self._entries[key] = size
+        self._entries.move_to_end(key)
+        self._size += size
+        await self._evict()
+
+    async def _evict(self):
+        evicted = []
+        while self._size > self.max_size and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self._stats.evictions += 1
+            evicted.append(self._path(key))
+
+        if evicted:
+            await asyncio.to_thread(_remove_files, evicted)
+
+    def _scan_files(self) -> list[tuple[float, str, int]]:
+        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+        files = []
+        for directory, _, names in os.walk(self.root):
+            if os.path.basename(directory) in ('tmp', 'index'):
+                continue
+            for name in names:
+                file_path = os.path.join(directory, name)
+                stat = os.stat(file_path)
+                files.append((stat.st_mtime, name, stat.st_size))
+
+        return files
+
+    def _rewrite(self, body: bytes) -> bytes:
+        # absolute links to known upstreams, like pypi's links to files.pythonhosted.org, go through
+        # the cache
+        for name, base in self.upstreams.items():
+            cached = f'{self.public_url}/{name}/'.encode()
+            body = body.replace(base.rstrip('/').encode() + b'/', cached)
+        return body
+
+    def _read_fresh(self, file_path: str) -> Optional[bytes]:
+        try:
+            if time.time() - os.stat(file_path).st_mtime >= self.index_ttl:
+                return None
+            with open(file_path, 'rb') as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def _write_atomic(self, file_path: str, body: bytes):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = f'{file_path}.{os.getpid()}'
+        with open(tmp_path, 'wb') as file:
+            file.write(body)
+        os.replace(tmp_path, file_path)
+
+    def _key(self, upstream: str, url: str) -> str:
+        return f'{upstream}-{hashlib.sha256(url.encode()).hexdigest()}'
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[-2:], key)
+
+    def get_stats(self) -> dict:
+        stats = self._stats
+        requests = stats.hits + stats.misses
+        return {
+            'entries': len(self._entries),
+            'size': self._size,
+            'max_size': self.max_size,
+            'hits': stats.hits,
+            'misses': stats.misses,
+            'hit_rate': round(stats.hits / requests, 4) if requests else 0.0,
+            'index_hits': stats.index_hits,
+            'index_misses': stats.index_misses,
+            'bytes_served_from_cache': stats.bytes_served_from_cache,
+            'bytes_fetched': stats.bytes_fetched,
+            'evictions': stats.evictions,
+            'downloads_in_progress': len(self._downloads),
+        }
+
+
+def _touch(file_path: str) -> Optional[int]:
+    # size of a cached file, its modification time is bumped to keep the LRU order across restarts
+    try:
+        size = os.stat(file_path).st_size
+        os.utime(file_path)
+    except OSError:
+        return None
+
+    return size
+
+
+def _append(file, chunk: bytes):
+    file.write(chunk)
+    # readers tail the growing file
+    file.flush()
+
+
+def _move(source: str, destination: str):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(source, destination)
+
+
+def _remove_files(file_paths: list[str]):
+    for file_path in file_paths:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+
+artifact_cache = ArtifactCache(
+    root=settings.artifact_cache_dir,
+    max_size=settings.artifact_cache_max_size,
+    index_ttl=settings.artifact_index_ttl,
+    upstreams=settings.artifact_upstreams,
+    public_url=settings.artifact_cache_url,
+)
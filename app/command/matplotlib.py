@@ -1,4 +1,5 @@
 from app.command.command import CommandInterface, ExecAction
+from app.command.mirrors import dnf_options, pip_options
 
 
 class MatplotlibCommand(CommandInterface):
@@ -10,8 +11,8 @@ class MatplotlibCommand(CommandInterface):
     def get_commands(self):
         if self.action == ExecAction.INSTALL:
             return [
-                'sudo dnf install -y pip',
-                'pip install matplotlib',
+                f'sudo dnf install -y{dnf_options()} pip',
+                f'pip install{pip_options()} matplotlib',
             ]
         else:
             return [
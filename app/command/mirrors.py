@@ -0,0 +1,38 @@
+from urllib.parse import urlparse
+
+from app.config import settings
+
+
+# Install options pointing pip and dnf at the gateway's artifact cache when one is configured.
+def pip_options() -> str:
+    if not settings.artifact_cache_url:
+        return ''
+
+    host = urlparse(settings.artifact_cache_url).hostname
+    return f' --index-url {settings.artifact_cache_url}/pypi/simple/ --trusted-host {host}'
+
+
+def pytorch_find_links(url: str) -> str:
+    if not settings.artifact_cache_url:
+        return url
+
+    return url.replace('https://download.pytorch.org', f'{settings.artifact_cache_url}/pytorch')
+
+
+def dnf_options() -> str:
+    if not settings.artifact_cache_url:
+        return ''
+
+    # quoted so the shell leaves dnf's $releasever and $basearch alone
+    fedora = f'{settings.artifact_cache_url}/fedora'
+    return (
+        " --setopt=fedora.metalink="
+        f" --setopt='fedora.baseurl={fedora}/releases/$releasever/Everything/$basearch/os/'"
+        " --setopt=updates.metalink="
+        f" --setopt='updates.baseurl={fedora}/updates/$releasever/Everything/$basearch/'"
+    )
+
+
+def mongodb_baseurl() -> str:
+    base = settings.artifact_cache_url and f'{settings.artifact_cache_url}/mongodb'
+    return f'{base or "https://repo.mongodb.org"}/yum/redhat/\\$releasever/mongodb-org/4.4/x86_64/'
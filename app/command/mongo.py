@@ -1,4 +1,5 @@
 from app.command.command import CommandInterface, ExecAction
+from app.command.mirrors import dnf_options, mongodb_baseurl
 
 
 class MongoCommand(CommandInterface):
@@ -12,12 +13,12 @@ class MongoCommand(CommandInterface):
             return [
                 'echo "[mongodb-upstream]" | sudo tee /etc/yum.repos.d/mongodb.repo',
                 'echo "name=MongoDB Repository" | sudo tee -a /etc/yum.repos.d/mongodb.repo',
-                'echo "baseurl=https://repo.mongodb.org/yum/redhat/\$releasever/mongodb-org/4.4/x86_64/" | sudo tee -a /etc/yum.repos.d/mongodb.repo',
+                f'echo "baseurl={mongodb_baseurl()}" | sudo tee -a /etc/yum.repos.d/mongodb.repo',
                 'echo "gpgcheck=1" | sudo tee -a /etc/yum.repos.d/mongodb.repo',
                 'echo "enabled=1" | sudo tee -a /etc/yum.repos.d/mongodb.repo',
                 'echo "gpgkey=https://www.mongodb.org/static/pgp/server-4.4.asc" | sudo tee -a /etc/yum.repos.d/mongodb.repo',
-                'sudo dnf update',
-                'sudo dnf install mongodb-org',
+                'sudo dnf -y update',
+                f'sudo dnf install -y{dnf_options()} mongodb-org',
                 'sudo systemctl start mongod',
                 'sudo systemctl enable mongod',
                 'mongod --version',
@@ -25,7 +26,7 @@ class MongoCommand(CommandInterface):
         else:
             return [
                 'sudo systemctl stop mongod',
-                'sudo dnf remove mongodb-org',
+                'sudo dnf -y remove mongodb-org',
                 'sudo rm -r /var/log/mongodb',
                 'sudo rm -r /var/lib/mongo',
                 'sudo userdel mongodb',
@@ -10,7 +10,7 @@ class PostgresCommand(CommandInterface):
     def get_commands(self):
         if self.action == ExecAction.INSTALL:
             return [
-                'sudo dnf install postgresql-server postgresql-contrib',
+                'sudo dnf -y install postgresql-server postgresql-contrib',
                 'sudo systemctl enable postgresql',
                 'sudo postgresql-setup --initdb --unit postgresql',
                 'sudo systemctl start postgresql',
@@ -18,7 +18,7 @@ class PostgresCommand(CommandInterface):
         else:
             return [
                 'sudo systemctl stop postgresql',
-                'sudo dnf remove postgresql-server postgresql-client',
+                'sudo dnf -y remove postgresql-server postgresql-client',
                 'sudo rm -rf /var/lib/pgsql/',
                 'sudo userdel postgres',
                 'sudo groupdel postgres',
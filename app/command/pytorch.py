@@ -2,6 +2,9 @@ import asyncio
 import time
 
 from app.command.command import CommandInterface, ExecAction
+from app.command.mirrors import dnf_options, pip_options, pytorch_find_links
+
+TORCH_FIND_LINKS = 'https://download.pytorch.org/whl/cpu/torch_stable.html'
 
 
 class TorchCommand(CommandInterface):
@@ -13,14 +16,16 @@ class TorchCommand(CommandInterface):
     def get_commands(self):
         if self.action == ExecAction.INSTALL:
             return [
-                'sudo dnf install -y python3-pip'
-                'pip3 install -y torch==1.10.0+cpu torchvision==0.11.1+cpu torchaudio==0.10.0+cpu -f https://download.pytorch.org/whl/cpu/torch_stable.html',
+                f'sudo dnf install -y{dnf_options()} python3-pip',
+                f'pip3 install{pip_options()}'
+                ' torch==1.10.0+cpu torchvision==0.11.1+cpu torchaudio==0.10.0+cpu'
+                f' -f {pytorch_find_links(TORCH_FIND_LINKS)}',
             ]
         else:
             return [
-                'python - m pip uninstall - y torch'
-                'python - m pip uninstall - y torchvision'
-                'python - m pip uninstall - y torchaudio'
+                'python -m pip uninstall -y torch',
+                'python -m pip uninstall -y torchvision',
+                'python -m pip uninstall -y torchaudio',
             ]
 
     def get_tag(self) -> str:
@@ -1,4 +1,5 @@
 from app.command.command import CommandInterface, ExecAction
+from app.command.mirrors import dnf_options, pip_options
 
 
 class TensorflowCommand(CommandInterface):
@@ -10,8 +11,8 @@ class TensorflowCommand(CommandInterface):
     def get_commands(self):
         if self.action == ExecAction.INSTALL:
             return [
-                'sudo dnf install -y python3-pip',
-                'sudo dnf install -y tensorflow',
+                f'sudo dnf install -y{dnf_options()} python3-pip',
+                f'pip3 install{pip_options()} tensorflow',
             ]
         else:
             return ['python -m pip uninstall  -y tensorflow']
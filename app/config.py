@@ -1,3 +1,12 @@
+from app.log.service import LogPipeline
 from config import Settings
 
 settings = Settings()
+
+log_pipeline = LogPipeline(
+    settings.log_dir,
+    settings.log_level,
+    settings.log_levels,
+    settings.log_sampling,
+)
+log_pipeline.start()
@@ -0,0 +1,106 @@
+import datetime
+import uuid
+from typing import Optional
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.images.models import BakedImage
+from app.images.schemas import BakeStage
+from app.jobs.schemas import JobStatus
+
+
+async def insert_baked_image(
+        owner_id: uuid.UUID,
+        configuration_name: str,
+        tags: list[str],
+        commands: list[str],
+        session: AsyncSession,
+) -> BakedImage:
+    baked_image = BakedImage(
+        owner_id=owner_id,
+        configuration_name=configuration_name,
+        tags=sorted(tags),
+        commands=commands,
+        status=JobStatus.pending.value,
+        stages={stage.value: {'status': JobStatus.pending.value} for stage in BakeStage},
+    )
+    session.add(baked_image)
+    await session.commit()
+
+    return baked_image
+
+
+async def get_baked_image(
+        baked_image_id: uuid.UUID,
+        session: AsyncSession,
+) -> Optional[BakedImage]:
+    query = select(BakedImage).where(BakedImage.id == baked_image_id)
+    result = await session.execute(query)
+
+    return result.scalar_one_or_none()
+
+
+async def get_baked_images(session: AsyncSession) -> list[BakedImage]:
+    query = select(BakedImage).order_by(BakedImage.created_at.desc())
+    result = await session.execute(query)
+
+    return list(result.scalars().all())
+
+
+async def find_baked_image(
+        configuration_name: str,
+        tags: list[str],
+        session: AsyncSession,
+) -> Optional[BakedImage]:
+    # newest finished image of the configuration with exactly these tags
+    query = (
+        select(BakedImage)
+        .where(BakedImage.configuration_name == configuration_name)
+        .where(BakedImage.tags == sorted(set(tags)))
+        .where(BakedImage.status == JobStatus.succeeded.value)
+        .order_by(BakedImage.created_at.desc())
+        .limit(1)
+    )
+    result = await session.execute(query)
+
+    return result.scalar_one_or_none()
+
+
+async def update_baked_image(
+        baked_image_id: uuid.UUID,
+        session: AsyncSession,
+        **values,
+):
+    stmt = (
+        update(BakedImage)
+        .where(BakedImage.id == baked_image_id)
+        .values(**values, updated_at=func.now())
+    )
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def delete_baked_image(
+        baked_image_id: uuid.UUID,
+        session: AsyncSession,
+):
+    stmt = delete(BakedImage).where(BakedImage.id == baked_image_id)
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def fail_stale_baked_images(
+        stale_after: int,
+        session: AsyncSession,
+):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    threshold = now - datetime.timedelta(seconds=stale_after)
+    stmt = (
+        update(BakedImage)
+        .where(BakedImage.status.in_([JobStatus.pending.value, JobStatus.running.value]))
+        .where(BakedImage.updated_at < threshold)
+        .values(status=JobStatus.failed.value, error='Interrupted')
+    )
+    await session.execute(stmt)
+    await session.commit()
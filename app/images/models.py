@@ -0,0 +1,34 @@
+import uuid
+
+from sqlalchemy import Column, String, UUID, ForeignKey, ARRAY, DateTime, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.auth.models import Base
+
+
+class BakedImage(Base):
+    __tablename__ = "baked_image"
+    id = Column(UUID, primary_key=True, default=uuid.uuid4)
+    owner_id = Column(UUID, ForeignKey("user.id"), nullable=False)
+    configuration_name = Column(
+        String,
+        ForeignKey("server_config.name"),
+        nullable=False,
+        index=True,
+    )
+    # sorted, a create request matches on the exact set
+    tags = Column(ARRAY(String), nullable=False)
+    commands = Column(ARRAY(String), nullable=False)
+    status = Column(String, nullable=False)
+    stage = Column(String, nullable=True)
+    stages = Column(JSONB, nullable=False, default=dict)
+    builder_server_id = Column(UUID, nullable=True)
+    image_id = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
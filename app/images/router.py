@@ -0,0 +1,123 @@
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
+from openstack import connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.images.db_service as images_db
+import app.openstack.compute_service as openstack
+from app.auth.config import current_user
+from app.auth.models import User
+from app.dependencies import get_openstack_connection, get_async_session
+from app.images.schemas import BakedImage as BakedImageSchema, BakedImageCreate, BakedImageCreated
+from app.images.service import start_bake
+from app.jobs.schemas import JobStatus
+from app.openstack.executor import run_mutation
+from app.openstack.limits_service import compute_limits
+from app.servers.catalog_service import server_config_catalog
+
+router = APIRouter(
+    prefix="/images",
+    tags=["images"]
+)
+
+
+@router.get("/baked", response_model=list[BakedImageSchema])
+async def get_baked_images(
+        _: User = Depends(current_user),
+        session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        baked_images = await images_db.get_baked_images(session)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to list baked images: {e}")
+
+    return baked_images
+
+
+@router.post("/baked", status_code=202, response_model=BakedImageCreated)
+async def bake_image(
+        req: BakedImageCreate,
+        user: User = Depends(current_user),
+        conn: connection.Connection = Depends(get_openstack_connection),
+        session: AsyncSession = Depends(get_async_session),
+):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    try:
+        server_config = await server_config_catalog.get(req.configuration_name)
+        if server_config is None:
+            raise HTTPException(status_code=404, detail="Server configuration not found")
+
+        # the builder is a regular server while it runs
+        quota_error, flavor_size = await compute_limits.check_create(
+            conn,
+            server_config.flavor_id or server_config.flavor,
+        )
+        if quota_error:
+            raise HTTPException(status_code=409, detail=quota_error)
+        compute_limits.reserve(flavor_size)
+
+        baked_image = await images_db.insert_baked_image(
+            user.id,
+            server_config.name,
+            [tool.value for tool in req.tools],
+            [f'install_{tool.value}' for tool in req.tools],
+            session,
+        )
+        start_bake(baked_image.id, baked_image.stages, conn, user, server_config, req.tools)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to bake image: {e}")
+
+    return JSONResponse(
+        status_code=202,
+        content=BakedImageCreated(baked_image_id=baked_image.id).model_dump(mode='json'),
+        headers={'Location': f'/images/baked/{baked_image.id}'},
+    )
+
+
+@router.get("/baked/{baked_image_id}", response_model=BakedImageSchema)
+async def get_baked_image(
+        baked_image_id: uuid.UUID,
+        _: User = Depends(current_user),
+        session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        baked_image = await images_db.get_baked_image(baked_image_id, session)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get baked image: {e}")
+
+    if baked_image is None:
+        raise HTTPException(status_code=404, detail="Baked image not found")
+
+    return baked_image
+
+
+@router.delete("/baked/{baked_image_id}", status_code=204)
+async def delete_baked_image(
+        baked_image_id: uuid.UUID,
+        user: User = Depends(current_user),
+        conn: connection.Connection = Depends(get_openstack_connection),
+        session: AsyncSession = Depends(get_async_session),
+):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    try:
+        baked_image = await images_db.get_baked_image(baked_image_id, session)
+        if baked_image is None:
+            raise HTTPException(status_code=404, detail="Baked image not found")
+        if baked_image.status in (JobStatus.pending.value, JobStatus.running.value):
+            raise HTTPException(status_code=409, detail="Image is still baking")
+
+        if baked_image.image_id:
+            await run_mutation(openstack.delete_image, conn, baked_image.image_id)
+        await images_db.delete_baked_image(baked_image_id, session)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete baked image: {e}")
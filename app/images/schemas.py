@@ -0,0 +1,51 @@
+import datetime
+import uuid
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel, field_validator
+
+from app.jobs.schemas import JobStageState, JobStatus
+from app.servers.schemas import ServerToolEnum
+
+
+class BakeStage(str, Enum):
+    boot = "boot"
+    ssh = "ssh"
+    commands = "commands"
+    snapshot = "snapshot"
+    cleanup = "cleanup"
+
+
+class BakedImageCreate(BaseModel):
+    configuration_name: str
+    tools: list[ServerToolEnum]
+
+    @field_validator('tools')
+    @classmethod
+    def check_tools(cls, tools: list[ServerToolEnum]) -> list[ServerToolEnum]:
+        if not tools:
+            raise ValueError('at least one tool is required')
+        if len(set(tools)) != len(tools):
+            raise ValueError('tools must be unique')
+        return tools
+
+
+class BakedImage(BaseModel):
+    id: uuid.UUID
+    configuration_name: str
+    tags: list[str]
+    commands: list[str]
+    status: JobStatus
+    stage: Optional[BakeStage] = None
+    stages: dict[BakeStage, JobStageState]
+    builder_server_id: Optional[uuid.UUID] = None
+    image_id: Optional[str] = None
+    error: Optional[str] = None
+
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+
+class BakedImageCreated(BaseModel):
+    baked_image_id: uuid.UUID
@@ -0,0 +1,227 @@
+import asyncio
+import datetime
+import uuid
+from typing import Any, Awaitable, Optional
+
+from openstack import connection
+from openstack.compute.v2.server import Server as OpenStackServer
+from openstack.network.v2.floating_ip import FloatingIP as OpenstackFloatingIP
+
+import app.images.db_service as images_db
+import app.openstack.compute_service as openstack
+import app.openstack.network_service as network_service
+import app.servers.service as servers_service
+from app.auth.models import User
+from app.config import settings
+from app.database import async_session_maker
+from app.images.schemas import BakeStage
+from app.jobs.schemas import JobStatus
+from app.keystore.service import keystore
+from app.openstack.executor import run_mutation
+from app.openstack.limits_service import compute_limits
+from app.runner.service import submit_command, wait_for_execution
+from app.runner.ssh_pool import wait_for_ssh
+from app.servers.models import Server, ServerConfig
+from app.servers.resolver_service import ResolvedServerConfig
+from app.servers.schemas import ServerToolEnum
+
+# keeps references to in-flight bakes so they are not garbage collected
+_running_bakes: set[asyncio.Task] = set()
+
+
+class _BakeProgress:
+    def __init__(self, baked_image_id: uuid.UUID, stages: dict):
+        self.baked_image_id = baked_image_id
+        self.stages = dict(stages)
+
+    async def run_stage(self, stage: BakeStage, step: Awaitable, session) -> Any:
+        self._set(stage, status=JobStatus.running.value, started_at=_now())
+        await images_db.update_baked_image(
+            self.baked_image_id,
+            session,
+            status=JobStatus.running.value,
+            stage=stage.value,
+            stages=self.stages,
+        )
+
+        try:
+            result = await step
+        except Exception as e:
+            self._set(stage, status=JobStatus.failed.value, finished_at=_now(), error=str(e))
+            raise
+
+        self._set(stage, status=JobStatus.succeeded.value, finished_at=_now())
+        await images_db.update_baked_image(self.baked_image_id, session, stages=self.stages)
+        return result
+
+    def _set(self, stage: BakeStage, **values):
+        self.stages[stage.value] = {**self.stages.get(stage.value, {}), **values}
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def start_bake(
+        baked_image_id: uuid.UUID,
+        stages: dict,
+        conn: connection.Connection,
+        user: User,
+        server_config: ServerConfig,
+        tools: list[ServerToolEnum],
+):
+    task = asyncio.create_task(run_bake(baked_image_id, stages, conn, user, server_config, tools))
+    _running_bakes.add(task)
+    task.add_done_callback(_running_bakes.discard)
+
+
+# Boots a builder from the configuration's image, installs the tools with the regular command
+# classes over SSH, and snapshots it to Glance. The builder, its floating ip and keypair are always
+# removed.
+async def run_bake(
+        baked_image_id: uuid.UUID,
+        stages: dict,
+        conn: connection.Connection,
+        user: User,
+        server_config: ServerConfig,
+        tools: list[ServerToolEnum],
+):
+    progress = _BakeProgress(baked_image_id, stages)
+    name = f'bake-{server_config.name}-{str(baked_image_id)[:8]}'
+    keypair_name = f'image-builder-{baked_image_id}'
+    builder: Optional[OpenStackServer] = None
+    floating_ip: Optional[OpenstackFloatingIP] = None
+    error: Optional[str] = None
+
+    async def boot():
+        # builder and floating_ip are kept as soon as they exist, so cleanup finds them after a
+        # later failure
+        nonlocal builder, floating_ip
+        resolved_config = ResolvedServerConfig(server_config)
+        await resolved_config.ensure_resolved()
+
+        block_device_mapping = await servers_service.create_server_volume(
+            conn,
+            name,
+            resolved_config,
+        )
+        builder, _ = await servers_service.boot_server(
+            conn,
+            keypair_name,
+            name,
+            'Image builder',
+            resolved_config,
+            block_device_mapping,
+        )
+        floating_ip = await servers_service.assign_floating_ip(conn, builder, resolved_config)
+
+    async with async_session_maker() as session:
+        try:
+            await progress.run_stage(BakeStage.boot, boot(), session)
+            await images_db.update_baked_image(
+                baked_image_id,
+                session,
+                builder_server_id=builder.id,
+            )
+
+            ip_address = floating_ip.floating_ip_address if floating_ip else ""
+            if not ip_address:
+                raise RuntimeError('Builder has no floating ip')
+
+            await progress.run_stage(
+                BakeStage.ssh,
+                wait_for_ssh(ip_address, settings.ssh_ready_timeout),
+                session,
+            )
+            await progress.run_stage(
+                BakeStage.commands,
+                _install_tools(builder, ip_address, user, server_config, tools, keypair_name),
+                session,
+            )
+
+            image_id = await progress.run_stage(
+                BakeStage.snapshot,
+                run_mutation(
+                    openstack.create_server_snapshot,
+                    conn,
+                    builder.id,
+                    name,
+                    {
+                        'lite_stack_configuration': server_config.name,
+                        'lite_stack_tags': ','.join(sorted(tool.value for tool in tools)),
+                    },
+                ),
+                session,
+            )
+            await images_db.update_baked_image(baked_image_id, session, image_id=image_id)
+        except Exception as e:
+            settings.error_logger.error(f'Baking image {baked_image_id} failed: {e}')
+            error = str(e)
+            await session.rollback()
+
+        try:
+            await progress.run_stage(
+                BakeStage.cleanup,
+                _cleanup(conn, builder, floating_ip, keypair_name),
+                session,
+            )
+        except Exception as e:
+            settings.error_logger.error(
+                f'Failed to clean up builder of image {baked_image_id}: {e}'
+            )
+            await session.rollback()
+
+        status = JobStatus.failed if error else JobStatus.succeeded
+        await images_db.update_baked_image(
+            baked_image_id,
+            session,
+            status=status.value,
+            stage=None,
+            stages=progress.stages,
+            error=error,
+        )
+
+
+async def _install_tools(
+        builder: OpenStackServer,
+        ip_address: str,
+        user: User,
+        server_config: ServerConfig,
+        tools: list[ServerToolEnum],
+        keypair_name: str,
+):
+    # never added to the session, only carries what the runner needs to reach the builder
+    server = Server(openstack_id=builder.id, owner_id=user.id, image=server_config.image, tags=[])
+
+    for tool in tools:
+        async with async_session_maker() as session:
+            execution, runner = await submit_command(
+                server,
+                f'install_{tool.value}',
+                servers_service.get_install_executor(tool),
+                ip_address,
+                user.id,
+                None,
+                session,
+                keypair_name,
+            )
+
+        await runner.run()
+        execution = await wait_for_execution(execution.id)
+        if execution is None or execution.status != JobStatus.succeeded.value:
+            error = execution.error if execution else 'not found'
+            raise RuntimeError(f'Installing {tool.value} failed: {error}')
+
+
+async def _cleanup(
+        conn: connection.Connection,
+        builder: Optional[OpenStackServer],
+        floating_ip: Optional[OpenstackFloatingIP],
+        keypair_name: str,
+):
+    if floating_ip is not None:
+        await run_mutation(network_service.delete_floating_ip, conn, floating_ip.id)
+    if builder is not None:
+        await run_mutation(openstack.delete_server, conn, builder.id)
+    await keystore.delete_keypair(conn, keypair_name)
+    compute_limits.invalidate()
@@ -0,0 +1,147 @@
+import datetime
+import uuid
+from typing import Optional
+
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth.models import User
+from app.jobs.models import CommandBatch, ProvisioningJob
+from app.jobs.schemas import JobStage, JobStatus
+
+
+async def insert_job(
+        owner_id: uuid.UUID,
+        name: str,
+        description: str,
+        configuration_name: str,
+        session: AsyncSession,
+) -> ProvisioningJob:
+    job = ProvisioningJob(
+        owner_id=owner_id,
+        status=JobStatus.pending.value,
+        stages={stage.value: {'status': JobStatus.pending.value} for stage in JobStage},
+        name=name,
+        description=description,
+        configuration_name=configuration_name,
+    )
+    session.add(job)
+    await session.commit()
+
+    return job
+
+
+async def get_job(
+        job_id: uuid.UUID,
+        session: AsyncSession,
+) -> ProvisioningJob:
+    query = select(ProvisioningJob).where(ProvisioningJob.id == job_id)
+    result = await session.execute(query)
+
+    return result.scalar_one()
+
+
+async def get_user_job(
+        job_id: uuid.UUID,
+        user: User,
+        session: AsyncSession,
+) -> Optional[ProvisioningJob]:
+    query = select(ProvisioningJob).where(ProvisioningJob.id == job_id)
+
+    if not user.is_superuser:
+        query = query.where(ProvisioningJob.owner_id == user.id)
+
+    result = await session.execute(query)
+
+    return result.scalar_one_or_none()
+
+
+async def fail_stale_jobs(
+        stale_after: int,
+        session: AsyncSession,
+) -> list[ProvisioningJob]:
+    # a job whose worker died stops touching updated_at, running jobs keep it fresh
+    now = datetime.datetime.now(datetime.timezone.utc)
+    threshold = now - datetime.timedelta(seconds=stale_after)
+    stmt = (
+        update(ProvisioningJob)
+        .where(ProvisioningJob.status.in_([JobStatus.pending.value, JobStatus.running.value]))
+        .where(ProvisioningJob.updated_at < threshold)
+        .values(status=JobStatus.failed.value, error='Interrupted')
+        .returning(ProvisioningJob)
+    )
+    jobs = list(await session.scalars(stmt))
+
+    stmt = (
+        update(CommandBatch)
+        .where(CommandBatch.status.in_([JobStatus.pending.value, JobStatus.running.value]))
+        .where(CommandBatch.updated_at < threshold)
+        .values(status=JobStatus.failed.value)
+    )
+    await session.execute(stmt)
+    await session.commit()
+
+    return jobs
+
+
+async def update_job(
+        job_id: uuid.UUID,
+        session: AsyncSession,
+        **values,
+):
+    stmt = (
+        update(ProvisioningJob)
+        .where(ProvisioningJob.id == job_id)
+        .values(**values, updated_at=func.now())
+    )
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def insert_command_batch(
+        owner_id: uuid.UUID,
+        command: str,
+        concurrency: int,
+        targets: dict,
+        session: AsyncSession,
+) -> CommandBatch:
+    batch = CommandBatch(
+        owner_id=owner_id,
+        command=command,
+        status=JobStatus.pending.value,
+        concurrency=concurrency,
+        targets=targets,
+    )
+    session.add(batch)
+    await session.commit()
+
+    return batch
+
+
+async def get_user_command_batch(
+        batch_id: uuid.UUID,
+        user: User,
+        session: AsyncSession,
+) -> Optional[CommandBatch]:
+    query = select(CommandBatch).where(CommandBatch.id == batch_id)
+
+    if not user.is_superuser:
+        query = query.where(CommandBatch.owner_id == user.id)
+
+    result = await session.execute(query)
+
+    return result.scalar_one_or_none()
+
+
+async def update_command_batch(
+        batch_id: uuid.UUID,
+        session: AsyncSession,
+        **values,
+):
+    stmt = (
+        update(CommandBatch)
+        .where(CommandBatch.id == batch_id)
+        .values(**values, updated_at=func.now())
+    )
+    await session.execute(stmt)
+    await session.commit()
@@ -0,0 +1,47 @@
+import uuid
+
+from sqlalchemy import Column, String, UUID, ForeignKey, DateTime, Integer, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.auth.models import Base
+
+
+class ProvisioningJob(Base):
+    __tablename__ = "provisioning_job"
+    id = Column(UUID, primary_key=True, default=uuid.uuid4)
+    owner_id = Column(UUID, ForeignKey("user.id"), nullable=False, index=True)
+    status = Column(String, nullable=False)
+    stage = Column(String, nullable=True)
+    stages = Column(JSONB, nullable=False, default=dict)
+    name = Column(String, nullable=False)
+    description = Column(String, nullable=True)
+    configuration_name = Column(String, nullable=False)
+    server_id = Column(UUID, nullable=True)
+    # what the job created so far, the stale job sweep deletes it when the worker died
+    volume_id = Column(String, nullable=True)
+    floating_ip_id = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
+
+class CommandBatch(Base):
+    __tablename__ = "command_batch"
+    id = Column(UUID, primary_key=True, default=uuid.uuid4)
+    owner_id = Column(UUID, ForeignKey("user.id"), nullable=False, index=True)
+    command = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    concurrency = Column(Integer, nullable=False)
+    targets = Column(JSONB, nullable=False, default=dict)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
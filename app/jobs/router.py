@@ -0,0 +1,50 @@
+import uuid
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.jobs.db_service as jobs_db
+from app.auth.config import current_user
+from app.auth.models import User
+from app.dependencies import get_async_session
+from app.jobs.schemas import CommandBatch as CommandBatchSchema
+from app.jobs.schemas import ProvisioningJob as ProvisioningJobSchema
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+
+@router.get("/batches/{batch_id}", response_model=CommandBatchSchema)
+async def get_command_batch(
+        batch_id: uuid.UUID,
+        user: User = Depends(current_user),
+        session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        batch = await jobs_db.get_user_command_batch(batch_id, user, session)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get command batch: {e}")
+
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Command batch not found")
+
+    return CommandBatchSchema.create_from_batch(batch)
+
+
+@router.get("/{job_id}", response_model=ProvisioningJobSchema)
+async def get_job(
+        job_id: uuid.UUID,
+        user: User = Depends(current_user),
+        session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        job = await jobs_db.get_user_job(job_id, user, session)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get job: {e}")
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
@@ -0,0 +1,106 @@
+import datetime
+import uuid
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class JobStatus(str, Enum):
+    pending = "pending"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+    skipped = "skipped"
+
+
+class JobStage(str, Enum):
+    volume = "volume"
+    prepare = "prepare"
+    boot = "boot"
+    floating_ip = "floating_ip"
+    key_email = "key_email"
+    db_insert = "db_insert"
+
+
+class JobStageState(BaseModel):
+    status: JobStatus = JobStatus.pending
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+    error: Optional[str] = None
+
+
+class ProvisioningJob(BaseModel):
+    id: uuid.UUID
+    status: JobStatus
+    stage: Optional[JobStage] = None
+    stages: dict[JobStage, JobStageState]
+
+    name: str
+    description: Optional[str] = ""
+    configuration_name: str
+    server_id: Optional[uuid.UUID] = None
+    error: Optional[str] = None
+
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+
+class ProvisioningJobCreated(BaseModel):
+    job_id: uuid.UUID
+
+
+class CommandStepState(BaseModel):
+    index: int
+    command: str
+    status: JobStatus = JobStatus.pending
+    exit_code: Optional[int] = None
+    duration_ms: Optional[int] = None
+
+
+class CommandBatchTarget(BaseModel):
+    status: JobStatus = JobStatus.pending
+    execution_id: Optional[uuid.UUID] = None
+    steps: list[CommandStepState] = []
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+    error: Optional[str] = None
+
+
+class CommandBatch(BaseModel):
+    id: uuid.UUID
+    command: str
+    status: JobStatus
+    concurrency: int
+    targets: dict[uuid.UUID, CommandBatchTarget]
+
+    total: int
+    pending: int
+    running: int
+    succeeded: int
+    failed: int
+
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+    @classmethod
+    def create_from_batch(cls, batch) -> 'CommandBatch':
+        statuses = [target.get('status') for target in batch.targets.values()]
+        return cls(
+            id=batch.id,
+            command=batch.command,
+            status=batch.status,
+            concurrency=batch.concurrency,
+            targets=batch.targets,
+            total=len(statuses),
+            pending=statuses.count(JobStatus.pending.value),
+            running=statuses.count(JobStatus.running.value),
+            succeeded=statuses.count(JobStatus.succeeded.value),
+            failed=statuses.count(JobStatus.failed.value),
+            created_at=batch.created_at,
+            updated_at=batch.updated_at,
+        )
+
+
+class CommandBatchCreated(BaseModel):
+    batch_id: uuid.UUID
@@ -0,0 +1,395 @@
+import asyncio
+import datetime
+import uuid
+from typing import Any, Awaitable, Optional
+
+from openstack import connection
+
+import app.images.db_service as images_db
+import app.jobs.db_service as jobs_db
+import app.runner.db_service as runner_db
+import app.servers.db_service as db
+import app.servers.service as servers_service
+from app.auth.models import User
+from app.config import settings
+from app.database import async_session_maker
+from app.jobs.schemas import JobStage, JobStatus
+from app.openstack.config import connection_manager
+from app.openstack.executor import run_read
+from app.openstack.limits_service import compute_limits
+from app.openstack.models import get_os_default_user
+from app.runner.service import CommandRunner, wait_for_execution
+from app.servers.models import ServerConfig
+from app.servers.resolver_service import ResolvedServerConfig
+
+# keeps references to in-flight pipelines so they are not garbage collected
+_running_jobs: set[asyncio.Task] = set()
+
+
+class _JobProgress:
+    def __init__(self, job_id: uuid.UUID, stages: dict):
+        self.job_id = job_id
+        self.stages = dict(stages)
+        # stages running side by side report through the job's single session
+        self._lock = asyncio.Lock()
+
+    async def run_stage(self, stage: JobStage, step: Awaitable, session) -> Any:
+        self._set(stage, status=JobStatus.running.value, started_at=_now())
+        async with self._lock:
+            await jobs_db.update_job(
+                self.job_id,
+                session,
+                status=JobStatus.running.value,
+                stage=stage.value,
+                stages=self.stages,
+            )
+
+        try:
+            result = await step
+        except Exception as e:
+            self._set(stage, status=JobStatus.failed.value, finished_at=_now(), error=str(e))
+            raise
+
+        self._set(stage, status=JobStatus.succeeded.value, finished_at=_now())
+        async with self._lock:
+            await jobs_db.update_job(self.job_id, session, stages=self.stages)
+        return result
+
+    async def skip_stage(self, stage: JobStage, session):
+        self._set(stage, status=JobStatus.skipped.value)
+        async with self._lock:
+            await jobs_db.update_job(self.job_id, session, stages=self.stages)
+
+    async def fail(self, error: str, session):
+        # a stage started alongside the failed one may still be reporting
+        async with self._lock:
+            await session.rollback()
+            await jobs_db.update_job(
+                self.job_id,
+                session,
+                status=JobStatus.failed.value,
+                stages=self.stages,
+                error=error,
+            )
+
+    async def record(self, session, **values):
+        async with self._lock:
+            await jobs_db.update_job(self.job_id, session, **values)
+
+    def _set(self, stage: JobStage, **values):
+        self.stages[stage.value] = {**self.stages.get(stage.value, {}), **values}
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+async def _heartbeat(job_id: uuid.UUID):
+    # a stage can outlast the stale threshold, the sweep must not take the job for abandoned
+    while True:
+        await asyncio.sleep(settings.provisioning_job_stale_after / 3)
+        async with async_session_maker() as session:
+            await jobs_db.update_job(job_id, session)
+
+
+def start_provisioning_job(
+        job_id: uuid.UUID,
+        stages: dict,
+        conn: connection.Connection,
+        user: User,
+        name: str,
+        description: str,
+        server_config: ServerConfig,
+        image_id: Optional[str] = None,
+        tags: Optional[list[str]] = None,
+):
+    task = asyncio.create_task(
+        run_provisioning_job(
+            job_id,
+            stages,
+            conn,
+            user,
+            name,
+            description,
+            server_config,
+            image_id,
+            tags,
+        )
+    )
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+
+
+async def run_provisioning_job(
+        job_id: uuid.UUID,
+        stages: dict,
+        conn: connection.Connection,
+        user: User,
+        name: str,
+        description: str,
+        server_config: ServerConfig,
+        image_id: Optional[str] = None,
+        tags: Optional[list[str]] = None,
+):
+    progress = _JobProgress(job_id, stages)
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    volume_ids: list[str] = []
+    server_id: Optional[str] = None
+    floating_ip_id: Optional[str] = None
+
+    async with async_session_maker() as session:
+        try:
+            resolved_config = ResolvedServerConfig(server_config)
+            await resolved_config.ensure_resolved()
+
+            async def create_volume() -> list:
+                if image_id:
+                    # baked images restore their volume from the snapshot behind the image
+                    await progress.skip_stage(JobStage.volume, session)
+                    return []
+                block_device_mapping = await progress.run_stage(
+                    JobStage.volume,
+                    servers_service.create_server_volume(conn, name, resolved_config),
+                    session,
+                )
+                volume_ids.extend(servers_service.get_volume_ids(block_device_mapping))
+                if volume_ids:
+                    await progress.record(session, volume_id=volume_ids[0])
+                return block_device_mapping
+
+            # id lookups and the keypair don't wait for the volume. Both are awaited when one fails,
+            # so a volume cinder is still creating is recorded and deleted below
+            results = await asyncio.gather(
+                create_volume(),
+                progress.run_stage(
+                    JobStage.prepare,
+                    servers_service.prepare_boot(conn, str(user.id), resolved_config, image_id),
+                    session,
+                ),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            block_device_mapping, (boot_ids, key_pair) = results
+
+            openstack_server = await progress.run_stage(
+                JobStage.boot,
+                servers_service.launch_server(
+                    conn,
+                    name,
+                    description,
+                    resolved_config,
+                    key_pair,
+                    block_device_mapping,
+                    boot_ids,
+                    image_id,
+                ),
+                session,
+            )
+            server_id = openstack_server.id
+            await progress.record(session, server_id=server_id)
+
+            floating_ip = await progress.run_stage(
+                JobStage.floating_ip,
+                servers_service.assign_floating_ip(conn, openstack_server, resolved_config),
+                session,
+            )
+            if floating_ip is not None:
+                floating_ip_id = floating_ip.id
+                await progress.record(session, floating_ip_id=floating_ip_id)
+
+            public_ip_address = floating_ip.floating_ip_address if floating_ip else ""
+            if key_pair.private_key and settings.mail_username != "" and public_ip_address != "":
+                await progress.run_stage(
+                    JobStage.key_email,
+                    servers_service.send_keypair_email(
+                        user,
+                        key_pair,
+                        public_ip_address,
+                        get_os_default_user(server_config.image),
+                    ),
+                    session,
+                )
+            else:
+                await progress.skip_stage(JobStage.key_email, session)
+
+            await progress.run_stage(
+                JobStage.db_insert,
+                db.insert_user_server(
+                    openstack_server.id,
+                    user.id,
+                    server_config.image,
+                    session,
+                    tags,
+                ),
+                session,
+            )
+        except Exception as e:
+            settings.error_logger.error(f'Provisioning job {job_id} failed: {e}')
+            await progress.fail(str(e), session)
+            try:
+                await servers_service.delete_created_resources(
+                    conn,
+                    server_id,
+                    volume_ids,
+                    floating_ip_id,
+                )
+            except Exception as cleanup_error:
+                settings.error_logger.error(
+                    f'Failed to clean up provisioning job {job_id}: {cleanup_error}'
+                )
+            # drop the usage reserved when the job was accepted
+            compute_limits.invalidate()
+        else:
+            await jobs_db.update_job(job_id, session, status=JobStatus.succeeded.value, stage=None)
+        finally:
+            heartbeat.cancel()
+
+
+class _BatchProgress:
+    def __init__(self, batch_id: uuid.UUID, targets: dict, session):
+        self.batch_id = batch_id
+        self.targets = dict(targets)
+        self.session = session
+        # every runner reports through the batch's single session
+        self._lock = asyncio.Lock()
+
+    async def set(self, server_id: str, **values):
+        self.targets[server_id] = {**self.targets.get(server_id, {}), **values}
+        async with self._lock:
+            await jobs_db.update_command_batch(self.batch_id, self.session, targets=self.targets)
+
+
+def start_command_batch(
+        batch_id: uuid.UUID,
+        targets: dict,
+        executions: dict[str, tuple[uuid.UUID, Optional[CommandRunner]]],
+        concurrency: int,
+):
+    task = asyncio.create_task(run_command_batch(batch_id, targets, executions, concurrency))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+
+
+async def run_command_batch(
+        batch_id: uuid.UUID,
+        targets: dict,
+        executions: dict[str, tuple[uuid.UUID, Optional[CommandRunner]]],
+        concurrency: int,
+):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with async_session_maker() as session:
+        progress = _BatchProgress(batch_id, targets, session)
+
+        async def run_target(
+                server_id: str,
+                execution_id: uuid.UUID,
+                runner: Optional[CommandRunner],
+        ):
+            async with semaphore:
+                await progress.set(server_id, status=JobStatus.running.value, started_at=_now())
+                if runner is not None:
+                    await runner.run()
+                # coalesced targets follow the execution they joined
+                execution = await wait_for_execution(execution_id)
+
+                if execution is None or execution.status != JobStatus.succeeded.value:
+                    await progress.set(
+                        server_id,
+                        status=JobStatus.failed.value,
+                        finished_at=_now(),
+                        error=execution.error if execution else 'Command execution not found',
+                        steps=execution.steps if execution else [],
+                    )
+                else:
+                    await progress.set(
+                        server_id,
+                        status=JobStatus.succeeded.value,
+                        finished_at=_now(),
+                        steps=execution.steps,
+                    )
+
+        try:
+            # the targets now carry the execution ids they were queued with
+            await jobs_db.update_command_batch(
+                batch_id,
+                session,
+                status=JobStatus.running.value,
+                targets=progress.targets,
+            )
+            await asyncio.gather(*(
+                run_target(server_id, execution_id, runner)
+                for server_id, (execution_id, runner) in executions.items()
+            ))
+        except Exception as e:
+            settings.error_logger.error(f'Command batch {batch_id} failed: {e}')
+            await session.rollback()
+            await jobs_db.update_command_batch(batch_id, session, status=JobStatus.failed.value)
+        else:
+            statuses = [target.get('status') for target in progress.targets.values()]
+            status = JobStatus.failed if JobStatus.failed.value in statuses else JobStatus.succeeded
+            await jobs_db.update_command_batch(batch_id, session, status=status.value)
+
+
+# Fails provisioning jobs, command batches, executions and bakes whose worker died, and deletes what
+# the failed provisioning jobs had created. Every worker runs it, the conditional updates hand each
+# stale job to exactly one of them.
+class StaleJobSweeper:
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                settings.error_logger.error(f'Failed to sweep stale jobs: {e}')
+
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self):
+        async with async_session_maker() as session:
+            jobs = await jobs_db.fail_stale_jobs(settings.provisioning_job_stale_after, session)
+            await runner_db.fail_stale_executions(
+                settings.command_execution_timeout,
+                settings.command_queue_timeout,
+                session,
+            )
+            await images_db.fail_stale_baked_images(settings.image_bake_stale_after, session)
+
+        if not jobs:
+            return
+
+        conn = await run_read(connection_manager.get_connection)
+        for job in jobs:
+            try:
+                await servers_service.delete_created_resources(
+                    conn,
+                    job.server_id,
+                    [job.volume_id] if job.volume_id else [],
+                    job.floating_ip_id,
+                )
+            except Exception as e:
+                settings.error_logger.error(f'Failed to clean up provisioning job {job.id}: {e}')
+        compute_limits.invalidate()
+
+
+stale_job_sweeper = StaleJobSweeper(settings.stale_job_sweep_interval)
@@ -0,0 +1,47 @@
+from typing import Optional
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.keystore.models import StoredKeypair
+
+KEYSTORE_LOCK_ID = 720004
+
+
+async def lock_keypair(
+        name: str,
+        session: AsyncSession,
+):
+    # held until the end of the transaction, so only one node creates a given keypair
+    await session.execute(select(func.pg_advisory_xact_lock(KEYSTORE_LOCK_ID, func.hashtext(name))))
+
+
+async def get_keypair(
+        name: str,
+        session: AsyncSession,
+) -> Optional[StoredKeypair]:
+    result = await session.execute(select(StoredKeypair).where(StoredKeypair.name == name))
+
+    return result.scalar_one_or_none()
+
+
+async def save_keypair(
+        name: str,
+        public_key: str,
+        private_key: bytes,
+        session: AsyncSession,
+):
+    values = {'public_key': public_key, 'private_key': private_key}
+    stmt = insert(StoredKeypair).values(name=name, **values)
+    stmt = stmt.on_conflict_do_update(index_elements=[StoredKeypair.name], set_=values)
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def delete_keypair(
+        name: str,
+        session: AsyncSession,
+):
+    await session.execute(delete(StoredKeypair).where(StoredKeypair.name == name))
+    await session.commit()
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, LargeBinary, DateTime, func
+
+from app.auth.models import Base
+
+
+class StoredKeypair(Base):
+    __tablename__ = "keypair"
+    # same name as the nova keypair
+    name = Column(String, primary_key=True)
+    public_key = Column(String, nullable=False)
+    # fernet token of the private key
+    private_key = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,158 @@
+import asyncio
+import base64
+import hashlib
+import os
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import asyncssh
+from cryptography.fernet import Fernet
+from openstack import connection
+
+import app.keystore.db_service as keystore_db
+import app.openstack.compute_service as openstack
+from app.config import settings
+from app.database import async_session_maker
+from app.openstack.executor import run_mutation
+from config import Settings
+
+
+class PrivateKeyLost(Exception):
+    pass
+
+
+class Keypair(NamedTuple):
+    name: str
+    public_key: str
+    # only set when the keypair was just created, so the owner can be sent a copy once
+    private_key: Optional[str] = None
+
+
+def check_keystore_secret():
+    # a fernet key derived from the secret_key that ships with the code protects nothing
+    default_secret_key = Settings.model_fields['secret_key'].default
+    if not settings.keystore_secret and settings.secret_key == default_secret_key:
+        raise RuntimeError('keystore_secret is not set and secret_key is the default')
+
+
+def _get_fernet_key(secret: str) -> bytes:
+    # any secret works, fernet wants 32 url-safe base64 encoded bytes
+    return base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest())
+
+
+# Private keys of the nova keypairs the gateway logs in with, encrypted in the database so any
+# gateway node can run commands on any server. Parsed keys are kept in an LRU and the keypairs known
+# to exist in nova are remembered, so neither commands nor creates repeat the lookup.
+class Keystore:
+    def __init__(self, secret: str, cache_size: int, legacy_key_dir: str):
+        self.cache_size = cache_size
+        self.legacy_key_dir = legacy_key_dir
+
+        self._fernet = Fernet(_get_fernet_key(secret))
+        self._keys: OrderedDict[str, asyncssh.SSHKey] = OrderedDict()
+        self._public_keys: dict[str, str] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def ensure_keypair(self, conn: connection.Connection, name: str) -> Keypair:
+        public_key = self._public_keys.get(name)
+        if public_key is not None:
+            return Keypair(name, public_key)
+
+        async with self._locks.setdefault(name, asyncio.Lock()):
+            public_key = self._public_keys.get(name)
+            if public_key is not None:
+                return Keypair(name, public_key)
+
+            async with async_session_maker() as session:
+                await keystore_db.lock_keypair(name, session)
+                stored = await keystore_db.get_keypair(name, session)
+                if stored is not None:
+                    await session.commit()
+                    self._public_keys[name] = stored.public_key
+                    return Keypair(name, stored.public_key)
+
+                keypair, private_key = await self._create_keypair(conn, name)
+                await keystore_db.save_keypair(
+                    name,
+                    keypair.public_key,
+                    self.encrypt(private_key),
+                    session,
+                )
+
+        self._public_keys[name] = keypair.public_key
+        return keypair
+
+    async def _create_keypair(self, conn: connection.Connection, name: str) -> (Keypair, str):
+        nova_keypair = await run_mutation(openstack.create_keypair, conn, name)
+        private_key = nova_keypair.private_key
+        if private_key:
+            return Keypair(name, nova_keypair.public_key, private_key), private_key
+
+        private_key = self._read_legacy_key(name)
+        if private_key is not None:
+            # created before the keystore, the owner already got the key
+            return Keypair(name, nova_keypair.public_key), private_key
+
+        # the key may sit in the key directory of another node and the owner still holds it, so the
+        # keypair is never replaced here. an admin deletes it to have a new one created
+        settings.error_logger.error(
+            f'Private key of keypair {name} is neither in the keystore nor in {self.legacy_key_dir}'
+        )
+        raise PrivateKeyLost(f'Private key of keypair {name} is not in the keystore')
+
+    async def get_private_key(self, name: str) -> asyncssh.SSHKey:
+        key = self._keys.get(name)
+        if key is not None:
+            self._keys.move_to_end(name)
+            return key
+
+        async with async_session_maker() as session:
+            stored = await keystore_db.get_keypair(name, session)
+
+        if stored is not None:
+            private_key = self.decrypt(stored.private_key)
+        else:
+            private_key = self._read_legacy_key(name)
+            if private_key is None:
+                raise KeyError(f'No private key for keypair {name}')
+
+        key = asyncssh.import_private_key(private_key)
+        self._keys[name] = key
+        if len(self._keys) > self.cache_size:
+            self._keys.popitem(last=False)
+        return key
+
+    async def delete_keypair(self, conn: connection.Connection, name: str):
+        await run_mutation(openstack.delete_keypair, conn, name)
+        async with async_session_maker() as session:
+            await keystore_db.delete_keypair(name, session)
+        self.forget(name)
+
+    def forget(self, name: str):
+        self._keys.pop(name, None)
+        self._public_keys.pop(name, None)
+
+    def encrypt(self, data: str) -> bytes:
+        return self._fernet.encrypt(data.encode())
+
+    def decrypt(self, token: bytes) -> str:
+        return self._fernet.decrypt(token).decode()
+
+    def _read_legacy_key(self, name: str) -> Optional[str]:
+        # keys used to be kept on the disk of the node that created the server, user keys with a
+        # suffix
+        for file_name in (f'{name}_devstask', name):
+            try:
+                with open(os.path.join(self.legacy_key_dir, file_name)) as file:
+                    return file.read()
+            except OSError:
+                pass
+
+        return None
+
+
+keystore = Keystore(
+    secret=settings.keystore_secret or settings.secret_key,
+    cache_size=settings.keystore_cache_size,
+    legacy_key_dir=settings.keystore_legacy_key_dir,
+)
@@ -0,0 +1,46 @@
+import time
+from logging import getLogger
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+access_logger = getLogger('access_logger')
+
+
+# Plain ASGI instead of BaseHTTPMiddleware, streamed responses like artifact downloads pass through
+# untouched and the duration covers the whole body.
+class AccessLogMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, size
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            client = scope.get('client')
+            access_logger.info(
+                f"{scope['method']} {scope['path']} {status_code}",
+                extra={
+                    'method': scope['method'],
+                    'path': scope['path'],
+                    'status': status_code,
+                    'duration_ms': round((time.perf_counter() - started_at) * 1000, 2),
+                    'response_size': size,
+                    'client': client[0] if client else None,
+                },
+            )
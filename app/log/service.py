@@ -0,0 +1,130 @@
+import atexit
+import copy
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# attributes every LogRecord has, anything else was passed through `extra` and goes into the record
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+_traceback_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc_info'] = record.exc_text
+        if record.stack_info:
+            data['stack_info'] = record.stack_info
+
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    # keeps a share of the records below WARNING from noisy loggers, warnings and errors always pass
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        # longest prefix first, so openstack.compute can be sampled differently from openstack
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        for name, rate in self.rates:
+            if record.name == name or record.name.startswith(f'{name}.'):
+                return random.random() < rate
+
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # args and tracebacks may not survive until the listener gets to the record, both become
+        # text here. unlike the default the traceback stays out of the message
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# Log calls only put the record on a queue, the files are written by the listener's thread. Every
+# file gets JSON lines: GENERAL.log everything that passes the levels and sampling, ERROR.log,
+# INFO.log and ACCESS.log the records of their own logger.
+class LogPipeline:
+    def __init__(
+            self,
+            log_dir: str,
+            level: str,
+            levels: dict[str, str],
+            sampling: dict[str, float],
+    ):
+        self.log_dir = log_dir
+        self.level = level
+        self.levels = levels
+        self.sampling = sampling
+
+        self._queue = queue.SimpleQueue()
+        self._listener: Optional[QueueListener] = None
+
+    def start(self):
+        if self._listener is not None:
+            return
+
+        os.makedirs(self.log_dir, exist_ok=True)
+        formatter = JsonFormatter()
+        handlers = [self._file_handler('GENERAL', formatter)]
+        for name in ('error', 'info', 'access'):
+            handler = self._file_handler(name.upper(), formatter)
+            handler.addFilter(logging.Filter(f'{name}_logger'))
+            handlers.append(handler)
+
+        queue_handler = _QueueHandler(self._queue)
+        queue_handler.addFilter(SamplingFilter(self.sampling))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(self.level.upper())
+        for name, level in self.levels.items():
+            logging.getLogger(name).setLevel(level.upper())
+
+        self._listener = QueueListener(self._queue, *handlers)
+        self._listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        # flushes whatever is still queued
+        if self._listener is None:
+            return
+
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+
+    def _file_handler(self, name: str, formatter: logging.Formatter) -> logging.Handler:
+        handler = logging.FileHandler(f'{self.log_dir}/{name}.log')
+        handler.setFormatter(formatter)
+        return handler
@@ -1,17 +1,7 @@
-from fastapi_mail import ConnectionConfig
+from jinja2 import Environment, FileSystemLoader
 
-from app.config import settings
+TEMPLATE_FOLDER = './templates/'
+LOGO_PATH = './templates/logo.png'
+LOGO_CID = 'logo_image@fastapi-mail'
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME=settings.mail_from_name,
-    MAIL_STARTTLS=True,
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER='./templates/'
-)
+template_env = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER))
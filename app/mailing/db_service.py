@@ -0,0 +1,105 @@
+import datetime
+import uuid
+from typing import Any, Optional
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.jobs.schemas import JobStatus
+from app.mailing.models import OutboxMessage
+
+
+async def insert_outbox_message(
+        recipient: str,
+        subject: str,
+        template_name: str,
+        body: dict[str, Any],
+        attachments: Optional[bytes],
+        session: AsyncSession,
+) -> OutboxMessage:
+    message = OutboxMessage(
+        recipient=recipient,
+        subject=subject,
+        template_name=template_name,
+        body=body,
+        attachments=attachments,
+        status=JobStatus.pending.value,
+    )
+    session.add(message)
+    await session.commit()
+
+    return message
+
+
+async def claim_outbox_messages(
+        limit: int,
+        lease: int,
+        session: AsyncSession,
+) -> list[OutboxMessage]:
+    # senders on other workers skip the locked rows and take the next batch
+    due = (
+        select(OutboxMessage.id)
+        .where(OutboxMessage.status == JobStatus.pending.value)
+        .where(OutboxMessage.next_attempt_at <= func.now())
+        .order_by(OutboxMessage.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(due))
+        .values(
+            attempts=OutboxMessage.attempts + 1,
+            next_attempt_at=func.now() + datetime.timedelta(seconds=lease),
+        )
+        .returning(OutboxMessage)
+    )
+    messages = list(await session.scalars(stmt))
+    await session.commit()
+
+    return sorted(messages, key=lambda message: message.created_at)
+
+
+async def update_outbox_message(
+        message_id: uuid.UUID,
+        session: AsyncSession,
+        **values,
+):
+    stmt = update(OutboxMessage).where(OutboxMessage.id == message_id).values(**values)
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def retry_outbox_message(
+        message_id: uuid.UUID,
+        error: str,
+        delay: int,
+        session: AsyncSession,
+):
+    stmt = (
+        update(OutboxMessage)
+        .where(OutboxMessage.id == message_id)
+        .values(error=error, next_attempt_at=func.now() + datetime.timedelta(seconds=delay))
+    )
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def delete_outbox_messages(
+        message_ids: list[uuid.UUID],
+        session: AsyncSession,
+):
+    if not message_ids:
+        return
+
+    await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(message_ids)))
+    await session.commit()
+
+
+async def get_outbox_counts(
+        session: AsyncSession,
+) -> dict[str, int]:
+    query = select(OutboxMessage.status, func.count()).group_by(OutboxMessage.status)
+    result = await session.execute(query)
+
+    return {status: count for status, count in result.all()}
@@ -0,0 +1,28 @@
+import uuid
+
+from sqlalchemy import Column, String, UUID, Integer, LargeBinary, DateTime, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.auth.models import Base
+
+
+class OutboxMessage(Base):
+    __tablename__ = "mail_outbox"
+    id = Column(UUID, primary_key=True, default=uuid.uuid4)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    template_name = Column(String, nullable=False)
+    body = Column(JSONB, nullable=False, default=dict)
+    # fernet token of the attachment list, they carry private keys
+    attachments = Column(LargeBinary, nullable=True)
+    status = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, server_default='0')
+    error = Column(String, nullable=True)
+    # also the lease of a claimed message, a sender that dies mid-batch leaves it to be retried
+    next_attempt_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        index=True,
+    )
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.auth.config import current_user
+from app.auth.models import User
+from app.mailing.service import mail_outbox
+
+router = APIRouter(
+    prefix="/mail",
+    tags=["mail"]
+)
+
+
+@router.get("/outbox/stats")
+async def get_mail_outbox_stats(
+        user: User = Depends(current_user),
+):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    try:
+        return await mail_outbox.get_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get mail outbox stats: {e}")
@@ -1,26 +1,264 @@
-from typing import Any
-
-from fastapi import BackgroundTasks
-from fastapi_mail import MessageSchema, FastMail, MessageType
-
-from app.mailing.config import conf
-
-
-async def send_email(
-        background_tasks: BackgroundTasks,
-        subject: str,
-        email_to: str,
-        body: dict[str, Any],
-        files: list,
-        template_name: str,
-):
-    message = MessageSchema(
-        subject=subject,
-        recipients=[email_to],
-        template_body=body,
-        subtype=MessageType.html,
-        attachments=files
-    )
-
-    fm = FastMail(conf)
-    background_tasks.add_task(fm.send_message, message, template_name)
+import asyncio
+import json
+import time
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import Any, NamedTuple, Optional
+
+import aiosmtplib
+from jinja2 import Template
+
+import app.mailing.db_service as db
+from app.config import settings
+from app.database import async_session_maker
+from app.jobs.schemas import JobStatus
+from app.keystore.service import keystore
+from app.mailing.config import LOGO_CID, LOGO_PATH, template_env
+from app.mailing.models import OutboxMessage
+
+# errors after which the connection can't be trusted for the next message
+CONNECTION_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    ConnectionError,
+    OSError,
+)
+
+
+class Attachment(NamedTuple):
+    filename: str
+    content: str
+    mime_type: str = 'text'
+    mime_subtype: str = 'plain'
+
+
+class _OutboxStats:
+    def __init__(self):
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.connections = 0
+
+
+# Emails are written to the mail_outbox table and sent from here instead of from the request. One
+# SMTP connection is kept open while there is mail and reused for every message of a batch, failed
+# sends are retried with exponential backoff. Templates and the logo are loaded once on start,
+# attachments only ever exist in memory.
+class MailOutbox:
+    def __init__(
+            self,
+            interval: int,
+            batch_size: int,
+            max_attempts: int,
+            retry_backoff: int,
+            idle_timeout: int,
+            lease: int,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self.lease = lease
+
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._last_used = 0.0
+        self._templates: dict[str, Template] = {}
+        self._logo: Optional[bytes] = None
+        self._stats = _OutboxStats()
+
+    def start(self):
+        self._templates = {
+            name: template_env.get_template(name) for name in template_env.list_templates(['html'])
+        }
+        with open(LOGO_PATH, 'rb') as file:
+            self._logo = file.read()
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self._disconnect()
+
+    def wake(self):
+        self._wake.set()
+
+    async def enqueue(
+            self,
+            recipient: str,
+            subject: str,
+            template_name: str,
+            body: dict[str, Any],
+            attachments: list[Attachment],
+    ):
+        token = None
+        if attachments:
+            payload = json.dumps([attachment._asdict() for attachment in attachments])
+            token = keystore.encrypt(payload)
+        async with async_session_maker() as session:
+            await db.insert_outbox_message(recipient, subject, template_name, body, token, session)
+        self.wake()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.drain()
+            except Exception as e:
+                settings.error_logger.error(f'Failed to drain the mail outbox: {e}')
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                await self._disconnect()
+
+    async def drain(self):
+        while True:
+            async with async_session_maker() as session:
+                messages = await db.claim_outbox_messages(self.batch_size, self.lease, session)
+                if not messages:
+                    return
+
+                sent = []
+                unreachable = False
+                for message in messages:
+                    try:
+                        await self._send(message)
+                    except Exception as e:
+                        await self._retry_later(message, str(e), session)
+                        if isinstance(e, CONNECTION_ERRORS):
+                            # the rest of the batch is picked up again once its lease runs out
+                            unreachable = True
+                            break
+                    else:
+                        sent.append(message.id)
+                        self._stats.sent += 1
+
+                await db.delete_outbox_messages(sent, session)
+
+            if unreachable:
+                await self._disconnect()
+                return
+
+    async def _send(self, message: OutboxMessage):
+        smtp = await self._connect()
+        await smtp.send_message(self._build(message))
+        self._last_used = time.monotonic()
+
+    async def _retry_later(self, message: OutboxMessage, error: str, session):
+        if message.attempts >= self.max_attempts:
+            settings.error_logger.error(
+                f'Giving up on email {message.id} to {message.recipient}: {error}'
+            )
+            self._stats.failed += 1
+            await db.update_outbox_message(
+                message.id,
+                session,
+                status=JobStatus.failed.value,
+                error=error,
+                attachments=None,
+            )
+            return
+
+        delay = self.retry_backoff * 2 ** (message.attempts - 1)
+        settings.error_logger.error(
+            f'Failed to send email {message.id}, retrying in {delay}s: {error}'
+        )
+        self._stats.retried += 1
+        await db.retry_outbox_message(message.id, error, delay, session)
+
+    def _build(self, message: OutboxMessage) -> EmailMessage:
+        email = EmailMessage()
+        email['Subject'] = message.subject
+        email['From'] = formataddr((settings.mail_from_name, settings.mail_from))
+        email['To'] = message.recipient
+
+        html = self._templates[message.template_name].render(**message.body)
+        email.set_content(html, subtype='html')
+        if f'cid:{LOGO_CID}' in html:
+            email.add_related(
+                self._logo,
+                maintype='image',
+                subtype='png',
+                cid=f'<{LOGO_CID}>',
+                filename='logo.png',
+            )
+
+        if message.attachments:
+            for attachment in json.loads(keystore.decrypt(message.attachments)):
+                email.add_attachment(
+                    attachment['content'].encode(),
+                    maintype=attachment['mime_type'],
+                    subtype=attachment['mime_subtype'],
+                    filename=attachment['filename'],
+                )
+
+        return email
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        if self._smtp is not None and self._smtp.is_connected:
+            return self._smtp
+
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.mail_server,
+            port=settings.mail_port,
+            use_tls=settings.mail_ssl_tls,
+            start_tls=settings.mail_starttls,
+            validate_certs=settings.mail_validate_certs,
+            timeout=settings.mail_timeout,
+        )
+        await smtp.connect()
+        if settings.mail_use_credentials:
+            await smtp.login(settings.mail_username, settings.mail_password)
+
+        self._smtp = smtp
+        self._stats.connections += 1
+        return smtp
+
+    async def _disconnect(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is None or not smtp.is_connected:
+            return
+
+        try:
+            await smtp.quit()
+        except aiosmtplib.SMTPException:
+            smtp.close()
+
+    async def get_stats(self) -> dict:
+        async with async_session_maker() as session:
+            counts = await db.get_outbox_counts(session)
+
+        stats = self._stats
+        return {
+            'pending': counts.get(JobStatus.pending.value, 0),
+            'failed': counts.get(JobStatus.failed.value, 0),
+            'sent': stats.sent,
+            'retried': stats.retried,
+            'gave_up': stats.failed,
+            'connections': stats.connections,
+            'connected': self._smtp is not None and self._smtp.is_connected,
+        }
+
+
+mail_outbox = MailOutbox(
+    interval=settings.mail_outbox_interval,
+    batch_size=settings.mail_outbox_batch_size,
+    max_attempts=settings.mail_outbox_max_attempts,
+    retry_backoff=settings.mail_outbox_retry_backoff,
+    idle_timeout=settings.mail_smtp_idle_timeout,
+    lease=settings.mail_outbox_lease,
+)
@@ -1,15 +1,73 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.artifacts.router import router as artifacts_router
+from app.artifacts.service import artifact_cache
 from app.auth.config import auth_backend
 from app.auth.config import fastapi_users
 from app.auth.schemas import UserRead, UserCreate, UserUpdate
+from app.config import settings
 from app.dependencies import get_settings
+from app.images.router import router as images_router
+from app.jobs.router import router as jobs_router
+from app.jobs.service import stale_job_sweeper
+from app.keystore.service import check_keystore_secret
+from app.log.middleware import AccessLogMiddleware
+from app.mailing.router import router as mailing_router
+from app.mailing.service import mail_outbox
+from app.openstack.config import connection_manager
+from app.openstack.executor import openstack_executor
+from app.openstack.router import router as openstack_router
+from app.runner.ssh_pool import ssh_pool
+from app.servers.catalog_service import server_config_catalog
+from app.servers.pool_service import warm_pool
+from app.servers.resolver_service import server_config_resolver
 from app.servers.router import router as servers_router
+from app.servers.sync_service import server_state_synchronizer
 from config import APP_CONFIG, Settings
 from app.auth.router import router as user_router
 
-app = FastAPI(**APP_CONFIG)
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    check_keystore_secret()
+    openstack_executor.start()
+    try:
+        await run_in_threadpool(connection_manager.start)
+    except Exception as e:
+        settings.error_logger.error(f'Failed to connect to OpenStack on startup: {e}')
+
+    try:
+        await server_config_catalog.load()
+    except Exception as e:
+        settings.error_logger.error(f'Failed to load server configurations: {e}')
+
+    server_config_resolver.start()
+    server_state_synchronizer.start()
+    stale_job_sweeper.start()
+    ssh_pool.start()
+    if settings.artifact_cache_url:
+        await artifact_cache.start()
+    warm_pool.start()
+    mail_outbox.start()
+
+    yield
+
+    await mail_outbox.stop()
+    await warm_pool.stop()
+    await artifact_cache.close()
+    await ssh_pool.close()
+    await stale_job_sweeper.stop()
+    await server_state_synchronizer.stop()
+    await server_config_resolver.stop()
+    openstack_executor.shutdown()
+    await run_in_threadpool(connection_manager.close)
+
+
+app = FastAPI(**APP_CONFIG, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,6 +76,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(AccessLogMiddleware)
 
 app.include_router(
     fastapi_users.get_auth_router(auth_backend),
@@ -38,6 +97,12 @@ app.include_router(
 )
 
 app.include_router(servers_router)
+app.include_router(openstack_router)
+app.include_router(jobs_router)
+app.include_router(images_router)
+if settings.artifact_cache_url:
+    app.include_router(artifacts_router)
+app.include_router(mailing_router)
 
 
 @app.get('/', tags=['root'])
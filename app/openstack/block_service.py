@@ -1,5 +1,8 @@
+import json
+
 from openstack import connection
 from openstack.block_storage.v2.volume import Volume as OpenStackVolume
+from openstack.image.v2.image import Image as OpenStackImage
 
 
 def create_volume(
@@ -18,6 +21,14 @@ def create_volume(
     return volume
 
 
+def delete_volume(conn: connection.Connection, volume_id: str):
+    conn.block_storage.delete_volume(volume_id, ignore_missing=True)
+
+
+def delete_snapshot(conn: connection.Connection, snapshot_id: str):
+    conn.block_storage.delete_snapshot(snapshot_id, ignore_missing=True)
+
+
 def get_block_device_mapping(volume: OpenStackVolume) -> dict[str]:
     return {
         "boot_index": "0",
@@ -26,3 +37,24 @@ def get_block_device_mapping(volume: OpenStackVolume) -> dict[str]:
         "destination_type": "volume",
         "delete_on_termination": True
     }
+
+
+def get_image_block_device_mapping(image_id: str, size: int = 20) -> dict[str]:
+    # nova creates the volume itself, one per instance when several are launched at once
+    return {
+        "boot_index": "0",
+        "uuid": image_id,
+        "source_type": "image",
+        "destination_type": "volume",
+        "volume_size": size,
+        "delete_on_termination": True
+    }
+
+
+def get_image_snapshot_ids(image: OpenStackImage) -> list[str]:
+    # images of volume-backed servers only point at the cinder snapshots of their volumes
+    mapping = image.properties.get('block_device_mapping') or []
+    if isinstance(mapping, str):
+        mapping = json.loads(mapping)
+
+    return [device['snapshot_id'] for device in mapping if device.get('snapshot_id')]
@@ -1,6 +1,8 @@
 import time
+from typing import Optional
 
 from openstack import connection
+from openstack.exceptions import ResourceNotFound
 from openstack.compute.v2.flavor import Flavor as OpenStackFlavor
 from openstack.compute.v2.image import Image as OpenStackImage
 from openstack.compute.v2.keypair import Keypair as OpenStackKeypair
@@ -9,47 +11,184 @@ from openstack.network.v2.floating_ip import FloatingIP as OpenstackFloatingIP
 
 import app.openstack.network_service as network_service
 from app.config import settings
-from app.openstack.block_service import create_volume, get_block_device_mapping
+from app.openstack.block_service import (
+    create_volume,
+    delete_snapshot,
+    get_block_device_mapping,
+    get_image_block_device_mapping,
+    get_image_snapshot_ids,
+)
+from app.openstack.models import BootIds, ComputeLimits, FlavorSize, ServerLookup
 from app.servers.models import ServerConfig
 
+SERVER_LIST_PAGE_SIZE = 500
+SERVER_LOOKUP_FILTER_MAX = 10
 
-def create_server(
+
+def create_server_volume(
         conn: connection.Connection,
-        user_id: str,
         name: str,
-        description: str,
         server_config: ServerConfig,
-) -> (OpenStackServer, OpenStackKeypair, OpenstackFloatingIP):
+) -> list[dict]:
     block_device_mapping = []
 
     # if image is not equal to cirros
     if "cirros" not in server_config.image.split("-"):
-        volume = create_volume(conn, server_config.image, name + "_disk")
+        volume = create_volume(conn, server_config.image_id or server_config.image, name + "_disk")
         block_device_mapping.append(get_block_device_mapping(volume))
 
-    image = conn.image.find_image(server_config.image)
-    flavor = conn.compute.find_flavor(server_config.flavor)
+    return block_device_mapping
+
+
+def resolve_boot_ids(
+        conn: connection.Connection,
+        server_config: ServerConfig,
+        image_id: Optional[str] = None,
+) -> BootIds:
+    # ids are pre-resolved by the server config resolver, name lookups are only a fallback
+    image_id = image_id or server_config.image_id
+    if not image_id:
+        image_id = conn.image.find_image(server_config.image, ignore_missing=False).id
+
+    flavor_id = server_config.flavor_id
+    if not flavor_id:
+        flavor_id = conn.compute.find_flavor(server_config.flavor, ignore_missing=False).id
+
+    return BootIds(
+        image_id=image_id,
+        flavor_id=flavor_id,
+        network_ids=server_config.network_ids or [
+            network_service.get_network(conn, network).id for network in server_config.networks
+        ],
+    )
+
+
+def launch_server(
+        conn: connection.Connection,
+        name: str,
+        description: str,
+        server_config: ServerConfig,
+        keypair_name: str,
+        block_device_mapping: list[dict],
+        boot_ids: Optional[BootIds] = None,
+        image_id: Optional[str] = None,
+) -> OpenStackServer:
+    boot_ids = boot_ids or resolve_boot_ids(conn, server_config, image_id)
+
+    server = conn.compute.create_server(
+        name=name,
+        description=description,
+        admin_password=name,
+        image_id=boot_ids.image_id,
+        flavor_id=boot_ids.flavor_id,
+        networks=[{"uuid": network_id} for network_id in boot_ids.network_ids],
+        key_name=keypair_name,
+        block_device_mapping_v2=block_device_mapping,
+    )
+    return conn.compute.wait_for_server(server)
+
 
-    networks = []
-    for network in server_config.networks:
-        openstack_network = network_service.get_network(conn, network)
-        networks.append({"uuid": openstack_network.id})
+def boot_servers(
+        conn: connection.Connection,
+        keypair_name: str,
+        name: str,
+        description: str,
+        server_config: ServerConfig,
+        count: int,
+        image_id: Optional[str] = None,
+) -> (list[OpenStackServer], list[OpenStackServer]):
+    boot_ids = resolve_boot_ids(conn, server_config, image_id)
 
-    keypair = create_keypair(conn, user_id)
+    # a pre-created volume can only back one instance, nova creates one per instance from the image
+    # instead
+    block_device_mapping = []
+    if image_id is None and "cirros" not in server_config.image.split("-"):
+        block_device_mapping.append(get_image_block_device_mapping(boot_ids.image_id))
 
+    # nova names the instances <name>-1 .. <name>-<count>
     server = conn.compute.create_server(
         name=name,
         description=description,
         admin_password=name,
-        image_id=image.id,
-        flavor_id=flavor.id,
-        networks=networks,
-        key_name=keypair.name,
+        image_id=boot_ids.image_id,
+        flavor_id=boot_ids.flavor_id,
+        networks=[{"uuid": network_id} for network_id in boot_ids.network_ids],
+        key_name=keypair_name,
         block_device_mapping_v2=block_device_mapping,
+        min_count=count,
+        max_count=count,
     )
-    conn.compute.wait_for_server(server)
-    ip_address = network_service.create_floating_ip_and_assign_to_server(conn, server)
-    return server, keypair, ip_address
+    reservation_id = conn.compute.get_server(server.id).reservation_id
+    active, failed = wait_for_reservation(conn, reservation_id, count)
+    return active, failed
+
+
+def wait_for_reservation(
+        conn: connection.Connection,
+        reservation_id: str,
+        count: int,
+        interval: int = 2,
+        wait: int = 600,
+) -> (list[OpenStackServer], list[OpenStackServer]):
+    # one listing per poll for the whole group instead of a wait_for_server per instance.
+    # instances still building at the deadline are returned as failed, so the caller deletes them
+    deadline = time.monotonic() + wait
+    while True:
+        servers = list(conn.compute.servers(details=True, reservation_id=reservation_id))
+        active = [server for server in servers if server.status == 'ACTIVE']
+        failed = [server for server in servers if server.status != 'ACTIVE']
+        finished = all(server.status in ('ACTIVE', 'ERROR') for server in servers)
+        if len(servers) >= count and finished:
+            return sorted(active, key=lambda server: server.name), failed
+
+        if time.monotonic() >= deadline:
+            settings.error_logger.error(
+                f'{len(failed)} servers of reservation {reservation_id} '
+                f'did not become active in {wait}s'
+            )
+            return sorted(active, key=lambda server: server.name), failed
+        time.sleep(interval)
+
+
+def resolve_server_configs(
+        conn: connection.Connection,
+        server_configs: list[ServerConfig],
+) -> dict[str, dict]:
+    # one listing per collection for all configurations instead of a find_* per name
+    images = {image.name: image.id for image in conn.image.images()}
+    flavors = {flavor.name: flavor.id for flavor in conn.compute.flavors(details=False)}
+    networks = {network.name: network.id for network in conn.network.networks()}
+
+    resolved = {}
+    for server_config in server_configs:
+        try:
+            resolved[server_config.name] = {
+                'image_id': _get_resource_id(images, server_config.image),
+                'flavor_id': _get_resource_id(flavors, server_config.flavor),
+                'network_ids': [
+                    _get_resource_id(networks, network) for network in server_config.networks or []
+                ],
+                'floating_network_id': _get_resource_id(
+                    networks,
+                    network_service.PUBLIC_NETWORK_NAME,
+                ),
+            }
+        except ResourceNotFound as e:
+            settings.error_logger.error(
+                f'Failed to resolve server configuration {server_config.name}: {e}'
+            )
+
+    return resolved
+
+
+def _get_resource_id(ids_by_name: dict[str, str], name_or_id: str) -> str:
+    if name_or_id in ids_by_name:
+        return ids_by_name[name_or_id]
+
+    if name_or_id in ids_by_name.values():
+        return name_or_id
+
+    raise ResourceNotFound(f"No resource found for {name_or_id}")
 
 
 def add_floating_ip_to_server(conn: connection.Connection, server: OpenStackServer, floating_ip: OpenstackFloatingIP):
@@ -65,6 +204,10 @@ def create_keypair(conn: connection.Connection, name) -> OpenStackKeypair:
     return keypair
 
 
+def delete_keypair(conn: connection.Connection, name: str):
+    conn.compute.delete_keypair(name, ignore_missing=True)
+
+
 def create_floating_ip(conn: connection.Connection, network_id: str) -> OpenstackFloatingIP:
     return conn.network.create_ip(floating_network_id=network_id)
 
@@ -73,16 +216,56 @@ def get_all_servers(conn: connection.Connection) -> list[OpenStackServer]:
     return conn.compute.servers(all_projects=True)
 
 
-def get_servers_by_ids(conn: connection.Connection, ids: list[str]) -> list[OpenStackServer]:
-    servers = []
-    for server_id in ids:
-        server = conn.compute.find_server(server_id)
-        if server:
-            servers.append(server)
-        else:
-            print(f"Server with ID {server_id} not found.")
-
-    return servers
+def get_servers_by_ids(
+        conn: connection.Connection,
+        ids: list[str],
+        all_projects: bool = False,
+) -> ServerLookup:
+    wanted = [str(server_id) for server_id in ids]
+    if not wanted:
+        return ServerLookup([], [])
+
+    found = {}
+    wanted_set = set(wanted)
+    if len(wanted_set) <= SERVER_LOOKUP_FILTER_MAX:
+        # for a few ids a GET per server beats any listing and a missing id costs one request, not
+        # a scan. only a 404 means the server is gone, anything else is raised
+        for server_id in wanted_set:
+            try:
+                found[server_id] = conn.compute.get_server(server_id)
+            except ResourceNotFound:
+                pass
+    else:
+        # the gateway creates every server in its own project, the listing never leaves it
+        servers = conn.compute.servers(
+            details=True,
+            all_projects=all_projects,
+            limit=SERVER_LIST_PAGE_SIZE,
+        )
+        for server in servers:
+            if server.id in wanted_set:
+                found[server.id] = server
+                if len(found) == len(wanted_set):
+                    break
+
+    servers = [found[server_id] for server_id in wanted if server_id in found]
+    missing_ids = [server_id for server_id in wanted if server_id not in found]
+
+    return ServerLookup(servers, missing_ids)
+
+
+def get_servers_changed_since(
+        conn: connection.Connection,
+        changes_since: str,
+        all_projects: bool = True,
+) -> list[OpenStackServer]:
+    # nova includes servers deleted since that moment, with status DELETED
+    return list(conn.compute.servers(
+        details=True,
+        all_projects=all_projects,
+        changes_since=changes_since,
+        limit=SERVER_LIST_PAGE_SIZE,
+    ))
 
 
 def get_server(conn: connection.Connection, server_id: str) -> OpenStackServer:
@@ -113,6 +296,43 @@ def delete_server(conn: connection.Connection, server_id: str):
     conn.compute.delete_server(server_id, ignore_missing=True)
 
 
+def create_server_snapshot(
+        conn: connection.Connection,
+        server_id: str,
+        name: str,
+        metadata: dict[str, str],
+) -> str:
+    # stopped first so the disk is consistent, volume-backed servers get a volume snapshot behind
+    # the image
+    server = conn.compute.get_server(server_id)
+    if server.status != 'SHUTOFF':
+        conn.compute.stop_server(server)
+        conn.compute.wait_for_server(
+            server,
+            status='SHUTOFF',
+            wait=settings.image_bake_snapshot_timeout,
+        )
+
+    image = conn.compute.create_server_image(
+        server,
+        name,
+        metadata=metadata,
+        wait=True,
+        timeout=settings.image_bake_snapshot_timeout,
+    )
+    return image.id
+
+
+def delete_image(conn: connection.Connection, image_id: str):
+    image = conn.image.find_image(image_id, ignore_missing=True)
+    if image is None:
+        return
+
+    conn.image.delete_image(image, ignore_missing=True)
+    for snapshot_id in get_image_snapshot_ids(image):
+        delete_snapshot(conn, snapshot_id)
+
+
 def pause_server(conn: connection.Connection, server_id: str):
     conn.compute.pause_server(server_id)
 
@@ -145,7 +365,25 @@ def get_image(conn: connection.Connection, image_id: str) -> list[OpenStackImage
     return conn.compute.find_image(image_id)
 
 
-def get_instance_limit(conn: connection.Connection) -> int:
+def get_compute_limits(conn: connection.Connection) -> ComputeLimits:
     limits = conn.compute.get_limits()
-    max_server_limit = limits.absolute['maxTotalInstances']
-    return min(max_server_limit, settings.max_server_limit)
+    absolute = limits.absolute
+    return ComputeLimits(
+        instance_limit=min(absolute['maxTotalInstances'], settings.max_server_limit),
+        max_instances=absolute['maxTotalInstances'],
+        instances_used=absolute['totalInstancesUsed'],
+        max_cores=absolute['maxTotalCores'],
+        cores_used=absolute['totalCoresUsed'],
+        max_ram=absolute['maxTotalRAMSize'],
+        ram_used=absolute['totalRAMUsed'],
+    )
+
+
+def get_flavor_sizes(conn: connection.Connection) -> dict[str, FlavorSize]:
+    flavor_sizes = {}
+    for flavor in conn.compute.flavors(details=True):
+        size = FlavorSize(vcpus=flavor.vcpus, ram=flavor.ram)
+        flavor_sizes[flavor.id] = size
+        flavor_sizes[flavor.name] = size
+
+    return flavor_sizes
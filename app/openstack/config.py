@@ -1,11 +1,163 @@
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
 import openstack
+from openstack import connection
+from requests.adapters import HTTPAdapter
 
 from app.config import settings
 
-# Initialize and turn on debug logging
-openstack.enable_logging(debug=True)
+# service type -> connection proxy attribute
+POOLED_SERVICES = {
+    'compute': 'compute',
+    'network': 'network',
+    'block-storage': 'block_storage',
+    'image': 'image',
+}
+
+
+# One authenticated connection per process with keep-alive pools per service. The Keystone token is
+# refreshed ahead of expiry and shared between workers through a locked file on the host.
+class ConnectionManager:
+    def __init__(
+            self,
+            cloud_name: str,
+            pool_size: int,
+            refresh_margin: int,
+            token_cache_path: str,
+    ):
+        self.cloud_name = cloud_name
+        self.pool_size = pool_size
+        self.refresh_margin = refresh_margin
+        self.token_cache_path = token_cache_path
+
+        self._conn: Optional[connection.Connection] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    def start(self):
+        self.get_connection()
+
+        if self._refresher is None:
+            self._stopped.clear()
+            self._refresher = threading.Thread(
+                target=self._refresh_loop,
+                name='openstack-token',
+                daemon=True,
+            )
+            self._refresher.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._refresher is not None:
+            self._refresher.join(timeout=5)
+            self._refresher = None
+
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_connection(self) -> connection.Connection:
+        if self._conn is not None:
+            return self._conn
+
+        with self._lock:
+            if self._conn is None:
+                conn = openstack.connect(cloud=self.cloud_name)
+                self._ensure_token(conn)
+                self._mount_service_pools(conn)
+                self._conn = conn
+
+        return self._conn
+
+    def _mount_service_pools(self, conn: connection.Connection):
+        http_session = conn.session.session
+        for service_type, proxy_name in POOLED_SERVICES.items():
+            try:
+                endpoint = getattr(conn, proxy_name).get_endpoint()
+            except Exception as e:
+                settings.error_logger.error(f'No {service_type} endpoint to pool: {e}')
+                continue
+
+            # requests picks the adapter with the longest matching prefix
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            http_session.mount(endpoint, adapter)
+
+    def _refresh_loop(self):
+        interval = max(min(self.refresh_margin / 2, 60), 5)
+        while not self._stopped.wait(interval):
+            conn = self._conn
+            if conn is None:
+                continue
+
+            try:
+                self._ensure_token(conn)
+            except Exception as e:
+                settings.error_logger.error(f'Failed to refresh OpenStack token: {e}')
+
+    def _ensure_token(self, conn: connection.Connection):
+        auth = conn.session.auth
+        if self._is_fresh(auth):
+            return
+
+        with self._token_cache_lock():
+            # another worker may have refreshed the shared token while we waited for the lock
+            state = self._read_token_cache()
+            if state:
+                auth.set_auth_state(state)
+                if self._is_fresh(auth):
+                    return
+
+            auth.invalidate()
+            auth.get_token(conn.session)
+            self._write_token_cache(auth.get_auth_state())
+
+    def _is_fresh(self, auth) -> bool:
+        auth_ref = auth.auth_ref
+        if auth_ref is None:
+            return False
+        return not auth_ref.will_expire_soon(stale_duration=self.refresh_margin)
+
+    @contextmanager
+    def _token_cache_lock(self):
+        with open(f'{self.token_cache_path}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_token_cache(self) -> Optional[str]:
+        try:
+            with open(self.token_cache_path) as file:
+                return file.read() or None
+        except OSError:
+            return None
+
+    def _write_token_cache(self, state: Optional[str]):
+        if not state:
+            return
+
+        tmp_path = f'{self.token_cache_path}.{os.getpid()}'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as file:
+            file.write(state)
+        os.replace(tmp_path, self.token_cache_path)
+
+
+connection_manager = ConnectionManager(
+    cloud_name=settings.cloud_name,
+    pool_size=settings.openstack_pool_size,
+    refresh_margin=settings.openstack_token_refresh_margin,
+    token_cache_path=settings.openstack_token_cache_path,
+)
 
 
 # Initialize connection
 async def get_connection():
-    return openstack.connect(cloud=settings.cloud_name)
+    return connection_manager.get_connection()
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from functools import partial
+from typing import Any, Callable, Optional
+
+from app.config import settings
+
+
+class CallKind(str, Enum):
+    READ = "read"
+    MUTATION = "mutation"
+
+
+class _CallStats:
+    WINDOW = 256
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_times = deque(maxlen=self.WINDOW)
+        self.run_times = deque(maxlen=self.WINDOW)
+
+    def to_dict(self) -> dict:
+        wait_times = list(self.wait_times)
+        run_times = list(self.run_times)
+        return {
+            'limit': self.limit,
+            'queue_depth': self.waiting,
+            'running': self.running,
+            'completed': self.completed,
+            'failed': self.failed,
+            'avg_wait_ms': _avg_ms(wait_times),
+            'max_wait_ms': round(max(wait_times, default=0) * 1000, 2),
+            'avg_run_ms': _avg_ms(run_times),
+        }
+
+
+class _Call:
+    def __init__(self, stats: _CallStats, queued_at: float, func: Callable):
+        self.stats = stats
+        self.queued_at = queued_at
+        self.func = func
+        self.started = False
+
+
+def _avg_ms(values: list[float]) -> float:
+    if not values:
+        return 0.0
+    return round(sum(values) / len(values) * 1000, 2)
+
+
+# Blocking openstacksdk calls run here instead of on the event loop or Starlette's shared pool.
+# Reads and long-running mutations get separate caps, so a few slow creates can't hold every thread.
+class OpenStackExecutor:
+    def __init__(self, max_workers: int, limits: dict[CallKind, int]):
+        self.max_workers = max_workers
+        self.limits = limits
+
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._semaphores: dict[CallKind, asyncio.Semaphore] = {}
+        self._stats = {kind: _CallStats(limit) for kind, limit in limits.items()}
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='openstack',
+            )
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._semaphores = {}
+
+    async def run(self, kind: CallKind, func: Callable, *args, **kwargs) -> Any:
+        self.start()
+        stats = self._stats[kind]
+        semaphore = self._semaphores.get(kind)
+        if semaphore is None:
+            semaphore = self._semaphores[kind] = asyncio.Semaphore(self.limits[kind])
+
+        queued_at = time.monotonic()
+        with self._stats_lock:
+            stats.waiting += 1
+
+        try:
+            await semaphore.acquire()
+        except BaseException:
+            with self._stats_lock:
+                stats.waiting -= 1
+            raise
+
+        loop = asyncio.get_running_loop()
+        call = _Call(stats, queued_at, partial(func, *args, **kwargs))
+        try:
+            future = self._pool.submit(self._call, call)
+        except BaseException:
+            semaphore.release()
+            with self._stats_lock:
+                stats.waiting -= 1
+            raise
+
+        # the slot is held until the thread finishes, even if the awaiting request is cancelled
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._release, semaphore, call)
+        )
+        return await asyncio.wrap_future(future)
+
+    def _release(self, semaphore: asyncio.Semaphore, call: '_Call'):
+        semaphore.release()
+        if not call.started:
+            # cancelled while still queued in the pool
+            with self._stats_lock:
+                call.stats.waiting -= 1
+
+    def _call(self, call: '_Call') -> Any:
+        stats = call.stats
+        started_at = time.monotonic()
+        with self._stats_lock:
+            call.started = True
+            stats.waiting -= 1
+            stats.running += 1
+            stats.wait_times.append(started_at - call.queued_at)
+
+        failed = False
+        try:
+            return call.func()
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            with self._stats_lock:
+                stats.running -= 1
+                stats.run_times.append(time.monotonic() - started_at)
+                if failed:
+                    stats.failed += 1
+                else:
+                    stats.completed += 1
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                'max_workers': self.max_workers,
+                **{kind.value: stats.to_dict() for kind, stats in self._stats.items()},
+            }
+
+
+openstack_executor = OpenStackExecutor(
+    max_workers=settings.openstack_executor_workers,
+    limits={
+        CallKind.READ: settings.openstack_read_concurrency,
+        CallKind.MUTATION: settings.openstack_mutation_concurrency,
+    },
+)
+
+
+async def run_read(func: Callable, *args, **kwargs) -> Any:
+    return await openstack_executor.run(CallKind.READ, func, *args, **kwargs)
+
+
+async def run_mutation(func: Callable, *args, **kwargs) -> Any:
+    return await openstack_executor.run(CallKind.MUTATION, func, *args, **kwargs)
@@ -0,0 +1,67 @@
+import asyncio
+import time
+from typing import Optional
+
+from openstack import connection
+
+import app.openstack.compute_service as openstack
+from app.config import settings
+from app.openstack.executor import run_read
+from app.openstack.models import ComputeLimits, FlavorSize
+
+
+# Absolute limits and flavor sizes barely change, so they are fetched once per TTL and creates are
+# checked against them in memory. Accepted creates are counted locally until the next refresh.
+class LimitsService:
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._limits: Optional[ComputeLimits] = None
+        self._limits_loaded_at: Optional[float] = None
+        self._flavors: dict[str, FlavorSize] = {}
+        self._flavors_loaded_at: Optional[float] = None
+        self._limits_lock = asyncio.Lock()
+        self._flavors_lock = asyncio.Lock()
+
+    async def get_limits(self, conn: connection.Connection) -> ComputeLimits:
+        if self._is_stale(self._limits_loaded_at):
+            async with self._limits_lock:
+                if self._is_stale(self._limits_loaded_at):
+                    self._limits = await run_read(openstack.get_compute_limits, conn)
+                    self._limits_loaded_at = time.monotonic()
+
+        return self._limits
+
+    async def get_flavor(self, conn: connection.Connection, flavor: str) -> Optional[FlavorSize]:
+        if self._is_stale(self._flavors_loaded_at) or flavor not in self._flavors:
+            async with self._flavors_lock:
+                if self._is_stale(self._flavors_loaded_at) or flavor not in self._flavors:
+                    self._flavors = await run_read(openstack.get_flavor_sizes, conn)
+                    self._flavors_loaded_at = time.monotonic()
+
+        return self._flavors.get(flavor)
+
+    async def check_create(
+            self,
+            conn: connection.Connection,
+            flavor: str,
+            count: int = 1,
+    ) -> (Optional[str], Optional[FlavorSize]):
+        limits, flavor_size = await asyncio.gather(
+            self.get_limits(conn),
+            self.get_flavor(conn, flavor),
+        )
+
+        return limits.exceeded_by(flavor_size, count), flavor_size
+
+    def reserve(self, flavor_size: Optional[FlavorSize], count: int = 1):
+        if self._limits is not None:
+            self._limits = self._limits.reserve(flavor_size, count)
+
+    def invalidate(self):
+        self._limits_loaded_at = None
+
+    def _is_stale(self, loaded_at: Optional[float]) -> bool:
+        return loaded_at is None or time.monotonic() - loaded_at >= self.ttl
+
+
+compute_limits = LimitsService(settings.compute_limits_ttl)
@@ -1,4 +1,66 @@
+import json
+from typing import NamedTuple, Optional
+
 from openstack.compute.v2.server import Server as OpenStackServer
+
+
+class ServerLookup(NamedTuple):
+    servers: list[OpenStackServer]
+    missing_ids: list[str]
+
+
+class BootIds(NamedTuple):
+    image_id: str
+    flavor_id: str
+    network_ids: list[str]
+
+
+class FlavorSize(NamedTuple):
+    vcpus: int
+    ram: int
+
+
+class ComputeLimits(NamedTuple):
+    instance_limit: int
+    max_instances: int
+    instances_used: int
+    max_cores: int
+    cores_used: int
+    max_ram: int
+    ram_used: int
+
+    def exceeded_by(self, flavor: Optional[FlavorSize], count: int = 1) -> Optional[str]:
+        # nova reports -1 for unlimited quotas
+        if 0 <= self.max_instances < self.instances_used + count:
+            return "Instance quota exceeded"
+        if flavor is None:
+            # size of an unlisted flavor is unknown, only the instance count can be checked
+            return None
+        if 0 <= self.max_cores < self.cores_used + flavor.vcpus * count:
+            return "Cores quota exceeded"
+        if 0 <= self.max_ram < self.ram_used + flavor.ram * count:
+            return "RAM quota exceeded"
+        return None
+
+    def reserve(self, flavor: Optional[FlavorSize], count: int = 1) -> 'ComputeLimits':
+        if flavor is None:
+            return self._replace(instances_used=self.instances_used + count)
+
+        return self._replace(
+            instances_used=self.instances_used + count,
+            cores_used=self.cores_used + flavor.vcpus * count,
+            ram_used=self.ram_used + flavor.ram * count,
+        )
+
+
+def server_to_dict(server: OpenStackServer) -> dict:
+    return json.loads(json.dumps(server.to_dict(computed=False), default=str))
+
+
+def server_from_dict(data: dict) -> OpenStackServer:
+    return OpenStackServer.existing(**data)
+
+
 def get_os_default_user(image: str):
     match image.split("-"):
         case ["cirros", *_, ]:
@@ -19,14 +19,41 @@ def create_floating_ip_and_assign_to_server(
         conn:  connection.Connection,
         server: OpenStackServer,
         floating_network_name: str=PUBLIC_NETWORK_NAME,
+        floating_network_id: Optional[str] = None,
 ) -> Optional[OpenstackFloatingIP]:
-    floating_network = conn.network.find_network(floating_network_name)
+    if not floating_network_id:
+        floating_network = conn.network.find_network(floating_network_name, ignore_missing=False)
+        floating_network_id = floating_network.id
 
     server_ports = conn.network.ports(device_id=server.id)
     server_ports = list(server_ports)
     if server_ports and len(server_ports) > 0:
         server_port = server_ports[0]
-        floating_ip = conn.network.create_ip(floating_network_id=floating_network.id, port_id=server_port.id)
+        floating_ip = conn.network.create_ip(
+            floating_network_id=floating_network_id,
+            port_id=server_port.id,
+        )
         return floating_ip
     else:
-        return None
\ No newline at end of file
+        return None
+
+
+def get_server_ports(conn: connection.Connection, server_ids: list[str]) -> dict[str, str]:
+    # first port of every server, from a single listing
+    ports = {}
+    for port in conn.network.ports(device_id=server_ids):
+        ports.setdefault(port.device_id, port.id)
+
+    return ports
+
+
+def create_floating_ip_for_port(
+        conn: connection.Connection,
+        floating_network_id: str,
+        port_id: str,
+) -> OpenstackFloatingIP:
+    return conn.network.create_ip(floating_network_id=floating_network_id, port_id=port_id)
+
+
+def delete_floating_ip(conn: connection.Connection, floating_ip_id: str):
+    conn.network.delete_ip(floating_ip_id, ignore_missing=True)
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.auth.config import current_user
+from app.auth.models import User
+from app.openstack.executor import openstack_executor
+
+router = APIRouter(
+    prefix="/openstack",
+    tags=["openstack"]
+)
+
+
+@router.get("/executor/stats")
+async def get_executor_stats(
+        user: User = Depends(current_user),
+):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    return openstack_executor.get_stats()
@@ -0,0 +1,252 @@
+import datetime
+import uuid
+from typing import Optional
+
+from sqlalchemy import select, update, func, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.jobs.schemas import JobStatus
+from app.runner.models import CommandExecution, CommandOutputChunk
+
+COMMAND_QUEUE_LOCK_ID = 720002
+IN_FLIGHT_STATUSES = [JobStatus.pending.value, JobStatus.running.value]
+
+
+async def insert_output_chunk(
+        execution_id: uuid.UUID,
+        server_id: uuid.UUID,
+        offset: int,
+        size: int,
+        data: bytes,
+        is_final: bool,
+        session: AsyncSession,
+):
+    session.add(CommandOutputChunk(
+        execution_id=execution_id,
+        server_id=server_id,
+        offset=offset,
+        size=size,
+        data=data,
+        is_final=is_final,
+    ))
+    await session.commit()
+
+
+async def get_output_chunks(
+        execution_id: uuid.UUID,
+        server_id: uuid.UUID,
+        offset: int,
+        session: AsyncSession,
+) -> list[CommandOutputChunk]:
+    query = (
+        select(CommandOutputChunk)
+        .where(CommandOutputChunk.execution_id == execution_id)
+        .where(CommandOutputChunk.server_id == server_id)
+        .where(CommandOutputChunk.offset + CommandOutputChunk.size >= offset)
+        .order_by(CommandOutputChunk.offset)
+    )
+    result = await session.execute(query)
+
+    return list(result.scalars().all())
+
+
+async def _lock_server_queue(
+        server_id: uuid.UUID,
+        session: AsyncSession,
+):
+    # serializes submissions and claims for one server until the end of the transaction
+    await session.execute(
+        select(func.pg_advisory_xact_lock(COMMAND_QUEUE_LOCK_ID, func.hashtext(str(server_id))))
+    )
+
+
+async def get_or_insert_execution(
+        execution_id: uuid.UUID,
+        server_id: uuid.UUID,
+        owner_id: uuid.UUID,
+        command: str,
+        idempotency_key: Optional[str],
+        session: AsyncSession,
+) -> (CommandExecution, bool):
+    await _lock_server_queue(server_id, session)
+
+    # a key reused for another server or command returns that execution, the caller rejects it
+    if idempotency_key:
+        execution = await _get_execution_by_key(owner_id, idempotency_key, session)
+        if execution is not None:
+            await session.commit()
+            return execution, False
+
+    # an identical command already queued or running for the server is joined instead of repeated
+    query = (
+        select(CommandExecution)
+        .where(CommandExecution.server_id == server_id)
+        .where(CommandExecution.command == command)
+        .where(CommandExecution.status.in_(IN_FLIGHT_STATUSES))
+        .order_by(CommandExecution.queued_at)
+        .limit(1)
+    )
+    result = await session.execute(query)
+    execution = result.scalar_one_or_none()
+    if execution is not None:
+        await session.commit()
+        return execution, False
+
+    execution = CommandExecution(
+        id=execution_id,
+        server_id=server_id,
+        owner_id=owner_id,
+        command=command,
+        status=JobStatus.pending.value,
+        idempotency_key=idempotency_key,
+        steps=[],
+    )
+    session.add(execution)
+    try:
+        await session.commit()
+    except IntegrityError:
+        # the advisory lock is per server, the same key sent for two servers at once races here
+        await session.rollback()
+        if not idempotency_key:
+            raise
+        execution = await _get_execution_by_key(owner_id, idempotency_key, session)
+        await session.commit()
+        return execution, False
+
+    return execution, True
+
+
+async def _get_execution_by_key(
+        owner_id: uuid.UUID,
+        idempotency_key: str,
+        session: AsyncSession,
+) -> Optional[CommandExecution]:
+    query = (
+        select(CommandExecution)
+        .where(CommandExecution.owner_id == owner_id)
+        .where(CommandExecution.idempotency_key == idempotency_key)
+    )
+    result = await session.execute(query)
+
+    return result.scalar_one_or_none()
+
+
+async def claim_execution(
+        execution_id: uuid.UUID,
+        server_id: uuid.UUID,
+        session: AsyncSession,
+) -> bool:
+    await _lock_server_queue(server_id, session)
+
+    # only the oldest queued execution may start, and only when nothing else runs on the server
+    query = (
+        select(CommandExecution.id, CommandExecution.status)
+        .where(CommandExecution.server_id == server_id)
+        .where(CommandExecution.status.in_(IN_FLIGHT_STATUSES))
+        .order_by(CommandExecution.status != JobStatus.running.value, CommandExecution.queued_at)
+        .limit(1)
+    )
+    result = await session.execute(query)
+    head = result.first()
+    if head is None or head.id != execution_id or head.status != JobStatus.pending.value:
+        await session.commit()
+        return False
+
+    stmt = (
+        update(CommandExecution)
+        .where(CommandExecution.id == execution_id)
+        .values(status=JobStatus.running.value, started_at=func.now())
+    )
+    await session.execute(stmt)
+    await session.commit()
+
+    return True
+
+
+async def finish_execution(
+        execution_id: uuid.UUID,
+        status: str,
+        steps: list[dict],
+        exit_code: Optional[int],
+        error: Optional[str],
+        session: AsyncSession,
+):
+    stmt = (
+        update(CommandExecution)
+        .where(CommandExecution.id == execution_id)
+        .values(
+            status=status,
+            steps=steps,
+            exit_code=exit_code,
+            error=error,
+            finished_at=func.now(),
+        )
+    )
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def get_execution(
+        execution_id: uuid.UUID,
+        session: AsyncSession,
+        server_id: Optional[uuid.UUID] = None,
+) -> Optional[CommandExecution]:
+    query = select(CommandExecution).where(CommandExecution.id == execution_id)
+
+    if server_id is not None:
+        query = query.where(CommandExecution.server_id == server_id)
+
+    result = await session.execute(query)
+
+    return result.scalar_one_or_none()
+
+
+async def get_server_executions(
+        server_id: uuid.UUID,
+        limit: int,
+        session: AsyncSession,
+) -> list[CommandExecution]:
+    query = (
+        select(CommandExecution)
+        .where(CommandExecution.server_id == server_id)
+        .order_by(CommandExecution.queued_at.desc())
+        .limit(limit)
+    )
+    result = await session.execute(query)
+
+    return list(result.scalars().all())
+
+
+async def fail_stale_executions(
+        stale_after: int,
+        queue_timeout: int,
+        session: AsyncSession,
+        server_id: Optional[uuid.UUID] = None,
+):
+    # executions of a worker that died keep the server's queue blocked. a running one is stale once
+    # it outlived the execution timeout, a pending one may wait behind long commands and is only
+    # given up on after the much longer queue timeout
+    now = datetime.datetime.now(datetime.timezone.utc)
+    started_before = now - datetime.timedelta(seconds=stale_after)
+    queued_before = now - datetime.timedelta(seconds=queue_timeout)
+    stmt = (
+        update(CommandExecution)
+        .where(or_(
+            and_(
+                CommandExecution.status == JobStatus.running.value,
+                CommandExecution.started_at < started_before,
+            ),
+            and_(
+                CommandExecution.status == JobStatus.pending.value,
+                CommandExecution.queued_at < queued_before,
+            ),
+        ))
+        .values(status=JobStatus.failed.value, error='Interrupted', finished_at=func.now())
+    )
+
+    if server_id is not None:
+        stmt = stmt.where(CommandExecution.server_id == server_id)
+
+    await session.execute(stmt)
+    await session.commit()
@@ -0,0 +1,45 @@
+from sqlalchemy import (
+    Column, UUID, BigInteger, Integer, Boolean, LargeBinary, DateTime, String, ForeignKey, Index,
+    func,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.auth.models import Base
+
+
+class CommandOutputChunk(Base):
+    __tablename__ = "command_output_chunk"
+    execution_id = Column(UUID, primary_key=True)
+    offset = Column(BigInteger, primary_key=True)
+    server_id = Column(UUID, nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    # zlib compressed utf-8 text
+    data = Column(LargeBinary, nullable=False)
+    is_final = Column(Boolean, nullable=False, server_default='false')
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class CommandExecution(Base):
+    __tablename__ = "command_execution"
+    id = Column(UUID, primary_key=True)
+    server_id = Column(UUID, nullable=False, index=True)
+    owner_id = Column(UUID, ForeignKey("user.id"), nullable=False)
+    command = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    idempotency_key = Column(String, nullable=True)
+    steps = Column(JSONB, nullable=False, default=list)
+    exit_code = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    queued_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index(
+            'ix_command_execution_owner_id_idempotency_key',
+            'owner_id',
+            'idempotency_key',
+            unique=True,
+            postgresql_where=idempotency_key.isnot(None),
+        ),
+    )
@@ -0,0 +1,246 @@
+import asyncio
+import time
+import uuid
+import zlib
+from collections import deque
+from typing import AsyncIterator, Optional
+
+import app.runner.db_service as runner_db
+from app.config import settings
+from app.database import async_session_maker
+
+TRUNCATED_MARKER = '\n[output truncated]\n'
+
+
+# Output of one command execution. The tail is kept in a bounded in-memory ring for live readers
+# and everything is persisted as zlib compressed chunks, so a reader that falls behind the ring,
+# connects to another worker or comes back later resumes from the stored chunks.
+# Offsets count characters of the normalized output.
+class CommandOutput:
+    def __init__(
+            self,
+            execution_id: uuid.UUID,
+            server_id: uuid.UUID,
+            buffer_size: int,
+            chunk_size: int,
+            max_size: int,
+            flush_interval: float,
+    ):
+        self.execution_id = execution_id
+        self.server_id = server_id
+        self.buffer_size = buffer_size
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+
+        self._pieces: deque[tuple[int, str]] = deque()
+        self._buffered = 0
+        self._size = 0
+        self._pending: list[str] = []
+        self._pending_size = 0
+        self._flushed = 0
+        self._closed = False
+        self._truncated = False
+        self._changed = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def write(self, text: str):
+        if self._truncated or not text:
+            return
+
+        # \r would end the line of an SSE event
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if self._size + len(text) > self.max_size:
+            text = text[:max(self.max_size - self._size, 0)] + TRUNCATED_MARKER
+            self._truncated = True
+
+        self._pieces.append((self._size, text))
+        self._size += len(text)
+        self._buffered += len(text)
+        self._pending.append(text)
+        self._pending_size += len(text)
+        self._evict()
+
+        async with self._changed:
+            self._changed.notify_all()
+
+        if self._pending_size >= self.chunk_size:
+            await self.flush()
+        elif self._flush_task is None:
+            # a quiet command reaches readers of the stored chunks within flush_interval too
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.flush_interval)
+            # a no-op once close has written the final chunk
+            await self.flush()
+        except Exception as e:
+            settings.error_logger.error(f'Failed to store output of {self.execution_id}: {e}')
+        finally:
+            self._flush_task = None
+
+    async def flush(self, is_final: bool = False):
+        async with self._flush_lock:
+            # writes go on while the chunk is stored, only what it holds leaves _pending and only
+            # once it is stored. a failed insert is retried by the next flush
+            count = len(self._pending)
+            text = ''.join(self._pending[:count])
+            if not text and not is_final:
+                return
+
+            offset = self._flushed
+            async with async_session_maker() as session:
+                await runner_db.insert_output_chunk(
+                    self.execution_id,
+                    self.server_id,
+                    offset,
+                    len(text),
+                    zlib.compress(text.encode()),
+                    is_final,
+                    session,
+                )
+            del self._pending[:count]
+            self._pending_size -= len(text)
+            self._flushed = offset + len(text)
+            self._evict()
+
+    async def close(self):
+        try:
+            await self.flush(is_final=True)
+        finally:
+            self._closed = True
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def read(self, offset: int) -> AsyncIterator[tuple[int, str]]:
+        while True:
+            start = self._pieces[0][0] if self._pieces else self._size
+            if offset < start:
+                # already dropped from the ring, the stored chunks have it
+                chunks = _read_chunks(self.execution_id, self.server_id, offset, start)
+                async for end, text in chunks:
+                    offset = end
+                    yield end, text
+
+            text = ''.join(
+                piece[max(offset - piece_offset, 0):]
+                for piece_offset, piece in list(self._pieces)
+                if piece_offset + len(piece) > offset
+            )
+            if text:
+                offset += len(text)
+                yield offset, text
+
+            if self._closed and offset >= self._size:
+                return
+
+            async with self._changed:
+                await self._changed.wait_for(lambda: self._size > offset or self._closed)
+
+    def _evict(self):
+        # only pieces that are already persisted may leave the ring
+        while self._buffered > self.buffer_size and self._pieces:
+            piece_offset, piece = self._pieces[0]
+            if piece_offset + len(piece) > self._flushed:
+                break
+            self._pieces.popleft()
+            self._buffered -= len(piece)
+
+
+async def _read_chunks(
+        execution_id: uuid.UUID,
+        server_id: uuid.UUID,
+        offset: int,
+        until: Optional[int] = None,
+) -> AsyncIterator[tuple[int, str]]:
+    async with async_session_maker() as session:
+        chunks = await runner_db.get_output_chunks(execution_id, server_id, offset, session)
+
+    for chunk in chunks:
+        if until is not None and chunk.offset >= until:
+            return
+
+        text = zlib.decompress(chunk.data).decode()[max(offset - chunk.offset, 0):]
+        if until is not None:
+            text = text[:until - offset]
+        if text:
+            offset += len(text)
+            yield offset, text
+
+
+async def _read_stored(
+        execution_id: uuid.UUID,
+        server_id: uuid.UUID,
+        offset: int,
+) -> AsyncIterator[tuple[int, str]]:
+    # the execution runs on another worker or has finished, follow the stored chunks until the
+    # final one
+    last_progress = time.monotonic()
+    while True:
+        async with async_session_maker() as session:
+            chunks = await runner_db.get_output_chunks(execution_id, server_id, offset, session)
+
+        for chunk in chunks:
+            text = zlib.decompress(chunk.data).decode()[max(offset - chunk.offset, 0):]
+            if text:
+                offset += len(text)
+                last_progress = time.monotonic()
+                yield offset, text
+
+            if chunk.is_final:
+                return
+
+        if time.monotonic() - last_progress >= settings.command_output_idle_timeout:
+            return
+
+        await asyncio.sleep(settings.command_output_poll_interval)
+
+
+class CommandOutputRegistry:
+    def __init__(self, retention: int):
+        self.retention = retention
+        self._outputs: dict[uuid.UUID, CommandOutput] = {}
+
+    def open(self, execution_id: uuid.UUID, server_id: uuid.UUID) -> CommandOutput:
+        output = CommandOutput(
+            execution_id,
+            server_id,
+            buffer_size=settings.command_output_buffer_size,
+            chunk_size=settings.command_output_chunk_size,
+            max_size=settings.command_output_max_size,
+            flush_interval=settings.command_output_flush_interval,
+        )
+        self._outputs[execution_id] = output
+        return output
+
+    async def close(self, output: CommandOutput):
+        try:
+            await output.close()
+        finally:
+            # live readers keep the buffer for a while, later ones read the stored chunks
+            asyncio.get_running_loop().call_later(
+                self.retention,
+                self._outputs.pop,
+                output.execution_id,
+                None,
+            )
+
+    async def stream(
+            self,
+            execution_id: uuid.UUID,
+            server_id: uuid.UUID,
+            offset: int = 0,
+    ) -> AsyncIterator[tuple[int, str]]:
+        output = self._outputs.get(execution_id)
+        if output is not None and str(output.server_id) == str(server_id):
+            reader = output.read(offset)
+        else:
+            reader = _read_stored(execution_id, server_id, offset)
+
+        async for item in reader:
+            yield item
+
+
+command_outputs = CommandOutputRegistry(settings.command_output_retention)
@@ -0,0 +1,26 @@
+import datetime
+import uuid
+from typing import Optional
+
+from pydantic import BaseModel
+
+from app.jobs.schemas import CommandStepState, JobStatus
+
+
+class CommandExecution(BaseModel):
+    id: uuid.UUID
+    server_id: uuid.UUID
+    command: str
+    status: JobStatus
+    steps: list[CommandStepState] = []
+    exit_code: Optional[int] = None
+    error: Optional[str] = None
+
+    queued_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+
+
+class CommandExecutionSubmitted(CommandExecution):
+    # true when the submission joined an identical queued or running execution
+    coalesced: bool = False
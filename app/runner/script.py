@@ -0,0 +1,131 @@
+import secrets
+import time
+from typing import Awaitable, Callable, Optional
+
+SCRIPT_SHELL = 'sh -s'
+
+
+# Joins the lines of a command into one POSIX shell script fed over stdin, so a whole install
+# is a single channel and shell. Every step is wrapped in markers carrying a per-run nonce and
+# the step's exit code, and the script stops at the first failing step. Steps get no stdin, a
+# package manager that asks for confirmation reads EOF and aborts, so every call passes -y.
+def build_script(commands: list[str], nonce: str) -> str:
+    lines = []
+    for index, command in enumerate(commands):
+        lines += [
+            f"printf '%s start {index}\\n' '{nonce}'",
+            # the script itself is read from stdin, steps must not consume it
+            '{',
+            command,
+            '} </dev/null',
+            'rc=$?',
+            f"printf '\\n%s end {index} %s\\n' '{nonce}' \"$rc\"",
+            '[ "$rc" -eq 0 ] || exit "$rc"',
+        ]
+
+    return '\n'.join(lines) + '\n'
+
+
+def new_nonce() -> str:
+    return f'__litestack_{secrets.token_hex(8)}__'
+
+
+# Splits the script's output back into the steps' own output and their start/end markers,
+# timing each step as its markers arrive.
+class StepMarkerParser:
+    def __init__(
+            self,
+            nonce: str,
+            commands: list[str],
+            on_output: Callable[[str], Awaitable],
+    ):
+        self.nonce = nonce
+        self.on_output = on_output
+        self.steps = [
+            {
+                'index': index,
+                'command': command,
+                'status': 'pending',
+                'exit_code': None,
+                'duration_ms': None,
+            }
+            for index, command in enumerate(commands)
+        ]
+        self._buffer = ''
+        self._blank_line = False
+        self._line_start = True
+        self._started: dict[int, float] = {}
+
+    async def feed(self, data: str):
+        self._buffer += data
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            await self._handle_line(line)
+
+        # pass partial lines through right away unless they may be the start of a marker
+        held = self._held_suffix(self._buffer)
+        if len(self._buffer) > held:
+            await self._emit(self._buffer[:len(self._buffer) - held])
+            self._buffer = self._buffer[len(self._buffer) - held:]
+
+    async def finish(self):
+        if self._buffer:
+            await self._handle_line(self._buffer)
+            self._buffer = ''
+        await self._emit('')
+
+        for step in self.steps:
+            if step['status'] == 'running':
+                step['status'] = 'failed'
+            elif step['status'] == 'pending':
+                step['status'] = 'skipped'
+
+    def failed_step(self) -> Optional[dict]:
+        return next((step for step in self.steps if step['status'] == 'failed'), None)
+
+    async def _handle_line(self, line: str):
+        index = line.find(self.nonce)
+        if index < 0:
+            if line == '' and self._line_start:
+                # may be the newline the end marker prints to start on its own line
+                await self._emit('')
+                self._blank_line = True
+                return
+            await self._emit(line + '\n')
+            return
+
+        if index > 0:
+            await self._emit(line[:index] + '\n')
+
+        marker = line[index + len(self.nonce):].split()
+        if len(marker) >= 2 and marker[0] == 'start':
+            step = self.steps[int(marker[1])]
+            step['status'] = 'running'
+            self._started[step['index']] = time.monotonic()
+            await self._emit(f"$ {step['command']}\n")
+        elif len(marker) >= 3 and marker[0] == 'end':
+            self._blank_line = False
+            step = self.steps[int(marker[1])]
+            step['exit_code'] = int(marker[2])
+            step['status'] = 'succeeded' if step['exit_code'] == 0 else 'failed'
+            started = self._started.get(step['index'])
+            if started is not None:
+                step['duration_ms'] = round((time.monotonic() - started) * 1000)
+
+    async def _emit(self, text: str):
+        if self._blank_line:
+            self._blank_line = False
+            text = '\n' + text
+        if text:
+            self._line_start = text.endswith('\n')
+            await self.on_output(text)
+
+    def _held_suffix(self, text: str) -> int:
+        index = text.find(self.nonce)
+        if index >= 0:
+            return len(text) - index
+
+        for size in range(min(len(text), len(self.nonce) - 1), 0, -1):
+            if text.endswith(self.nonce[:size]):
+                return size
+        return 0
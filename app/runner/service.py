@@ -1,84 +1,196 @@
 import asyncio
-import threading
+import uuid
+from typing import Optional
 
-import paramiko
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import session_maker
+import app.runner.db_service as runner_db
+from app.database import async_session_maker
 from app.command.command import ExecAction
+from app.config import settings
+from app.jobs.schemas import JobStatus
 from app.openstack.models import get_os_default_user
-from app.servers.db_service import update_user_server
+from app.runner.output import CommandOutput, command_outputs
+from app.runner.script import SCRIPT_SHELL, StepMarkerParser, build_script, new_nonce
+from app.runner.ssh_pool import ssh_pool
+from app.runner.models import CommandExecution
+from app.servers.db_service import TAG_ADD, TAG_REMOVE
 from app.servers.models import Server
+from app.servers.tag_service import tag_writer
 from app.command.command import CommandInterface
 
+
+class CommandFailed(Exception):
+    pass
+
+
 class CommandRunner:
     LOADING_TAG="loading"
-    ERROR_TAG="loading"
-
-    SSH_PORT = 22
+    ERROR_TAG="error"
 
     def __init__(
             self,
             server: Server,
             executor: CommandInterface,
             ip_address: str,
+            execution_id: uuid.UUID,
+            key_name: Optional[str] = None,
     ):
         self.server = server
         self.executor = executor
         self.ip_address = ip_address
-
-    def _run_command_on_server(self):
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        private_key = paramiko.RSAKey.from_private_key_file(f'./keys/{self.server.owner_id}_devstask')
+        self.execution_id = execution_id
+        self.key_name = key_name or str(server.owner_id)
+        self.error: Optional[str] = None
+        self.exit_code: Optional[int] = None
+        self.steps: list[dict] = []
+
+    async def _run_command_on_server(self, output: CommandOutput):
+        commands = self.executor.get_commands()
+        nonce = new_nonce()
+        parser = StepMarkerParser(nonce, commands, output.write)
+        self.steps = parser.steps
 
         try:
-            ssh.connect(self.ip_address, port=self.SSH_PORT, username=get_os_default_user(self.server.image), pkey=private_key)
+            self.exit_code = await ssh_pool.run(
+                str(self.server.openstack_id),
+                self.ip_address,
+                get_os_default_user(self.server.image),
+                self.key_name,
+                SCRIPT_SHELL,
+                parser.feed,
+                stdin=build_script(commands, nonce),
+            )
+        finally:
+            await parser.finish()
+
+        failed_step = parser.failed_step()
+        if failed_step is not None:
+            raise CommandFailed(
+                f"Step {failed_step['index']} `{failed_step['command']}` "
+                f"exited with {failed_step['exit_code']}"
+            )
+        if self.exit_code:
+            raise CommandFailed(f'Script exited with {self.exit_code}')
 
-            for command in self.executor.get_commands():
-                print(f'Executing command: {command}')
-                stdin, stdout, stderr = ssh.exec_command(command)
-                print('Output:')
-                for line in stdout:
-                    print(line.strip())
+    async def run(self):
+        if not await self._wait_for_turn():
+            return
 
-                for line in stderr:
-                    print(f"Err: {line.strip()}")
+        tag_changes = []
 
+        output = command_outputs.open(self.execution_id, self.server.openstack_id)
+        try:
+            # inside the try, an execution that claimed its turn always finishes
+            await tag_writer.add(self.server.openstack_id, self.LOADING_TAG)
+            await self._run_with_timeout(output)
         except Exception as e:
-            raise e
+            settings.error_logger.error(f'Failed to run command on {self.server.openstack_id}: {e}')
+            self.error = str(e)
+            await output.write(f'Error: {e}\n')
+            tag_changes.append((TAG_ADD, self.ERROR_TAG))
+        else:
+            tag_changes.append((TAG_REMOVE, self.ERROR_TAG))
+            tag = self.executor.get_tag()
+            if self.executor.get_action() == ExecAction.INSTALL:
+                tag_changes.append((TAG_ADD, tag))
+            elif self.executor.get_action() == ExecAction.DELETE:
+                tag_changes.append((TAG_REMOVE, tag))
         finally:
-            ssh.close()
-
-    def run(self):
-        self._add_tag(self.LOADING_TAG)
-        with session_maker() as session:
-            update_user_server(self.server, session)
-
+            tag_changes.append((TAG_REMOVE, self.LOADING_TAG))
             try:
-                self._run_command_on_server()
+                await tag_writer.update(self.server.openstack_id, tag_changes)
             except Exception as e:
-                print(f'Error: {e}')
-                self._add_tag(self.ERROR_TAG)
-            else:
-                tag = self.executor.get_tag()
-                if self.executor.get_action() == ExecAction.INSTALL:
-                    self._add_tag(tag)
-                elif self.executor.get_action() == ExecAction.DELETE:
-                    self._remove_tag(tag)
-            finally:
-                self._remove_tag(self.LOADING_TAG)
-                update_user_server(self.server, session)
-
-    def _add_tag(self, tag):
-        if self.server.tags is None:
-            self.server.tags = []
-
-        if tag not in self.server.tags:
-            self.server.tags.append(tag)
-
-    def _remove_tag(self, tag):
-        if self.server.tags is None:
-            self.server.tags = []
-
-        self.server.tags.remove(tag)
\ No newline at end of file
+                settings.error_logger.error(
+                    f'Failed to update tags of {self.server.openstack_id}: {e}'
+                )
+            try:
+                await command_outputs.close(output)
+            except Exception as e:
+                settings.error_logger.error(
+                    f'Failed to store command output of {self.execution_id}: {e}'
+                )
+            await self._finish()
+
+    async def _run_with_timeout(self, output: CommandOutput):
+        # nothing runs longer than the timeout, so the stale sweep never fails a live execution
+        try:
+            await asyncio.wait_for(
+                self._run_command_on_server(output),
+                settings.command_execution_timeout,
+            )
+        except asyncio.TimeoutError:
+            raise CommandFailed(f'Timed out after {settings.command_execution_timeout} seconds')
+
+    async def _wait_for_turn(self) -> bool:
+        # commands for one server run one at a time, in submission order
+        while True:
+            async with async_session_maker() as session:
+                claimed = await runner_db.claim_execution(
+                    self.execution_id,
+                    self.server.openstack_id,
+                    session,
+                )
+                if claimed:
+                    return True
+
+                execution = await runner_db.get_execution(self.execution_id, session)
+                if execution is None or execution.status != JobStatus.pending.value:
+                    return False
+
+                # the execution ahead may belong to a worker that died
+                await runner_db.fail_stale_executions(
+                    settings.command_execution_timeout,
+                    settings.command_queue_timeout,
+                    session,
+                    self.server.openstack_id,
+                )
+
+            await asyncio.sleep(settings.command_queue_poll_interval)
+
+    async def _finish(self):
+        status = JobStatus.failed if self.error else JobStatus.succeeded
+        async with async_session_maker() as session:
+            await runner_db.finish_execution(
+                self.execution_id,
+                status.value,
+                self.steps,
+                self.exit_code,
+                self.error,
+                session,
+            )
+
+
+async def submit_command(
+        server: Server,
+        command: str,
+        executor: CommandInterface,
+        ip_address: str,
+        owner_id: uuid.UUID,
+        idempotency_key: Optional[str],
+        session: AsyncSession,
+        key_name: Optional[str] = None,
+) -> (CommandExecution, Optional[CommandRunner]):
+    execution, created = await runner_db.get_or_insert_execution(
+        uuid.uuid4(),
+        server.openstack_id,
+        owner_id,
+        command,
+        idempotency_key,
+        session,
+    )
+    if not created:
+        return execution, None
+
+    return execution, CommandRunner(server, executor, ip_address, execution.id, key_name)
+
+
+async def wait_for_execution(execution_id: uuid.UUID) -> Optional[CommandExecution]:
+    while True:
+        async with async_session_maker() as session:
+            execution = await runner_db.get_execution(execution_id, session)
+
+        if execution is None or execution.status not in runner_db.IN_FLIGHT_STATUSES:
+            return execution
+
+        await asyncio.sleep(settings.command_queue_poll_interval)
\ No newline at end of file
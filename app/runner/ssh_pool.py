@@ -0,0 +1,179 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+import asyncssh
+
+from app.config import settings
+from app.keystore.service import keystore
+
+SSH_PROBE_INTERVAL = 5
+
+
+class _PooledConnection:
+    def __init__(self, host: str, conn: asyncssh.SSHClientConnection):
+        self.host = host
+        self.conn = conn
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+
+# Authenticated SSH connections kept per (server, user) and shared by every command sent to that
+# server. Sessions are multiplexed as channels over one connection, kept alive with SSH keepalives
+# and closed after sitting idle.
+class SSHConnectionPool:
+    READ_SIZE = 16 * 1024
+
+    def __init__(self, idle_timeout: int, keepalive_interval: int, connect_timeout: int):
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.connect_timeout = connect_timeout
+
+        self._connections: dict[tuple[str, str], _PooledConnection] = {}
+        self._locks: dict[tuple[str, str], asyncio.Lock] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+
+        connections = list(self._connections.values())
+        self._connections.clear()
+        for pooled in connections:
+            pooled.conn.close()
+        for pooled in connections:
+            await pooled.conn.wait_closed()
+
+    def disconnect(self, server_id: str):
+        # drops connections authenticated with keys the server no longer accepts
+        for key, pooled in list(self._connections.items()):
+            if key[0] == server_id:
+                self._discard(key, pooled)
+
+    async def run(
+            self,
+            server_id: str,
+            host: str,
+            username: str,
+            key_name: str,
+            command: str,
+            on_output: Callable[[str], Awaitable],
+            stdin: Optional[str] = None,
+    ) -> Optional[int]:
+        key = (server_id, username)
+        pooled = await self._acquire(key, host, key_name)
+        try:
+            try:
+                process = await pooled.conn.create_process(command, stderr=asyncssh.STDOUT)
+            except (asyncssh.ConnectionLost, asyncssh.DisconnectError, asyncssh.ChannelOpenError):
+                # the pooled connection died between commands, retry once on a new one
+                self._discard(key, pooled)
+                self._release(pooled)
+                pooled = await self._acquire(key, host, key_name)
+                process = await pooled.conn.create_process(command, stderr=asyncssh.STDOUT)
+
+            # stderr is merged into stdout so output keeps the order it was written in
+            async with process:
+                if stdin is not None:
+                    process.stdin.write(stdin)
+                    process.stdin.write_eof()
+
+                while True:
+                    data = await process.stdout.read(self.READ_SIZE)
+                    if not data:
+                        break
+                    await on_output(data)
+
+                await process.wait()
+                return process.exit_status
+        finally:
+            self._release(pooled)
+
+    async def _acquire(self, key: tuple[str, str], host: str, key_name: str) -> _PooledConnection:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            pooled = self._connections.get(key)
+            if pooled is not None and pooled.host != host:
+                # the server got a new address
+                self._discard(key, pooled)
+                pooled = None
+
+            if pooled is None:
+                pooled = await self._connect(key, host, key_name)
+
+            pooled.in_use += 1
+            pooled.last_used = time.monotonic()
+            return pooled
+
+    async def _connect(self, key: tuple[str, str], host: str, key_name: str) -> _PooledConnection:
+        _, username = key
+        conn = await asyncssh.connect(
+            host,
+            port=settings.ssh_port,
+            username=username,
+            client_keys=[await keystore.get_private_key(key_name)],
+            known_hosts=None,
+            keepalive_interval=self.keepalive_interval,
+            connect_timeout=self.connect_timeout,
+        )
+        pooled = _PooledConnection(host, conn)
+        self._connections[key] = pooled
+
+        closed = asyncio.create_task(conn.wait_closed())
+        closed.add_done_callback(lambda _: self._forget(key, pooled))
+        return pooled
+
+    def _release(self, pooled: _PooledConnection):
+        pooled.in_use = max(pooled.in_use - 1, 0)
+        pooled.last_used = time.monotonic()
+
+    def _discard(self, key: tuple[str, str], pooled: _PooledConnection):
+        self._forget(key, pooled)
+        pooled.conn.close()
+
+    def _forget(self, key: tuple[str, str], pooled: _PooledConnection):
+        if self._connections.get(key) is pooled:
+            del self._connections[key]
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 2, 1))
+
+            now = time.monotonic()
+            for key, pooled in list(self._connections.items()):
+                if pooled.in_use == 0 and now - pooled.last_used >= self.idle_timeout:
+                    self._discard(key, pooled)
+
+
+async def wait_for_ssh(host: str, timeout: int):
+    # cloud-init brings sshd up some time after nova reports ACTIVE
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, settings.ssh_port),
+                timeout=SSH_PROBE_INTERVAL,
+            )
+        except (OSError, asyncio.TimeoutError):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f'SSH on {host} did not come up')
+            await asyncio.sleep(SSH_PROBE_INTERVAL)
+        else:
+            writer.close()
+            return
+
+
+ssh_pool = SSHConnectionPool(
+    idle_timeout=settings.ssh_idle_timeout,
+    keepalive_interval=settings.ssh_keepalive_interval,
+    connect_timeout=settings.ssh_connect_timeout,
+)
@@ -0,0 +1,79 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Optional
+
+import app.servers.db_service as db
+from app.config import settings
+from app.database import async_session_maker
+from app.servers.models import ServerConfig
+from app.servers.schemas import ServerConfiguration
+
+
+# server_config barely changes, so it is read once, kept sorted and pre-serialized with a strong
+# ETag. invalidate() is the hook for admin changes; the TTL picks up migrations and other workers'
+# changes.
+class ServerConfigCatalog:
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._configs: dict[str, ServerConfig] = {}
+        self._body: bytes = b'[]'
+        self._etag: str = ''
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        async with async_session_maker() as session:
+            server_configurations = await db.get_server_configurations(session)
+
+        server_configurations.sort(key=lambda item: item.name)
+        body = json.dumps(
+            [
+                ServerConfiguration.model_validate(config, from_attributes=True).model_dump()
+                for config in server_configurations
+            ],
+            ensure_ascii=False,
+        ).encode()
+
+        self._configs = {config.name: config for config in server_configurations}
+        self._body = body
+        self._etag = f'"{hashlib.sha256(body).hexdigest()}"'
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    async def get_catalog(self) -> (bytes, str):
+        await self._ensure_loaded()
+        return self._body, self._etag
+
+    async def get(self, name: str) -> Optional[ServerConfig]:
+        await self._ensure_loaded()
+        return self._configs.get(name)
+
+    async def _ensure_loaded(self):
+        if not self._is_stale():
+            return
+
+        async with self._lock:
+            if self._is_stale():
+                await self.load()
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == '*':
+        return True
+
+    # If-None-Match uses weak comparison
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return etag in tags
+
+
+server_config_catalog = ServerConfigCatalog(settings.server_config_catalog_ttl)
@@ -1,26 +1,50 @@
+import datetime
 import uuid
+from typing import Optional
 
-from sqlalchemy import select, delete, update
+import iso8601
+from openstack.compute.v2.server import Server as OpenStackServer
+from sqlalchemy import select, delete, update, func, cast, String
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Session
 
 from app.auth.models import User
-from app.servers.models import Server, ServerConfig
+from app.openstack.models import server_to_dict
+from app.runner.models import CommandExecution, CommandOutputChunk
+from app.servers.models import PooledServer, Server, ServerConfig, ServerState, ServerSyncState
 
+SERVER_SYNC_LOCK_ID = 720001
+WARM_POOL_LOCK_ID = 720003
+SERVER_SYNC_NAME = 'nova'
+SERVER_DELETED_STATUS = 'DELETED'
+SERVER_STATE_UPSERT_BATCH = 1000
+TAG_ADD = 'add'
+TAG_REMOVE = 'remove'
+POOL_BUILDING = 'building'
+POOL_READY = 'ready'
 
-async def is_user_server(
+
+async def get_owned_server(
         server_id: uuid.UUID,
         user: User,
         session: AsyncSession,
-) -> bool:
-    query = select(Server).where(Server.openstack_id == server_id).limit(1)
+) -> Optional[Server]:
+    # memoized on the request's session, so repeated checks in one request cost a single query
+    memo = session.info.setdefault('owned_servers', {})
+    key = (user.id, str(server_id))
+    if key in memo:
+        return memo[key]
+
+    query = select(Server).where(Server.openstack_id == server_id)
 
     if not user.is_superuser:
         query = query.where(Server.owner_id == user.id)
 
     result = await session.execute(query)
+    server = result.scalar_one_or_none()
+    memo[key] = server
 
-    return len(result.all()) != 0
+    return server
 
 
 async def get_user_server(
@@ -44,6 +68,28 @@ async def get_user_servers(
     return [server[0] for server in result.all()]
 
 
+async def get_owned_servers(
+        user: User,
+        session: AsyncSession,
+        server_ids: Optional[list[uuid.UUID]] = None,
+        tag: Optional[str] = None,
+) -> list[Server]:
+    query = select(Server)
+
+    if server_ids:
+        query = query.where(Server.openstack_id.in_(server_ids))
+
+    if tag:
+        query = query.where(Server.tags.any(tag))
+
+    if not user.is_superuser:
+        query = query.where(Server.owner_id == user.id)
+
+    result = await session.execute(query)
+
+    return list(result.scalars().all())
+
+
 async def get_all_servers(
         session: AsyncSession,
 ) -> list:
@@ -57,25 +103,55 @@ async def insert_user_server(
         user_id: uuid.UUID,
         image: str,
         session: AsyncSession,
+        tags: Optional[list[str]] = None,
 ):
-    db_server = Server(openstack_id=server_id, owner_id=user_id, image=image)
+    db_server = Server(openstack_id=server_id, owner_id=user_id, image=image, tags=tags)
     session.add(db_server)
     await session.commit()
 
 
-def update_user_server(
-        server: Server,
-        session: Session,
+async def insert_user_servers(
+        server_ids: list[uuid.UUID],
+        user_id: uuid.UUID,
+        image: str,
+        session: AsyncSession,
+        tags: Optional[list[str]] = None,
+):
+    session.add_all([
+        Server(openstack_id=server_id, owner_id=user_id, image=image, tags=tags)
+        for server_id in server_ids
+    ])
+    await session.commit()
+
+
+async def update_server_tags(
+        changes: dict[uuid.UUID, list[tuple[str, str]]],
+        session: AsyncSession,
 ):
-    db_server = session.query(Server).filter_by(openstack_id=server.openstack_id).first()
-    db_server.tags = server.tags
-    session.commit()
+    # one UPDATE per server applying its (action, tag) changes in order, evaluated against the row
+    # as stored
+    for server_id, server_changes in changes.items():
+        tags = Server.tags
+        for action, tag in server_changes:
+            tags = func.array_remove(func.coalesce(tags, cast([], ARRAY(String))), tag)
+            if action == TAG_ADD:
+                tags = func.array_append(tags, tag)
+
+        stmt = update(Server).where(Server.openstack_id == server_id).values(tags=tags)
+        await session.execute(stmt)
+
+    await session.commit()
 
 
 async def delete_user_server(
         server_id: uuid.UUID,
         session: AsyncSession,
 ):
+    await session.execute(delete(ServerState).where(ServerState.openstack_id == server_id))
+    await session.execute(
+        delete(CommandOutputChunk).where(CommandOutputChunk.server_id == server_id)
+    )
+    await session.execute(delete(CommandExecution).where(CommandExecution.server_id == server_id))
     stmt = delete(Server).where(Server.openstack_id == server_id)
     await session.execute(stmt)
     await session.commit()
@@ -90,11 +166,286 @@ async def get_server_configurations(
     return [server[0] for server in result.all()]
 
 
-async def get_server_configuration(
+async def update_server_config_ids(
         name: str,
+        values: dict,
         session: AsyncSession,
-) -> ServerConfig:
-    query = select(ServerConfig).where(ServerConfig.name == name)
+):
+    query = (
+        update(ServerConfig)
+        .where(ServerConfig.name == name)
+        .values(**values, resolved_at=func.now())
+    )
+    await session.execute(query)
+    await session.commit()
+
+
+async def update_warm_pool_size(
+        name: str,
+        size: int,
+        session: AsyncSession,
+) -> bool:
+    query = update(ServerConfig).where(ServerConfig.name == name).values(warm_pool_size=size)
     result = await session.execute(query)
+    await session.commit()
 
-    return result.scalar_one()
+    return result.rowcount > 0
+
+
+async def plan_warm_pool(
+        stale_after: int,
+        session: AsyncSession,
+) -> (list[PooledServer], list[PooledServer]):
+    # under the lock every worker sees the others' slots, so a missing server is only built once
+    await session.execute(select(func.pg_advisory_xact_lock(WARM_POOL_LOCK_ID)))
+
+    # slots whose builder died never become ready, a live builder keeps the heartbeat fresh
+    now = datetime.datetime.now(datetime.timezone.utc)
+    threshold = now - datetime.timedelta(seconds=stale_after)
+    removed = list(await session.scalars(
+        delete(PooledServer)
+        .where(PooledServer.status == POOL_BUILDING)
+        .where(PooledServer.heartbeat_at < threshold)
+        .returning(PooledServer)
+    ))
+
+    result = await session.execute(select(ServerConfig.name, ServerConfig.warm_pool_size))
+    sizes = dict(result.all())
+    counts = dict((await session.execute(
+        select(PooledServer.configuration_name, func.count())
+        .group_by(PooledServer.configuration_name)
+    )).all())
+
+    slots = []
+    for name in sizes.keys() | counts.keys():
+        missing = sizes.get(name, 0) - counts.get(name, 0)
+        if missing > 0:
+            slots.extend(
+                PooledServer(configuration_name=name, status=POOL_BUILDING) for _ in range(missing)
+            )
+        elif missing < 0:
+            # newest first, the oldest servers are the next to be claimed
+            excess = (
+                select(PooledServer.id)
+                .where(PooledServer.configuration_name == name)
+                .where(PooledServer.status == POOL_READY)
+                .order_by(PooledServer.created_at.desc())
+                .limit(-missing)
+                .with_for_update(skip_locked=True)
+            )
+            removed.extend(await session.scalars(
+                delete(PooledServer).where(PooledServer.id.in_(excess)).returning(PooledServer)
+            ))
+
+    session.add_all(slots)
+    await session.commit()
+
+    return slots, removed
+
+
+async def update_pooled_server(
+        slot_id: uuid.UUID,
+        session: AsyncSession,
+        **values,
+):
+    await session.execute(update(PooledServer).where(PooledServer.id == slot_id).values(**values))
+    await session.commit()
+
+
+async def delete_pooled_server(
+        slot_id: uuid.UUID,
+        session: AsyncSession,
+):
+    await session.execute(delete(PooledServer).where(PooledServer.id == slot_id))
+    await session.commit()
+
+
+async def claim_pooled_server(
+        configuration_name: str,
+        session: AsyncSession,
+) -> Optional[PooledServer]:
+    # concurrent claims skip each other's locked rows instead of queueing on the oldest one
+    oldest = (
+        select(PooledServer.id)
+        .where(PooledServer.configuration_name == configuration_name)
+        .where(PooledServer.status == POOL_READY)
+        .order_by(PooledServer.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    result = await session.scalars(
+        delete(PooledServer).where(PooledServer.id.in_(oldest)).returning(PooledServer)
+    )
+    pooled_server = result.one_or_none()
+    await session.commit()
+
+    return pooled_server
+
+
+async def get_pooled_server_counts(
+        session: AsyncSession,
+) -> dict[str, dict[str, int]]:
+    query = (
+        select(PooledServer.configuration_name, PooledServer.status, func.count())
+        .group_by(PooledServer.configuration_name, PooledServer.status)
+    )
+    counts = {}
+    for name, status, count in (await session.execute(query)).all():
+        counts.setdefault(name, {})[status] = count
+
+    return counts
+
+
+async def get_all_server_ids(
+        session: AsyncSession,
+) -> list[uuid.UUID]:
+    result = await session.execute(select(Server.openstack_id))
+
+    return list(result.scalars().all())
+
+
+async def try_lock_server_sync(
+        session: AsyncSession,
+) -> bool:
+    # held until the end of the current transaction
+    result = await session.execute(select(func.pg_try_advisory_xact_lock(SERVER_SYNC_LOCK_ID)))
+
+    return bool(result.scalar())
+
+
+async def get_server_sync_state(
+        session: AsyncSession,
+) -> Optional[ServerSyncState]:
+    query = select(ServerSyncState).where(ServerSyncState.name == SERVER_SYNC_NAME)
+    result = await session.execute(query)
+
+    return result.scalar_one_or_none()
+
+
+async def save_server_sync_state(
+        session: AsyncSession,
+        **values,
+):
+    stmt = insert(ServerSyncState).values(name=SERVER_SYNC_NAME, **values)
+    stmt = stmt.on_conflict_do_update(index_elements=[ServerSyncState.name], set_=values)
+    await session.execute(stmt)
+    await session.commit()
+
+
+async def get_server_states(
+        server_ids: list[uuid.UUID],
+        max_age: int,
+        session: AsyncSession,
+) -> dict[str, ServerState]:
+    threshold = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=max_age)
+    query = select(ServerState).where(ServerState.openstack_id.in_(server_ids))
+
+    # a recent incremental sync vouches for every row it did not have to touch
+    sync_state = await get_server_sync_state(session)
+    last_synced_at = sync_state.last_synced_at if sync_state is not None else None
+    if last_synced_at is None or last_synced_at < threshold:
+        query = query.where(ServerState.synced_at >= threshold)
+
+    result = await session.execute(query)
+
+    return {str(state.openstack_id): state for state in result.scalars().all()}
+
+
+async def upsert_server_states(
+        servers: list[OpenStackServer],
+        session: AsyncSession,
+):
+    if not servers:
+        return
+
+    synced_at = datetime.datetime.now(datetime.timezone.utc)
+    rows = [_get_server_state_row(server, synced_at) for server in servers]
+
+    # keep each statement well below the postgres bind parameter limit
+    for start in range(0, len(rows), SERVER_STATE_UPSERT_BATCH):
+        stmt = insert(ServerState).values(rows[start:start + SERVER_STATE_UPSERT_BATCH])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ServerState.openstack_id],
+            set_={column: stmt.excluded[column] for column in rows[0] if column != 'openstack_id'},
+        )
+        await session.execute(stmt)
+    await session.commit()
+
+
+async def delete_server_states(
+        server_ids: list,
+        session: AsyncSession,
+):
+    if not server_ids:
+        return
+
+    await session.execute(delete(ServerState).where(ServerState.openstack_id.in_(server_ids)))
+    await session.commit()
+
+
+async def mark_server_states_deleted(
+        server_ids: list,
+        session: AsyncSession,
+):
+    if not server_ids:
+        return
+
+    synced_at = datetime.datetime.now(datetime.timezone.utc)
+    rows = [
+        {
+            'openstack_id': server_id,
+            'status': SERVER_DELETED_STATUS,
+            'is_deleted': True,
+            'data': {'id': str(server_id)},
+            'synced_at': synced_at,
+        }
+        for server_id in server_ids
+    ]
+
+    for start in range(0, len(rows), SERVER_STATE_UPSERT_BATCH):
+        stmt = insert(ServerState).values(rows[start:start + SERVER_STATE_UPSERT_BATCH])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ServerState.openstack_id],
+            set_={
+                'status': stmt.excluded.status,
+                'is_deleted': True,
+                'synced_at': stmt.excluded.synced_at,
+            },
+        )
+        await session.execute(stmt)
+    await session.commit()
+
+
+async def delete_orphan_server_states(
+        session: AsyncSession,
+):
+    stmt = delete(ServerState).where(ServerState.openstack_id.not_in(select(Server.openstack_id)))
+    await session.execute(stmt)
+    await session.commit()
+
+
+def _get_server_state_row(server: OpenStackServer, synced_at: datetime.datetime) -> dict:
+    data = server_to_dict(server)
+    return {
+        'openstack_id': server.id,
+        'name': server.name,
+        'status': server.status,
+        'vm_state': server.vm_state,
+        'task_state': server.task_state,
+        'addresses': data.get('addresses'),
+        'flavor': data.get('flavor'),
+        'launched_at': _parse_timestamp(server.launched_at),
+        'terminated_at': _parse_timestamp(server.terminated_at),
+        'created_at': _parse_timestamp(server.created_at),
+        'updated_at': _parse_timestamp(server.updated_at),
+        'is_deleted': server.status == SERVER_DELETED_STATUS or server.vm_state == 'deleted',
+        'data': data,
+        'synced_at': synced_at,
+    }
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+
+    return iso8601.parse_date(value)
@@ -1,4 +1,7 @@
-from sqlalchemy import Column, String, UUID, ForeignKey, ARRAY
+import uuid
+
+from sqlalchemy import Column, String, UUID, ForeignKey, ARRAY, DateTime, Boolean, Integer, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from app.auth.models import Base
@@ -21,3 +24,60 @@ class ServerConfig(Base):
     image = Column(String, nullable=False)
     flavor = Column(String, nullable=False)
     networks = Column(ARRAY(String))
+    # openstack ids resolved from the names above by the server config resolver
+    image_id = Column(String, nullable=True)
+    flavor_id = Column(String, nullable=True)
+    network_ids = Column(ARRAY(String), nullable=True)
+    floating_network_id = Column(String, nullable=True)
+    resolved_at = Column(DateTime(timezone=True), nullable=True)
+    # servers of this configuration kept booted and ready to be claimed
+    warm_pool_size = Column(Integer, nullable=False, server_default='0')
+
+
+class ServerState(Base):
+    __tablename__ = "server_state"
+    openstack_id = Column(UUID, primary_key=True)
+    name = Column(String, nullable=True)
+    status = Column(String, nullable=True)
+    vm_state = Column(String, nullable=True)
+    task_state = Column(String, nullable=True)
+    addresses = Column(JSONB, nullable=True)
+    flavor = Column(JSONB, nullable=True)
+    launched_at = Column(DateTime(timezone=True), nullable=True)
+    terminated_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    is_deleted = Column(Boolean, nullable=False, server_default='false')
+    # full server body, used to rebuild the openstack resource when serving from the mirror
+    data = Column(JSONB, nullable=False)
+    synced_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class ServerSyncState(Base):
+    __tablename__ = "server_sync_state"
+    name = Column(String, primary_key=True)
+    # newest nova updated_at seen so far, next cycle asks for changes-since this moment
+    high_water_mark = Column(DateTime(timezone=True), nullable=True)
+    last_started_at = Column(DateTime(timezone=True), nullable=True)
+    last_synced_at = Column(DateTime(timezone=True), nullable=True)
+    last_full_sync_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class PooledServer(Base):
+    __tablename__ = "pooled_server"
+    id = Column(UUID, primary_key=True, default=uuid.uuid4)
+    configuration_name = Column(
+        String,
+        ForeignKey("server_config.name"),
+        nullable=False,
+        index=True,
+    )
+    # building while the slot is being filled, ready once the server answers on ssh
+    status = Column(String, nullable=False)
+    openstack_id = Column(UUID, nullable=True, unique=True)
+    floating_ip_id = Column(String, nullable=True)
+    ip_address = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    ready_at = Column(DateTime(timezone=True), nullable=True)
+    # bumped while the slot is waiting for or being filled
+    heartbeat_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,307 @@
+import asyncio
+import shlex
+import time
+from collections import deque
+from typing import Optional
+
+from openstack import connection
+from openstack.compute.v2.server import Server as OpenStackServer
+from sqlalchemy import func
+
+import app.openstack.compute_service as openstack
+import app.openstack.network_service as network_service
+import app.servers.db_service as db
+import app.servers.service as servers_service
+from app.auth.models import User
+from app.config import settings
+from app.database import async_session_maker
+from app.keystore.service import Keypair, keystore
+from app.openstack.config import connection_manager
+from app.openstack.executor import run_mutation, run_read
+from app.openstack.limits_service import compute_limits
+from app.openstack.models import get_os_default_user
+from app.runner.ssh_pool import ssh_pool, wait_for_ssh
+from app.servers.catalog_service import server_config_catalog
+from app.servers.models import PooledServer, ServerConfig
+from app.servers.resolver_service import ResolvedServerConfig
+
+
+class _PoolStats:
+    WINDOW = 256
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.claim_failures = 0
+        self.refills = 0
+        self.refill_failures = 0
+        self.claim_times = deque(maxlen=self.WINDOW)
+        self.refill_times = deque(maxlen=self.WINDOW)
+
+
+def _avg_ms(values) -> float:
+    if not values:
+        return 0.0
+    return round(sum(values) / len(values) * 1000, 2)
+
+
+# Keeps warm_pool_size servers of each configuration booted, with a floating ip and sshd up, so a
+# create request only has to rename one and hand it over. Pooled servers accept the pool key until
+# they are claimed, then only the new owner's key.
+class WarmPool:
+    def __init__(self, interval: int, refill_concurrency: int, keypair_name: str):
+        self.interval = interval
+        self.refill_concurrency = refill_concurrency
+        self.keypair_name = keypair_name
+
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._stats = _PoolStats()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def wake(self):
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refill()
+            except Exception as e:
+                settings.error_logger.error(f'Failed to refill the warm pool: {e}')
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def refill(self):
+        async with async_session_maker() as session:
+            slots, removed = await db.plan_warm_pool(settings.warm_pool_slot_stale_after, session)
+
+        if not slots and not removed:
+            return
+
+        conn = await run_read(connection_manager.get_connection)
+        for pooled_server in removed:
+            await self._delete(conn, pooled_server)
+
+        semaphore = asyncio.Semaphore(self.refill_concurrency)
+
+        async def fill(slot: PooledServer):
+            # a slot queued behind the others is not abandoned either
+            heartbeat = asyncio.create_task(_heartbeat(slot))
+            try:
+                async with semaphore:
+                    await self._fill(conn, slot)
+            finally:
+                heartbeat.cancel()
+
+        await asyncio.gather(*(fill(slot) for slot in slots))
+
+    async def _fill(self, conn: connection.Connection, slot: PooledServer):
+        started_at = time.monotonic()
+        name = f'pool-{slot.configuration_name}-{str(slot.id)[:8]}'
+        volume_ids = []
+        async with async_session_maker() as session:
+            try:
+                server_config = await server_config_catalog.get(slot.configuration_name)
+                if server_config is None:
+                    raise RuntimeError('Server configuration not found')
+
+                # pooled servers count against the same quota as user servers
+                quota_error, flavor_size = await compute_limits.check_create(
+                    conn,
+                    server_config.flavor_id or server_config.flavor,
+                )
+                if quota_error:
+                    raise RuntimeError(quota_error)
+                compute_limits.reserve(flavor_size)
+
+                resolved_config = ResolvedServerConfig(server_config)
+                await resolved_config.ensure_resolved()
+
+                block_device_mapping = await servers_service.create_server_volume(
+                    conn,
+                    name,
+                    resolved_config,
+                )
+                volume_ids = servers_service.get_volume_ids(block_device_mapping)
+                server, _ = await servers_service.boot_server(
+                    conn,
+                    self.keypair_name,
+                    name,
+                    '',
+                    resolved_config,
+                    block_device_mapping,
+                )
+                slot.openstack_id = server.id
+                await db.update_pooled_server(slot.id, session, openstack_id=server.id)
+
+                floating_ip = await servers_service.assign_floating_ip(
+                    conn,
+                    server,
+                    resolved_config,
+                )
+                if floating_ip is None:
+                    raise RuntimeError('No port to assign a floating ip to')
+                slot.floating_ip_id = floating_ip.id
+                await db.update_pooled_server(slot.id, session, floating_ip_id=floating_ip.id)
+
+                await wait_for_ssh(floating_ip.floating_ip_address, settings.ssh_ready_timeout)
+                await db.update_pooled_server(
+                    slot.id,
+                    session,
+                    status=db.POOL_READY,
+                    ip_address=floating_ip.floating_ip_address,
+                    ready_at=func.now(),
+                )
+            except Exception as e:
+                settings.error_logger.error(
+                    f'Failed to fill warm pool slot of {slot.configuration_name}: {e}'
+                )
+                self._stats.refill_failures += 1
+                await session.rollback()
+                await db.delete_pooled_server(slot.id, session)
+                compute_limits.invalidate()
+                # before the boot only the volume exists, the server takes it along afterwards
+                await servers_service.discard_created_resources(
+                    conn,
+                    name,
+                    slot.openstack_id,
+                    volume_ids,
+                    slot.floating_ip_id,
+                )
+            else:
+                self._stats.refills += 1
+                self._stats.refill_times.append(time.monotonic() - started_at)
+
+    async def _delete(self, conn: connection.Connection, pooled_server: PooledServer):
+        try:
+            if pooled_server.floating_ip_id:
+                await run_mutation(
+                    network_service.delete_floating_ip,
+                    conn,
+                    pooled_server.floating_ip_id,
+                )
+            if pooled_server.openstack_id:
+                await run_mutation(openstack.delete_server, conn, str(pooled_server.openstack_id))
+                compute_limits.invalidate()
+        except Exception as e:
+            settings.error_logger.error(
+                f'Failed to delete pooled server {pooled_server.openstack_id}: {e}'
+            )
+
+    async def claim(
+            self,
+            conn: connection.Connection,
+            user: User,
+            name: str,
+            description: str,
+            server_config: ServerConfig,
+            session,
+    ) -> Optional[tuple[OpenStackServer, Keypair, str]]:
+        started_at = time.monotonic()
+        pooled_server = await db.claim_pooled_server(server_config.name, session)
+        if pooled_server is None:
+            if server_config.warm_pool_size:
+                self._stats.misses += 1
+                self.wake()
+            return None
+
+        self.wake()
+        server_id = str(pooled_server.openstack_id)
+        try:
+            key_pair = await keystore.ensure_keypair(conn, str(user.id))
+            await self._authorize_key(pooled_server, server_config, key_pair.public_key)
+            await run_mutation(openstack.update_server, conn, server_id, name, description)
+            openstack_server = await run_read(openstack.get_server, conn, server_id)
+        except Exception as e:
+            # the caller falls back to a regular create, the half-claimed server is not reused
+            settings.error_logger.error(f'Failed to claim pooled server {server_id}: {e}')
+            self._stats.claim_failures += 1
+            await self._delete(conn, pooled_server)
+            return None
+
+        self._stats.hits += 1
+        self._stats.claim_times.append(time.monotonic() - started_at)
+        return openstack_server, key_pair, pooled_server.ip_address
+
+    async def _authorize_key(
+            self,
+            pooled_server: PooledServer,
+            server_config: ServerConfig,
+            public_key: str,
+    ):
+        server_id = str(pooled_server.openstack_id)
+        output = []
+
+        async def collect(data: str):
+            output.append(data)
+
+        # replaces the pool key, from now on only the owner's key gets in
+        exit_status = await ssh_pool.run(
+            server_id,
+            pooled_server.ip_address,
+            get_os_default_user(server_config.image),
+            self.keypair_name,
+            'umask 077 && mkdir -p ~/.ssh'
+            f' && printf "%s\\n" {shlex.quote(public_key.strip())} > ~/.ssh/authorized_keys',
+            collect,
+        )
+        ssh_pool.disconnect(server_id)
+        if exit_status:
+            raise RuntimeError(f'Failed to install the owner key: {"".join(output).strip()}')
+
+    async def get_stats(self) -> dict:
+        async with async_session_maker() as session:
+            counts = await db.get_pooled_server_counts(session)
+
+        stats = self._stats
+        requests = stats.hits + stats.misses
+        return {
+            'configurations': {
+                name: {
+                    'ready': statuses.get(db.POOL_READY, 0),
+                    'building': statuses.get(db.POOL_BUILDING, 0),
+                }
+                for name, statuses in counts.items()
+            },
+            'hits': stats.hits,
+            'misses': stats.misses,
+            'hit_rate': round(stats.hits / requests, 4) if requests else 0.0,
+            'claim_failures': stats.claim_failures,
+            'avg_claim_ms': _avg_ms(stats.claim_times),
+            'refills': stats.refills,
+            'refill_failures': stats.refill_failures,
+            'avg_refill_ms': _avg_ms(stats.refill_times),
+            'max_refill_ms': round(max(stats.refill_times, default=0) * 1000, 2),
+        }
+
+
+async def _heartbeat(slot: PooledServer):
+    while True:
+        await asyncio.sleep(settings.warm_pool_slot_stale_after / 3)
+        async with async_session_maker() as session:
+            await db.update_pooled_server(slot.id, session, heartbeat_at=func.now())
+
+
+warm_pool = WarmPool(
+    interval=settings.warm_pool_interval,
+    refill_concurrency=settings.warm_pool_refill_concurrency,
+    keypair_name=settings.warm_pool_keypair,
+)
@@ -0,0 +1,115 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+from openstack.exceptions import BadRequestException, ResourceNotFound
+
+import app.openstack.compute_service as openstack
+import app.servers.db_service as db
+from app.config import settings
+from app.database import async_session_maker
+from app.openstack.config import connection_manager
+from app.openstack.executor import run_read
+from app.servers.catalog_service import server_config_catalog
+from app.servers.models import ServerConfig
+
+
+# Resolves the image/flavor/network names of every server_config to OpenStack ids in the background,
+# so creating a server doesn't list images, flavors and networks just to find them by name.
+class ServerConfigResolver:
+    def __init__(self, interval: int):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.resolve_all()
+            except Exception as e:
+                settings.error_logger.error(f'Failed to resolve server configurations: {e}')
+
+            await asyncio.sleep(self.interval)
+
+    async def resolve_all(self):
+        async with self._lock:
+            async with async_session_maker() as session:
+                server_configs = await db.get_server_configurations(session)
+                await self._resolve(server_configs, session)
+
+    async def resolve(self, name: str) -> Optional[ServerConfig]:
+        async with self._lock:
+            async with async_session_maker() as session:
+                server_configs = [
+                    server_config
+                    for server_config in await db.get_server_configurations(session)
+                    if server_config.name == name
+                ]
+                await self._resolve(server_configs, session)
+
+        return await server_config_catalog.get(name)
+
+    async def _resolve(self, server_configs: list[ServerConfig], session):
+        if not server_configs:
+            return
+
+        conn = await run_read(connection_manager.get_connection)
+        resolved = await run_read(openstack.resolve_server_configs, conn, server_configs)
+        for name, values in resolved.items():
+            await db.update_server_config_ids(name, values, session)
+
+        server_config_catalog.invalidate()
+
+
+server_config_resolver = ServerConfigResolver(settings.server_config_resolve_interval)
+
+
+# Runs create steps with the resolved ids of a configuration. When OpenStack no longer knows one of
+# them (an image was re-uploaded, a network recreated) the configuration is resolved again and the
+# failed step is retried once with the new ids.
+class ResolvedServerConfig:
+    def __init__(self, server_config: ServerConfig):
+        self.server_config = server_config
+        self._refreshed = False
+
+    async def ensure_resolved(self):
+        if self.server_config.resolved_at is not None:
+            return
+
+        try:
+            await self._refresh()
+        except Exception as e:
+            # boot_server still falls back to name lookups
+            settings.error_logger.error(
+                f'Failed to resolve server configuration {self.server_config.name}: {e}'
+            )
+
+    async def call(self, step: Callable[[ServerConfig], Awaitable]) -> Any:
+        try:
+            return await step(self.server_config)
+        except (ResourceNotFound, BadRequestException):
+            if self._refreshed or self.server_config.resolved_at is None:
+                raise
+
+            self._refreshed = True
+            await self._refresh()
+            return await step(self.server_config)
+
+    async def _refresh(self):
+        server_config = await server_config_resolver.resolve(self.server_config.name)
+        if server_config is not None:
+            self.server_config = server_config
@@ -1,35 +1,54 @@
+import asyncio
 import uuid
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Header, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from openstack import connection
+from openstack.compute.v2.server import Server as OpenStackServer
 from openstack.exceptions import ConflictException, ResourceNotFound, DuplicateResource
 from openstack.exceptions import  HttpException as OpenstackHTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import app.openstack.compute_service as openstack
+import app.images.db_service as images_db
+import app.jobs.db_service as jobs_db
+import app.runner.db_service as runner_db
 import app.servers.db_service as db
 from app.auth.config import fastapi_users
 from app.auth.models import User
-from app.command.echo import EchoCommand
 from app.config import settings
 from app.dependencies import get_openstack_connection, get_async_session
-from app.command.command import ExecAction
-from app.command.grafana import GrafanaCommand
-from app.command.matplotlib import MatplotlibCommand
-from app.command.mongo import MongoCommand
-from app.command.postgres import PostgresCommand
-from app.command.pytorch import TorchCommand
-from app.command.tensorflow import TensorflowCommand
+from app.jobs.schemas import CommandBatchCreated, JobStatus, ProvisioningJobCreated
+from app.jobs.service import start_command_batch, start_provisioning_job
+from app.openstack.executor import run_read, run_mutation
+from app.openstack.limits_service import compute_limits
 from app.servers.schemas import (
     Server as ServerSchema,
     ServerDetailed as ServerDetailedSchema,
     ServerStateActionUpdate,
-    ServerStateActionEnum, ServerConfiguration, ServeCreate, ServeUpdate, ServerCommand, ServerCommandEnum
+    ServerConfiguration, ServeCreate, ServeUpdate, ServerCommand, BulkServerCommand,
+    WarmPoolUpdate, ServerBulkCreate, ServerBulkCreated, BulkServerStateAction,
+    ServerStateActionResult, ServerToolEnum,
 )
-from app.servers.service import send_keypair_email
-from app.openstack.models import get_os_default_user, get_server_public_ip
-from app.runner.service import CommandRunner
-from fastapi.concurrency import run_in_threadpool
+from app.servers.catalog_service import server_config_catalog, etag_matches
+from app.images.models import BakedImage
+from app.servers.models import Server, ServerConfig
+from app.servers.pool_service import warm_pool
+from app.servers.service import (
+    send_keypair_email,
+    provision_server,
+    provision_servers,
+    discard_created_resources,
+    get_command_executor,
+    get_state_action,
+    apply_state_action,
+    StepTimings,
+)
+from app.openstack.models import get_os_default_user, get_server_public_ip, server_from_dict
+from app.runner.output import command_outputs
+from app.runner.schemas import CommandExecution as CommandExecutionSchema, CommandExecutionSubmitted
+from app.runner.service import submit_command
 
 current_user = fastapi_users.current_user()
 
@@ -41,16 +60,67 @@ router = APIRouter(
 
 @router.get("/configurations", response_model=list[ServerConfiguration])
 async def get_server_configurations(
+        if_none_match: Optional[str] = Header(None),
         _: User = Depends(current_user),
-        session: AsyncSession = Depends(get_async_session),
 ):
     try:
-        server_configurations = await db.get_server_configurations(session)
-        server_configurations.sort(key=lambda item: item.name)
+        body, etag = await server_config_catalog.get_catalog()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list server configurations: {e}")
 
-    return server_configurations
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={'ETag': etag})
+
+    return Response(content=body, media_type='application/json', headers={'ETag': etag})
+
+
+@router.post("/configurations/refresh", status_code=204)
+async def refresh_server_configurations(
+        user: User = Depends(current_user),
+):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    server_config_catalog.invalidate()
+    try:
+        await server_config_catalog.load()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to reload server configurations: {e}")
+
+
+@router.put("/configurations/{name}/warm-pool", status_code=204)
+async def update_warm_pool_size(
+        name: str,
+        req: WarmPoolUpdate,
+        user: User = Depends(current_user),
+        session: AsyncSession = Depends(get_async_session),
+):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    try:
+        updated = await db.update_warm_pool_size(name, req.size, session)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update warm pool: {e}")
+
+    if not updated:
+        raise HTTPException(status_code=404, detail="Server configuration not found")
+
+    server_config_catalog.invalidate()
+    warm_pool.wake()
+
+
+@router.get("/pool/stats")
+async def get_warm_pool_stats(
+        user: User = Depends(current_user),
+):
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    try:
+        return await warm_pool.get_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get warm pool stats: {e}")
 
 
 @router.get("/limit")
@@ -58,130 +128,447 @@ async def get_server_limit(
         conn: connection.Connection = Depends(get_openstack_connection),
         _: User = Depends(current_user),
 ):
-    return {'limit': openstack.get_instance_limit(conn)}
+    limits = await compute_limits.get_limits(conn)
+    return {'limit': limits.instance_limit}
+
+
+async def _get_owned_server(
+        server_id: uuid.UUID,
+        user: User,
+        session: AsyncSession,
+) -> Server:
+    server = await db.get_owned_server(server_id, user, session)
+    if server is None:
+        raise HTTPException(status_code=404, detail="Server not found")
+
+    return server
+
+
+async def _find_baked_image(
+        server_config: ServerConfig,
+        tools: list[ServerToolEnum],
+        session: AsyncSession,
+) -> Optional[BakedImage]:
+    if not tools:
+        return None
+
+    baked_image = await images_db.find_baked_image(
+        server_config.name,
+        [tool.value for tool in tools],
+        session,
+    )
+    if baked_image is None:
+        raise HTTPException(status_code=409, detail="No baked image for these tools")
+
+    return baked_image
+
+
+async def _list_user_servers(
+        user: User,
+        conn: connection.Connection,
+        session: AsyncSession,
+        configurable_only: bool = False,
+        fresh: bool = False,
+) -> list[ServerSchema]:
+    if user.is_superuser:
+        user_servers = await db.get_all_servers(session)
+    else:
+        user_servers = await db.get_user_servers(user, session)
+
+    if configurable_only:
+        user_servers = [server for server in user_servers if 'cirros' not in server.image]
+
+    if len(user_servers) == 0:
+        return []
+
+    server_ids = [server.openstack_id for server in user_servers]
+    openstack_servers = await _get_openstack_servers(server_ids, user, conn, session, fresh)
+
+    return [
+        ServerSchema.create_from_openstack_server(
+            user.id,
+            openstack_servers[str(server.openstack_id)],
+            server,
+        )
+        for server in user_servers
+        if str(server.openstack_id) in openstack_servers
+    ]
+
+
+async def _get_openstack_servers(
+        server_ids: list[uuid.UUID],
+        user: User,
+        conn: connection.Connection,
+        session: AsyncSession,
+        fresh: bool = False,
+) -> dict[str, OpenStackServer]:
+    states = {}
+    if not fresh:
+        states = await db.get_server_states(
+            server_ids,
+            settings.server_state_max_staleness,
+            session,
+        )
+
+    openstack_servers = {
+        server_id: server_from_dict(state.data)
+        for server_id, state in states.items()
+        if not state.is_deleted
+    }
+
+    stale_ids = [server_id for server_id in server_ids if str(server_id) not in states]
+    if stale_ids:
+        lookup = await run_read(openstack.get_servers_by_ids, conn, stale_ids)
+        if lookup.missing_ids:
+            settings.info_logger.warning(
+                "Servers not found in OpenStack",
+                extra={'user_id': str(user.id), 'missing_ids': lookup.missing_ids},
+            )
+
+        await db.upsert_server_states(lookup.servers, session)
+        await db.mark_server_states_deleted(lookup.missing_ids, session)
+        openstack_servers.update(
+            {server.id: server for server in lookup.servers if not _is_deleted(server)}
+        )
+
+    return openstack_servers
+
+
+async def _get_openstack_server(
+        server_id: uuid.UUID,
+        conn: connection.Connection,
+        session: AsyncSession,
+        fresh: bool = False,
+) -> OpenStackServer:
+    state = None
+    if not fresh:
+        states = await db.get_server_states(
+            [server_id],
+            settings.server_state_max_staleness,
+            session,
+        )
+        state = states.get(str(server_id))
+
+    if state is not None:
+        openstack_server = None if state.is_deleted else server_from_dict(state.data)
+    else:
+        openstack_server = await run_read(openstack.get_server, conn, str(server_id))
+        if openstack_server:
+            await db.upsert_server_states([openstack_server], session)
+        else:
+            await db.mark_server_states_deleted([server_id], session)
+
+    if openstack_server is None or _is_deleted(openstack_server):
+        raise ResourceNotFound(f"Server {server_id} not found")
+
+    return openstack_server
+
+
+def _is_deleted(openstack_server: OpenStackServer) -> bool:
+    return openstack_server.status == db.SERVER_DELETED_STATUS
 
 
 @router.get("", response_model=list[ServerSchema])
 async def get_user_servers_list(
+        fresh: bool = False,
         user: User = Depends(current_user),
         conn: connection.Connection = Depends(get_openstack_connection),
         session: AsyncSession = Depends(get_async_session)
 ):
     try:
-        if user.is_superuser:
-            user_servers = await db.get_all_servers(session)
-        else:
-            user_servers = await db.get_user_servers(user, session)
-
-        if len(user_servers) == 0:
-            return []
-        server_ids = [server.openstack_id for server in user_servers]
-        servers = openstack.get_servers_by_ids(conn, server_ids)
-
-        user_server_map={str(server.openstack_id): server for server in user_servers}
-
+        servers = await _list_user_servers(user, conn, session, fresh=fresh)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list server: {e}")
 
-    return [ServerSchema.create_from_openstack_server(user.id, server, user_server_map.get(server.id, {})) for server in servers]
+    return servers
 
 
 @router.get("/instruments", response_model=list[ServerSchema])
 async def get_configurable_user_servers_list(
+        fresh: bool = False,
         user: User = Depends(current_user),
         conn: connection.Connection = Depends(get_openstack_connection),
         session: AsyncSession = Depends(get_async_session)
 ):
     try:
-        if user.is_superuser:
-            user_servers = await db.get_all_servers(session)
-        else:
-            user_servers = await db.get_user_servers(user, session)
+        servers = await _list_user_servers(user, conn, session, configurable_only=True, fresh=fresh)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to list server: {e}")
 
-        if len(user_servers) == 0:
-            return []
+    return servers
 
-        server_ids = []
-        for server in user_servers:
-            if 'cirros' not in server.image:
-                server_ids.append(server.openstack_id)
+@router.post("/commands", status_code=202, response_model=CommandBatchCreated)
+async def run_command_on_servers(
+        req: BulkServerCommand,
+        user: User = Depends(current_user),
+        conn: connection.Connection = Depends(get_openstack_connection),
+        session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        # every target is authorized by this one query
+        servers = await db.get_owned_servers(user, session, server_ids=req.server_ids, tag=req.tag)
+        if not servers:
+            raise HTTPException(status_code=404, detail="No servers match the selector")
+
+        openstack_servers = await _get_openstack_servers(
+            [server.openstack_id for server in servers],
+            user,
+            conn,
+            session,
+        )
 
-        servers = openstack.get_servers_by_ids(conn, server_ids)
+        targets = {}
+        submissions = []
+        for server in servers:
+            server_id = str(server.openstack_id)
+            executor = get_command_executor(req.command)
+            if server_id not in openstack_servers:
+                targets[server_id] = {'status': JobStatus.failed.value, 'error': 'Server not found'}
+            elif executor is None:
+                targets[server_id] = {'status': JobStatus.skipped.value}
+            else:
+                targets[server_id] = {'status': JobStatus.pending.value}
+                submissions.append((server, executor))
+
+        # requested ids the user doesn't own are reported like missing ones, as by PATCH /state
+        owned_ids = {str(server.openstack_id) for server in servers}
+        for server_id in dict.fromkeys(req.server_ids or []):
+            if str(server_id) not in owned_ids:
+                targets[str(server_id)] = {
+                    'status': JobStatus.failed.value,
+                    'error': 'Server not found',
+                }
+
+        concurrency = max(min(
+            req.concurrency or settings.command_batch_concurrency,
+            settings.command_batch_max_concurrency,
+        ), 1)
+        # the batch goes first, every execution queued below is started by it
+        batch = await jobs_db.insert_command_batch(
+            user.id,
+            req.command.value,
+            concurrency,
+            targets,
+            session,
+        )
+        batch_id = batch.id
+
+        executions = {}
+        for server, executor in submissions:
+            server_id = str(server.openstack_id)
+            try:
+                execution, runner = await submit_command(
+                    server,
+                    req.command.value,
+                    executor,
+                    get_server_public_ip(openstack_servers[server_id]),
+                    user.id,
+                    None,
+                    session,
+                )
+            except Exception as e:
+                settings.error_logger.error(f'Failed to queue command on {server_id}: {e}')
+                await session.rollback()
+                targets[server_id] = {'status': JobStatus.failed.value, 'error': str(e)}
+                continue
+            targets[server_id] = {
+                'status': JobStatus.pending.value,
+                'execution_id': str(execution.id),
+            }
+            executions[server_id] = (execution.id, runner)
+
+        start_command_batch(batch_id, targets, executions, concurrency)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to run command: {e}")
 
-        user_server_map={str(server.openstack_id): server for server in user_servers}
+    return JSONResponse(
+        status_code=202,
+        content=CommandBatchCreated(batch_id=batch_id).model_dump(mode='json'),
+        headers={'Location': f'/jobs/batches/{batch_id}'},
+    )
+
+
+@router.patch("/state", response_model=list[ServerStateActionResult])
+async def set_servers_state_action(
+        req: BulkServerStateAction,
+        user: User = Depends(current_user),
+        conn: connection.Connection = Depends(get_openstack_connection),
+        session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        # every target is authorized by this one query
+        servers = await db.get_owned_servers(user, session, server_ids=req.server_ids, tag=req.tag)
+        if not servers:
+            raise HTTPException(status_code=404, detail="No servers match the selector")
+
+        server_ids = [str(server.openstack_id) for server in servers]
+        concurrency = min(
+            req.concurrency or settings.server_state_concurrency,
+            settings.server_state_max_concurrency,
+        )
+        errors = await apply_state_action(conn, server_ids, req.action, max(concurrency, 1))
 
+        await db.delete_server_states([server.openstack_id for server in servers], session)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to list server: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to set server states: {e}")
 
-    return [ServerSchema.create_from_openstack_server(user.id, server, user_server_map.get(server.id, {})) for server in servers]
+    results = [
+        ServerStateActionResult(
+            server_id=server_id,
+            status=JobStatus.failed if error else JobStatus.succeeded,
+            error=error,
+        )
+        for server_id, error in errors.items()
+    ]
+    # requested ids the user doesn't own are reported like missing ones
+    owned_ids = set(server_ids)
+    results.extend(
+        ServerStateActionResult(
+            server_id=server_id,
+            status=JobStatus.failed,
+            error='Server not found',
+        )
+        for server_id in dict.fromkeys(req.server_ids or [])
+        if str(server_id) not in owned_ids
+    )
+    return results
 
-@router.post("/{server_id}/command", status_code=200)
+
+@router.post("/{server_id}/command", status_code=200, response_model=CommandExecutionSubmitted)
 async def run_command_on_server(
         background_tasks: BackgroundTasks,
         server_id: uuid.UUID,
         server_command: ServerCommand,
+        idempotency_key: Optional[str] = Header(None),
         user: User = Depends(current_user),
         conn: connection.Connection = Depends(get_openstack_connection),
         session: AsyncSession = Depends(get_async_session),
 ):
     try:
-        if not await db.is_user_server(server_id, user, session):
-            return HTTPException(status_code=404, detail="Server not found")
-
-        server = await db.get_user_server(user, str(server_id), session)
-        openstack_server = openstack.get_server(conn, str(server_id))
-        executor = None
-        match server_command.command:
-            case ServerCommandEnum.install_torch :
-                executor = TorchCommand(ExecAction.INSTALL)
-            case ServerCommandEnum.delete_torch:
-                executor = TorchCommand(ExecAction.DELETE)
-            case ServerCommandEnum.install_tensorflow:
-                executor = TensorflowCommand(ExecAction.INSTALL)
-            case ServerCommandEnum.delete_tensorflow:
-                executor = TensorflowCommand(ExecAction.DELETE)
-            case ServerCommandEnum.install_grafana:
-                executor = GrafanaCommand(ExecAction.INSTALL)
-            case ServerCommandEnum.delete_grafana:
-                executor = GrafanaCommand(ExecAction.DELETE)
-            case ServerCommandEnum.install_matplotlib:
-                executor = MatplotlibCommand(ExecAction.INSTALL)
-            case ServerCommandEnum.delete_matplotlib:
-                executor = MatplotlibCommand(ExecAction.DELETE)
-            case ServerCommandEnum.install_postgres:
-                executor = PostgresCommand(ExecAction.INSTALL)
-            case ServerCommandEnum.delete_postgres:
-                executor = PostgresCommand(ExecAction.DELETE)
-            case ServerCommandEnum.install_mongo:
-                executor = MongoCommand(ExecAction.INSTALL)
-            case ServerCommandEnum.delete_mongo:
-                executor = MongoCommand(ExecAction.DELETE)
-            case ServerCommandEnum.echo:
-                executor = EchoCommand()
-
-        if executor:
-            background_tasks.add_task(CommandRunner(server, executor, get_server_public_ip(openstack_server)).run)
-
+        server = await _get_owned_server(server_id, user, session)
+        openstack_server = await _get_openstack_server(server_id, conn, session)
+        executor = get_command_executor(server_command.command)
+
+        if executor is None:
+            raise HTTPException(status_code=400, detail="Unknown command")
+
+        execution, runner = await submit_command(
+            server,
+            server_command.command.value,
+            executor,
+            get_server_public_ip(openstack_server),
+            user.id,
+            idempotency_key,
+            session,
+        )
+        reused = (
+            str(execution.server_id) != str(server_id)
+            or execution.command != server_command.command.value
+        )
+        if idempotency_key and reused:
+            raise HTTPException(
+                status_code=409,
+                detail="Idempotency key was already used for another command",
+            )
+        if runner is not None:
+            background_tasks.add_task(runner.run)
+
+    except HTTPException:
+        raise
     except ResourceNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to run command: {e}")
 
+    return CommandExecutionSubmitted(
+        **CommandExecutionSchema.model_validate(execution, from_attributes=True).model_dump(),
+        coalesced=runner is None,
+    )
+
+
+@router.get("/{server_id}/commands", response_model=list[CommandExecutionSchema])
+async def get_command_executions(
+        server_id: uuid.UUID,
+        limit: int = 50,
+        user: User = Depends(current_user),
+        session: AsyncSession = Depends(get_async_session),
+):
+    await _get_owned_server(server_id, user, session)
+    try:
+        executions = await runner_db.get_server_executions(
+            server_id,
+            min(max(limit, 1), 500),
+            session,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get command executions: {e}")
+
+    return executions
+
+
+@router.get("/{server_id}/commands/{execution_id}", response_model=CommandExecutionSchema)
+async def get_command_execution(
+        server_id: uuid.UUID,
+        execution_id: uuid.UUID,
+        user: User = Depends(current_user),
+        session: AsyncSession = Depends(get_async_session),
+):
+    await _get_owned_server(server_id, user, session)
+    execution = await runner_db.get_execution(execution_id, session, server_id=server_id)
+    if execution is None:
+        raise HTTPException(status_code=404, detail="Command execution not found")
+
+    return execution
+
+
+@router.get("/{server_id}/commands/{execution_id}/output")
+async def stream_command_output(
+        server_id: uuid.UUID,
+        execution_id: uuid.UUID,
+        offset: int = 0,
+        last_event_id: Optional[str] = Header(None),
+        user: User = Depends(current_user),
+        session: AsyncSession = Depends(get_async_session),
+):
+    await _get_owned_server(server_id, user, session)
+    if await runner_db.get_execution(execution_id, session, server_id=server_id) is None:
+        raise HTTPException(status_code=404, detail="Command execution not found")
+
+    # a reconnecting EventSource resumes after the last event it received
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    async def events():
+        async for end, text in command_outputs.stream(execution_id, server_id, max(offset, 0)):
+            data = ''.join(f'data: {line}\n' for line in text.split('\n'))
+            yield f'id: {end}\n{data}\n'
+        yield 'event: end\ndata: \n\n'
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @router.get("/{server_id}", response_model=ServerDetailedSchema)
 async def get_user_server(
         server_id: uuid.UUID,
+        fresh: bool = False,
         user: User = Depends(current_user),
         conn: connection.Connection = Depends(get_openstack_connection),
         session: AsyncSession = Depends(get_async_session)
 ):
-    if not await db.is_user_server(server_id, user, session):
-        raise HTTPException(status_code=404, detail="Server not found")
+    server = await _get_owned_server(server_id, user, session)
     try:
         image=None
-        openstack_server = openstack.get_server(conn, str(server_id))
+        openstack_server = await _get_openstack_server(server_id, conn, session, fresh)
         if openstack_server.image.id:
-            image = openstack.get_image(conn, openstack_server.image.id)
-        server = await db.get_user_server(user, str(server_id), session)
+            image = await run_read(openstack.get_image, conn, openstack_server.image.id)
     except ResourceNotFound:
         raise HTTPException(status_code=404, detail=f"Server not found")
     except DuplicateResource:
@@ -200,10 +587,9 @@ async def get_user_server_console_url(
         conn: connection.Connection = Depends(get_openstack_connection),
         session: AsyncSession = Depends(get_async_session)
 ):
-    if not await db.is_user_server(server_id, user, session):
-        raise HTTPException(status_code=404, detail="Server not found")
+    await _get_owned_server(server_id, user, session)
     try:
-        console = openstack.create_server_console(conn, str(server_id))
+        console = await run_read(openstack.create_server_console, conn, str(server_id))
     except ResourceNotFound:
         raise HTTPException(status_code=404, detail=f"Server not found")
     except Exception as e:
@@ -215,43 +601,268 @@ async def get_user_server_console_url(
 
     return {'url': url}
 
-@router.post("/from_configuration", response_model=ServerDetailedSchema)
+@router.post(
+    "/from_configuration",
+    response_model=ServerDetailedSchema,
+    responses={202: {"model": ProvisioningJobCreated}},
+)
 async def create_user_server(
-        background_tasks: BackgroundTasks,
         req: ServeCreate,
+        response: Response,
+        async_job: bool = False,
         user: User = Depends(current_user),
         conn: connection.Connection = Depends(get_openstack_connection),
         session: AsyncSession = Depends(get_async_session),
 ):
+    timings = StepTimings()
     try:
-        servers = await db.get_user_servers(user, session)
-        if len(servers) > openstack.get_instance_limit(conn):
+        # only the first one uses the request session, the others have their own connections
+        servers, limits, server_config = await timings.track('checks', asyncio.gather(
+            db.get_user_servers(user, session),
+            compute_limits.get_limits(conn),
+            server_config_catalog.get(req.configuration_name),
+        ))
+        if len(servers) > limits.instance_limit:
             raise HTTPException(status_code=409, detail="Too many servers")
 
-        server_config = await db.get_server_configuration(req.configuration_name, session)
-
-        openstack_server, key_pair, floating_ip = openstack.create_server(
+        if server_config is None:
+            raise HTTPException(status_code=404, detail="Server configuration not found")
+
+        baked_image = await _find_baked_image(server_config, req.tools, session)
+        image_id = baked_image.image_id if baked_image else None
+        tags = list(baked_image.tags) if baked_image else None
+
+        # pooled servers run the plain configuration image and already count against the quota
+        claimed = None
+        if not req.tools:
+            claimed = await warm_pool.claim(
+                conn,
+                user,
+                req.name,
+                req.description,
+                server_config,
+                session,
+            )
+        if claimed is not None:
+            openstack_server, key_pair, public_ip_address = claimed
+            if key_pair.private_key and settings.mail_username != "" and public_ip_address:
+                await send_keypair_email(
+                    user,
+                    key_pair,
+                    public_ip_address,
+                    get_os_default_user(server_config.image),
+                )
+
+            await db.insert_user_server(openstack_server.id, user.id, server_config.image, session)
+            server = await db.get_user_server(user, str(openstack_server.id), session)
+            return ServerDetailedSchema.create_from_openstack_server(
+                user.id,
+                server,
+                openstack_server,
+            )
+
+        quota_error, flavor_size = await timings.track(
+            'quota',
+            compute_limits.check_create(conn, server_config.flavor_id or server_config.flavor),
+        )
+        if quota_error:
+            raise HTTPException(status_code=409, detail=quota_error)
+        # counted right away so concurrent creates see it, the next refresh brings the real usage
+        compute_limits.reserve(flavor_size)
+
+        if async_job:
+            job = await jobs_db.insert_job(
+                user.id,
+                req.name,
+                req.description,
+                req.configuration_name,
+                session,
+            )
+            start_provisioning_job(
+                job.id,
+                job.stages,
+                conn,
+                user,
+                req.name,
+                req.description,
+                server_config,
+                image_id,
+                tags,
+            )
+            return JSONResponse(
+                status_code=202,
+                content=ProvisioningJobCreated(job_id=job.id).model_dump(mode='json'),
+                headers={'Location': f'/jobs/{job.id}'},
+            )
+
+        openstack_server, key_pair, floating_ip = await provision_server(
             conn,
             str(user.id),
             req.name,
             req.description,
             server_config,
+            image_id,
+            timings,
         )
 
-        public_ip_address = floating_ip.floating_ip_address
-        if key_pair.private_key and settings.mail_username != "" and public_ip_address != "":
-            await send_keypair_email(background_tasks, user, key_pair, public_ip_address, get_os_default_user(server_config.image))
-
-        await db.insert_user_server(openstack_server.id, user.id, server_config.image, session)
+        try:
+            public_ip_address = floating_ip.floating_ip_address if floating_ip else ""
+            if key_pair.private_key and settings.mail_username != "" and public_ip_address != "":
+                await send_keypair_email(
+                    user,
+                    key_pair,
+                    public_ip_address,
+                    get_os_default_user(server_config.image),
+                )
+
+            await timings.track(
+                'db_insert',
+                db.insert_user_server(
+                    openstack_server.id,
+                    user.id,
+                    server_config.image,
+                    session,
+                    tags,
+                ),
+            )
+        except Exception:
+            # without its row nobody sees the server, it would run until someone finds it in nova
+            await discard_created_resources(
+                conn,
+                req.name,
+                openstack_server.id,
+                floating_ip_id=floating_ip.id if floating_ip else None,
+            )
+            raise
         server = await db.get_user_server(user, str(openstack_server.id), session)
+    except HTTPException:
+        raise
     except ResourceNotFound as e:
+        compute_limits.invalidate()
         raise HTTPException(status_code=404, detail=f"Resource not found: {e}")
     except Exception as e:
+        compute_limits.invalidate()
         raise HTTPException(status_code=500, detail=f"Failed to create server: {e}")
 
+    settings.info_logger.info(
+        "Server created",
+        extra={'server_id': str(openstack_server.id), 'timings_ms': timings.to_dict()},
+    )
+    response.headers['Server-Timing'] = timings.to_header()
     return ServerDetailedSchema.create_from_openstack_server(user.id, server, openstack_server)
 
 
+@router.post("/bulk", response_model=ServerBulkCreated)
+async def create_user_servers(
+        req: ServerBulkCreate,
+        user: User = Depends(current_user),
+        conn: connection.Connection = Depends(get_openstack_connection),
+        session: AsyncSession = Depends(get_async_session),
+):
+    if req.count > settings.server_bulk_create_max_count:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.server_bulk_create_max_count} servers per request",
+        )
+
+    try:
+        servers = await db.get_user_servers(user, session)
+        limits = await compute_limits.get_limits(conn)
+        if len(servers) + req.count > limits.instance_limit:
+            raise HTTPException(status_code=409, detail="Too many servers")
+
+        server_config = await server_config_catalog.get(req.configuration_name)
+        if server_config is None:
+            raise HTTPException(status_code=404, detail="Server configuration not found")
+
+        baked_image = await _find_baked_image(server_config, req.tools, session)
+        image_id = baked_image.image_id if baked_image else None
+        tags = list(baked_image.tags) if baked_image else None
+
+        quota_error, flavor_size = await compute_limits.check_create(
+            conn,
+            server_config.flavor_id or server_config.flavor,
+            req.count,
+        )
+        if quota_error:
+            raise HTTPException(status_code=409, detail=quota_error)
+        compute_limits.reserve(flavor_size, req.count)
+
+        openstack_servers, failed_servers, key_pair, floating_ips = await provision_servers(
+            conn,
+            str(user.id),
+            req.name,
+            req.description,
+            server_config,
+            req.count,
+            image_id,
+        )
+        if failed_servers:
+            settings.error_logger.error(
+                f"{len(failed_servers)} of {req.count} servers of {req.name} failed to boot"
+            )
+            await asyncio.gather(*(
+                run_mutation(openstack.delete_server, conn, server.id) for server in failed_servers
+            ))
+            compute_limits.invalidate()
+
+        try:
+            # one keypair per user, so the whole group shares one key and one email
+            public_ip_addresses = [
+                floating_ip.floating_ip_address for floating_ip in floating_ips.values()
+            ]
+            if key_pair.private_key and settings.mail_username != "" and public_ip_addresses:
+                await send_keypair_email(
+                    user,
+                    key_pair,
+                    ', '.join(public_ip_addresses),
+                    get_os_default_user(server_config.image),
+                )
+
+            server_ids = [openstack_server.id for openstack_server in openstack_servers]
+            await db.insert_user_servers(server_ids, user.id, server_config.image, session, tags)
+        except Exception:
+            # servers without their rows are invisible to the user, none of the group is kept
+            await asyncio.gather(*(
+                discard_created_resources(
+                    conn,
+                    req.name,
+                    openstack_server.id,
+                    floating_ip_id=(
+                        floating_ips[openstack_server.id].id
+                        if openstack_server.id in floating_ips else None
+                    ),
+                )
+                for openstack_server in openstack_servers
+            ))
+            raise
+        user_servers = {
+            str(server.openstack_id): server
+            for server in await db.get_owned_servers(user, session, server_ids=server_ids)
+        }
+    except HTTPException:
+        raise
+    except ResourceNotFound as e:
+        compute_limits.invalidate()
+        raise HTTPException(status_code=404, detail=f"Resource not found: {e}")
+    except Exception as e:
+        compute_limits.invalidate()
+        raise HTTPException(status_code=500, detail=f"Failed to create servers: {e}")
+
+    return ServerBulkCreated(
+        servers=[
+            ServerSchema.create_from_openstack_server(
+                user.id,
+                openstack_server,
+                user_servers[openstack_server.id],
+            )
+            for openstack_server in openstack_servers
+            if openstack_server.id in user_servers
+        ],
+        failed=len(failed_servers),
+    )
+
+
 @router.delete("/{server_id}", status_code=204)
 async def delete_user_server(
         server_id: uuid.UUID,
@@ -260,12 +871,14 @@ async def delete_user_server(
         session: AsyncSession = Depends(get_async_session)
 ):
     try:
-        if not await db.is_user_server(server_id, user, session):
-            raise HTTPException(status_code=404, detail="Server not found")
+        await _get_owned_server(server_id, user, session)
 
-        openstack.delete_server(conn, str(server_id))
+        await run_mutation(openstack.delete_server, conn, str(server_id))
         await db.delete_user_server(server_id, session)
+        compute_limits.invalidate()
 
+    except HTTPException:
+        raise
     except ResourceNotFound:
         raise HTTPException(status_code=404, detail=f"Server not found")
     except Exception as e:
@@ -283,11 +896,13 @@ async def update_server(
         session: AsyncSession = Depends(get_async_session)
 ):
     try:
-        if not await db.is_user_server(server_id, user, session):
-            raise HTTPException(status_code=404, detail="Server not found")
+        await _get_owned_server(server_id, user, session)
 
-        openstack.update_server(conn, str(server_id), req.name, req.description)
+        await run_mutation(openstack.update_server, conn, str(server_id), req.name, req.description)
+        await db.delete_server_states([server_id], session)
 
+    except HTTPException:
+        raise
     except ResourceNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
     except ConflictException as e:
@@ -305,20 +920,12 @@ async def set_state_action(
         session: AsyncSession = Depends(get_async_session)
 ):
     try:
-        if not await db.is_user_server(server_id, user, session):
-            raise HTTPException(status_code=404, detail="Server not found")
-
-        match state_action.action:
-            case ServerStateActionEnum.pause:
-                openstack.pause_server(conn, str(server_id))
-            case ServerStateActionEnum.unpause:
-                openstack.unpause_server(conn, str(server_id))
-            case ServerStateActionEnum.start:
-                openstack.start_server(conn, str(server_id))
-            case ServerStateActionEnum.stop:
-                openstack.stop_server(conn, str(server_id))
-            case ServerStateActionEnum.reboot:
-                openstack.reboot_server(conn, str(server_id))
+        await _get_owned_server(server_id, user, session)
+
+        await run_mutation(get_state_action(state_action.action), conn, str(server_id))
+        await db.delete_server_states([server_id], session)
+    except HTTPException:
+        raise
     except ResourceNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
     except ConflictException as e:
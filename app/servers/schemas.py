@@ -8,8 +8,9 @@ from openstack.compute.v2.flavor import Flavor as OpenStackFlavor
 from openstack.compute.v2.image import Image as OpenStackImage
 from openstack.compute.v2.server import Server as OpenStackServer
 from openstack.network.v2.network import Network as OpenStackNetwork
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
+from app.jobs.schemas import JobStatus
 from app.servers.models import Server as ServerModel
 
 
@@ -202,6 +203,10 @@ class ServerConfiguration(BaseModel):
     networks: list[str]
 
 
+class WarmPoolUpdate(BaseModel):
+    size: int = Field(ge=0)
+
+
 class ServerStateActionEnum(str, Enum):
     pause = "pause"
     unpause = "unpause"
@@ -214,10 +219,34 @@ class ServerStateActionUpdate(BaseModel):
     action: ServerStateActionEnum
 
 
+class ServerToolEnum(str, Enum):
+    torch = "torch"
+    tensorflow = "tensorflow"
+    grafana = "grafana"
+    matplotlib = "matplotlib"
+    postgres = "postgres"
+    mongo = "mongo"
+
+
 class ServeCreate(BaseModel):
     name: str
     description: str
     configuration_name: str
+    # boots a baked image with exactly these tools, fails when none was baked
+    tools: list[ServerToolEnum] = []
+
+
+class ServerBulkCreate(BaseModel):
+    name: str
+    description: str
+    configuration_name: str
+    count: int = Field(ge=1)
+    tools: list[ServerToolEnum] = []
+
+
+class ServerBulkCreated(BaseModel):
+    servers: list[Server]
+    failed: int = 0
 
 
 class ServeUpdate(BaseModel):
@@ -250,3 +279,34 @@ class ServerCommandEnum(str, Enum):
 class ServerCommand(BaseModel):
     command: ServerCommandEnum
 
+
+class BulkServerCommand(BaseModel):
+    command: ServerCommandEnum
+    server_ids: Optional[list[uuid.UUID]] = None
+    tag: Optional[str] = None
+    concurrency: Optional[int] = None
+
+    @model_validator(mode='after')
+    def check_targets(self) -> 'BulkServerCommand':
+        if not self.server_ids and not self.tag:
+            raise ValueError('server_ids or tag is required')
+        return self
+
+
+class BulkServerStateAction(BaseModel):
+    action: ServerStateActionEnum
+    server_ids: Optional[list[uuid.UUID]] = None
+    tag: Optional[str] = None
+    concurrency: Optional[int] = None
+
+    @model_validator(mode='after')
+    def check_targets(self) -> 'BulkServerStateAction':
+        if not self.server_ids and not self.tag:
+            raise ValueError('server_ids or tag is required')
+        return self
+
+
+class ServerStateActionResult(BaseModel):
+    server_id: uuid.UUID
+    status: JobStatus
+    error: Optional[str] = None
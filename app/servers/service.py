@@ -1,74 +1,425 @@
-import os
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
 
-from openstack.compute.v2.keypair import Keypair as OpenStackKeypair
+from openstack import connection
+from openstack.exceptions import ConflictException, ResourceNotFound
 from openstack.compute.v2.server import Server as OpenStackServer
-from starlette.background import BackgroundTasks
+from openstack.network.v2.floating_ip import FloatingIP as OpenstackFloatingIP
 
+import app.openstack.block_service as block_service
+import app.openstack.compute_service as openstack
+import app.openstack.network_service as network_service
 from app.auth.models import User
-from app.mailing.service import send_email
+from app.command.command import CommandInterface, ExecAction
+from app.command.echo import EchoCommand
+from app.command.grafana import GrafanaCommand
+from app.command.matplotlib import MatplotlibCommand
+from app.command.mongo import MongoCommand
+from app.command.postgres import PostgresCommand
+from app.command.pytorch import TorchCommand
+from app.command.tensorflow import TensorflowCommand
+from app.config import settings
+from app.keystore.service import Keypair, keystore
+from app.mailing.service import Attachment, mail_outbox
+from app.openstack.models import BootIds
+from app.openstack.executor import run_mutation, run_read
+from app.servers.models import ServerConfig
+from app.servers.resolver_service import ResolvedServerConfig
+from app.servers.schemas import ServerCommandEnum, ServerStateActionEnum, ServerToolEnum
 
 
-def generate_file(path: str, data: str) -> str:
-    with open(path, 'w') as file:
-        file.write(data)
+async def create_server_volume(
+        conn: connection.Connection,
+        name: str,
+        server_config: ResolvedServerConfig,
+) -> Optional[list]:
+    return await server_config.call(
+        lambda config: run_mutation(openstack.create_server_volume, conn, name, config)
+    )
+
+
+async def boot_server(
+        conn: connection.Connection,
+        user_id: str,
+        name: str,
+        description: str,
+        server_config: ResolvedServerConfig,
+        block_device_mapping: Optional[list],
+        image_id: Optional[str] = None,
+) -> (OpenStackServer, Keypair):
+    boot_ids, keypair = await prepare_boot(conn, user_id, server_config, image_id)
+    server = await launch_server(
+        conn,
+        name,
+        description,
+        server_config,
+        keypair,
+        block_device_mapping,
+        boot_ids,
+        image_id,
+    )
+    return server, keypair
+
+
+async def assign_floating_ip(
+        conn: connection.Connection,
+        server: OpenStackServer,
+        server_config: ResolvedServerConfig,
+) -> Optional[OpenstackFloatingIP]:
+    return await server_config.call(
+        lambda config: run_mutation(
+            network_service.create_floating_ip_and_assign_to_server,
+            conn,
+            server,
+            floating_network_id=config.floating_network_id,
+        )
+    )
+
+
+class StepTimings:
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+
+    async def track(self, step: str, awaitable: Awaitable) -> Any:
+        started_at = time.monotonic()
+        try:
+            return await awaitable
+        finally:
+            self.durations[step] = time.monotonic() - started_at
+
+    def to_dict(self) -> dict[str, float]:
+        return {step: round(duration * 1000, 1) for step, duration in self.durations.items()}
+
+    def to_header(self) -> str:
+        # Server-Timing format, shown per request by browser dev tools
+        return ', '.join(f'{step};dur={duration}' for step, duration in self.to_dict().items())
+
+
+async def prepare_boot(
+        conn: connection.Connection,
+        user_id: str,
+        server_config: ResolvedServerConfig,
+        image_id: Optional[str] = None,
+) -> (BootIds, Keypair):
+    # nothing here depends on the volume, so it runs while cinder is still creating it
+    boot_ids, keypair = await asyncio.gather(
+        server_config.call(
+            lambda config: run_read(openstack.resolve_boot_ids, conn, config, image_id)
+        ),
+        keystore.ensure_keypair(conn, user_id),
+    )
+    return boot_ids, keypair
+
+
+async def launch_server(
+        conn: connection.Connection,
+        name: str,
+        description: str,
+        server_config: ResolvedServerConfig,
+        keypair: Keypair,
+        block_device_mapping: Optional[list],
+        boot_ids: BootIds,
+        image_id: Optional[str] = None,
+) -> OpenStackServer:
+    prepared_config = server_config.server_config
+    return await server_config.call(
+        lambda config: run_mutation(
+            openstack.launch_server,
+            conn,
+            name,
+            description,
+            config,
+            keypair.name,
+            block_device_mapping,
+            # a retry runs with a configuration resolved again, its ids are looked up anew
+            boot_ids if config is prepared_config else None,
+            image_id,
+        )
+    )
+
+
+# volume -> boot -> floating ip is the critical path, the id lookups and the keypair run alongside
+# the volume
+async def provision_server(
+        conn: connection.Connection,
+        user_id: str,
+        name: str,
+        description: str,
+        server_config: ServerConfig,
+        image_id: Optional[str] = None,
+        timings: Optional[StepTimings] = None,
+) -> (OpenStackServer, Keypair, Optional[OpenstackFloatingIP]):
+    timings = timings or StepTimings()
+    resolved_config = ResolvedServerConfig(server_config)
+    await timings.track('resolve', resolved_config.ensure_resolved())
+
+    async def create_volume() -> list:
+        # baked images carry their own block device mapping, nova restores the volume from its
+        # snapshot
+        if image_id:
+            return []
+        return await timings.track('volume', create_server_volume(conn, name, resolved_config))
+
+    # both are awaited when one fails, a volume cinder is still creating would leak otherwise
+    volume_result, prepare_result = await asyncio.gather(
+        create_volume(),
+        timings.track('prepare', prepare_boot(conn, user_id, resolved_config, image_id)),
+        return_exceptions=True,
+    )
+    if isinstance(prepare_result, BaseException):
+        if not isinstance(volume_result, BaseException):
+            await discard_created_resources(conn, name, volume_ids=get_volume_ids(volume_result))
+        raise prepare_result
+    if isinstance(volume_result, BaseException):
+        raise volume_result
+
+    block_device_mapping = volume_result
+    boot_ids, keypair = prepare_result
+    server = None
+    try:
+        server = await timings.track(
+            'boot',
+            launch_server(
+                conn,
+                name,
+                description,
+                resolved_config,
+                keypair,
+                block_device_mapping,
+                boot_ids,
+                image_id,
+            ),
+        )
+        floating_ip = await timings.track(
+            'floating_ip',
+            assign_floating_ip(conn, server, resolved_config),
+        )
+    except Exception:
+        await discard_created_resources(
+            conn,
+            name,
+            server.id if server else None,
+            get_volume_ids(block_device_mapping),
+        )
+        raise
+
+    return server, keypair, floating_ip
+
+
+async def assign_floating_ips(
+        conn: connection.Connection,
+        servers: list[OpenStackServer],
+        server_config: ResolvedServerConfig,
+) -> dict[str, OpenstackFloatingIP]:
+    if not servers:
+        return {}
+
+    ports = await run_read(
+        network_service.get_server_ports,
+        conn,
+        [server.id for server in servers],
+    )
+    floating_network_id = server_config.server_config.floating_network_id
+    if not floating_network_id:
+        floating_network = await run_read(
+            network_service.get_network,
+            conn,
+            network_service.PUBLIC_NETWORK_NAME,
+        )
+        floating_network_id = floating_network.id
+
+    # neutron has no bulk floating ip create, the calls go out concurrently instead
+    server_ids = [server.id for server in servers if server.id in ports]
+    results = await asyncio.gather(
+        *(
+            run_mutation(
+                network_service.create_floating_ip_for_port,
+                conn,
+                floating_network_id,
+                ports[server_id],
+            )
+            for server_id in server_ids
+        ),
+        return_exceptions=True,
+    )
+
+    floating_ips = {}
+    for server_id, result in zip(server_ids, results):
+        if isinstance(result, Exception):
+            settings.error_logger.error(f'Failed to assign a floating ip to {server_id}: {result}')
+        else:
+            floating_ips[server_id] = result
+
+    return floating_ips
+
+
+async def provision_servers(
+        conn: connection.Connection,
+        user_id: str,
+        name: str,
+        description: str,
+        server_config: ServerConfig,
+        count: int,
+        image_id: Optional[str] = None,
+) -> (list[OpenStackServer], list[OpenStackServer], Keypair, dict[str, OpenstackFloatingIP]):
+    resolved_config = ResolvedServerConfig(server_config)
+    _, keypair = await asyncio.gather(
+        resolved_config.ensure_resolved(),
+        keystore.ensure_keypair(conn, user_id),
+    )
+
+    servers, failed = await resolved_config.call(
+        lambda config: run_mutation(
+            openstack.boot_servers,
+            conn,
+            keypair.name,
+            name,
+            description,
+            config,
+            count,
+            image_id,
+        )
+    )
+    floating_ips = await assign_floating_ips(conn, servers, resolved_config)
 
-    return path
+    return servers, failed, keypair, floating_ips
 
 
-def delete_file(path: str):
+def get_volume_ids(block_device_mapping: Optional[list]) -> list[str]:
+    return [
+        mapping['uuid']
+        for mapping in block_device_mapping or []
+        if mapping['source_type'] == 'volume'
+    ]
+
+
+async def delete_created_resources(
+        conn: connection.Connection,
+        server_id: Optional[str] = None,
+        volume_ids: Optional[list[str]] = None,
+        floating_ip_id: Optional[str] = None,
+):
+    # undoes a create that stopped part way, a server takes its boot volume along
+    if floating_ip_id:
+        await run_mutation(network_service.delete_floating_ip, conn, floating_ip_id)
+    if server_id:
+        await run_mutation(openstack.delete_server, conn, str(server_id))
+    else:
+        for volume_id in volume_ids or []:
+            await run_mutation(block_service.delete_volume, conn, volume_id)
+
+
+async def discard_created_resources(
+        conn: connection.Connection,
+        name: str,
+        server_id: Optional[str] = None,
+        volume_ids: Optional[list[str]] = None,
+        floating_ip_id: Optional[str] = None,
+):
+    # cleanup on a failure path, the error that got here is the one reported
     try:
-        os.remove(path)
-    except OSError:
-        pass
+        await delete_created_resources(conn, server_id, volume_ids, floating_ip_id)
+    except Exception as e:
+        settings.error_logger.error(f'Failed to delete the resources of {name}: {e}')
+
+
+def get_state_action(action: ServerStateActionEnum) -> Callable[[connection.Connection, str], None]:
+    match action:
+        case ServerStateActionEnum.pause:
+            return openstack.pause_server
+        case ServerStateActionEnum.unpause:
+            return openstack.unpause_server
+        case ServerStateActionEnum.start:
+            return openstack.start_server
+        case ServerStateActionEnum.stop:
+            return openstack.stop_server
+        case ServerStateActionEnum.reboot:
+            return openstack.reboot_server
+
+
+async def apply_state_action(
+        conn: connection.Connection,
+        server_ids: list[str],
+        action: ServerStateActionEnum,
+        concurrency: int,
+) -> dict[str, Optional[str]]:
+    # error per server, None when nova accepted the action
+    state_action = get_state_action(action)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def apply(server_id: str) -> Optional[str]:
+        async with semaphore:
+            try:
+                await run_mutation(state_action, conn, server_id)
+            except ResourceNotFound:
+                return 'Server not found'
+            except ConflictException:
+                return 'Invalid status'
+            except Exception as e:
+                return f'Failed to set server state: {e}'
+
+        return None
+
+    errors = await asyncio.gather(*(apply(server_id) for server_id in server_ids))
+    return dict(zip(server_ids, errors))
+
+
+def get_command_executor(command: ServerCommandEnum) -> Optional[CommandInterface]:
+    match command:
+        case ServerCommandEnum.install_torch:
+            return TorchCommand(ExecAction.INSTALL)
+        case ServerCommandEnum.delete_torch:
+            return TorchCommand(ExecAction.DELETE)
+        case ServerCommandEnum.install_tensorflow:
+            return TensorflowCommand(ExecAction.INSTALL)
+        case ServerCommandEnum.delete_tensorflow:
+            return TensorflowCommand(ExecAction.DELETE)
+        case ServerCommandEnum.install_grafana:
+            return GrafanaCommand(ExecAction.INSTALL)
+        case ServerCommandEnum.delete_grafana:
+            return GrafanaCommand(ExecAction.DELETE)
+        case ServerCommandEnum.install_matplotlib:
+            return MatplotlibCommand(ExecAction.INSTALL)
+        case ServerCommandEnum.delete_matplotlib:
+            return MatplotlibCommand(ExecAction.DELETE)
+        case ServerCommandEnum.install_postgres:
+            return PostgresCommand(ExecAction.INSTALL)
+        case ServerCommandEnum.delete_postgres:
+            return PostgresCommand(ExecAction.DELETE)
+        case ServerCommandEnum.install_mongo:
+            return MongoCommand(ExecAction.INSTALL)
+        case ServerCommandEnum.delete_mongo:
+            return MongoCommand(ExecAction.DELETE)
+        case ServerCommandEnum.echo:
+            return EchoCommand()
+
+    return None
+
+
+def get_install_executor(tool: ServerToolEnum) -> CommandInterface:
+    return get_command_executor(ServerCommandEnum[f'install_{tool.value}'])
 
 
 async def send_keypair_email(
-        background_tasks: BackgroundTasks,
         user: User,
-        key_pair: OpenStackKeypair,
+        key_pair: Keypair,
         ip_address: str,
         default_user: str,
 ):
     if not ip_address:
         return
 
-    private_file_path = generate_file(f'./keys/{user.id}_devstask', key_pair.private_key)
-    public_file_path = generate_file(f'./keys/{user.id}_devstask.pub', key_pair.public_key)
-
-    await send_email(
-        background_tasks,
-        "LiteStack: your private command key",
+    await mail_outbox.enqueue(
         user.email,
+        "LiteStack: your private command key",
+        "ssh_email.html",
         {
             'public_address': ip_address,
             'default_user': default_user,
         },
         [
-            {
-                "file": private_file_path,
-                "headers": {
-                    "Content-Disposition": "attachment; filename=\"devstack\"",
-                },
-                "mime_type": "text",
-                "mime_subtype": "plain",
-            },
-            {
-                "file": public_file_path,
-                "headers": {
-                    "Content-Disposition": "attachment; filename=\"devstack.pub\"",
-                },
-                "mime_type": "text",
-                "mime_subtype": "plain",
-            },
-            {
-                "file": "./templates/logo.png",
-                "headers": {
-                    "Content-ID": "<logo_image@fastapi-mail>",
-                    "Content-Disposition": "inline; filename=\"file.png\"",  # For inline images only
-                },
-                "mime_type": "image",
-                "mime_subtype": "png",
-            }
+            Attachment('devstack', key_pair.private_key),
+            Attachment('devstack.pub', key_pair.public_key),
         ],
-        "ssh_email.html",
     )
@@ -0,0 +1,156 @@
+import asyncio
+import datetime
+from typing import Optional
+
+import iso8601
+from openstack import connection
+from openstack.compute.v2.server import Server as OpenStackServer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app.openstack.compute_service as openstack
+import app.servers.db_service as db
+from app.config import settings
+from app.database import async_session_maker
+from app.openstack.config import connection_manager
+from app.openstack.executor import run_read
+from app.servers.models import ServerSyncState
+
+
+# Keeps the server_state mirror close to Nova so list/detail requests don't hit the compute API.
+# After a full listing each cycle only asks Nova for servers changed since the high-water mark,
+# with a periodic full pass to catch anything missed. Every worker runs the loop, an advisory lock
+# plus the recorded sync time make one of them do the work.
+class ServerStateSynchronizer:
+    def __init__(self, interval: int, full_sync_interval: int):
+        self.interval = interval
+        self.full_sync_interval = full_sync_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                settings.error_logger.error(f'Failed to sync server states: {e}')
+
+            await asyncio.sleep(self.interval)
+
+    async def sync(self):
+        async with async_session_maker() as session:
+            if not await db.try_lock_server_sync(session):
+                return
+
+            sync_state = await db.get_server_sync_state(session)
+            last_started_at = sync_state.last_started_at if sync_state else None
+            if last_started_at and _age(last_started_at) < self.interval * 0.9:
+                # another worker already synced during this interval
+                return
+
+            started_at = _now()
+            # claim the cycle, the commit also releases the advisory lock
+            await db.save_server_sync_state(session, last_started_at=started_at)
+            conn = await run_read(connection_manager.get_connection)
+
+            if self._needs_full_sync(sync_state):
+                high_water_mark = await self._sync_full(conn, session)
+                await db.save_server_sync_state(
+                    session,
+                    # without servers to take it from, changes are asked for from this cycle on
+                    high_water_mark=high_water_mark or started_at,
+                    last_synced_at=started_at,
+                    last_full_sync_at=started_at,
+                )
+            else:
+                high_water_mark = await self._sync_changes(
+                    conn,
+                    sync_state.high_water_mark,
+                    session,
+                )
+                await db.save_server_sync_state(
+                    session,
+                    high_water_mark=high_water_mark,
+                    last_synced_at=started_at,
+                )
+
+    def _needs_full_sync(self, sync_state: Optional[ServerSyncState]) -> bool:
+        if sync_state is None:
+            return True
+        if sync_state.high_water_mark is None or sync_state.last_full_sync_at is None:
+            return True
+
+        return _age(sync_state.last_full_sync_at) >= self.full_sync_interval
+
+    async def _sync_full(
+            self,
+            conn: connection.Connection,
+            session: AsyncSession,
+    ) -> Optional[datetime.datetime]:
+        server_ids = await db.get_all_server_ids(session)
+        lookup = await run_read(openstack.get_servers_by_ids, conn, server_ids)
+
+        await db.upsert_server_states(lookup.servers, session)
+        await db.mark_server_states_deleted(lookup.missing_ids, session)
+        await db.delete_orphan_server_states(session)
+
+        return _get_high_water_mark(lookup.servers, None)
+
+    async def _sync_changes(
+            self,
+            conn: connection.Connection,
+            high_water_mark: datetime.datetime,
+            session: AsyncSession,
+    ) -> datetime.datetime:
+        changed_servers = await run_read(
+            openstack.get_servers_changed_since,
+            conn,
+            high_water_mark.isoformat(),
+        )
+        if not changed_servers:
+            return high_water_mark
+
+        known_ids = {str(server_id) for server_id in await db.get_all_server_ids(session)}
+        known_servers = [server for server in changed_servers if server.id in known_ids]
+        await db.upsert_server_states(known_servers, session)
+
+        return _get_high_water_mark(changed_servers, high_water_mark)
+
+
+def _get_high_water_mark(
+        servers: list[OpenStackServer],
+        current: Optional[datetime.datetime],
+) -> Optional[datetime.datetime]:
+    # changes-since is inclusive, servers updated exactly at the mark come again next cycle
+    timestamps = [iso8601.parse_date(server.updated_at) for server in servers if server.updated_at]
+    if current is not None:
+        timestamps.append(current)
+
+    return max(timestamps, default=None)
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _age(moment: datetime.datetime) -> float:
+    return (_now() - moment).total_seconds()
+
+
+server_state_synchronizer = ServerStateSynchronizer(
+    settings.server_state_poll_interval,
+    settings.server_state_full_sync_interval,
+)
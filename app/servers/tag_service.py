@@ -0,0 +1,60 @@
+import asyncio
+import uuid
+from typing import Optional
+
+import app.servers.db_service as db
+from app.config import settings
+from app.database import async_session_maker
+
+
+# Tag changes from runners are applied as atomic array_remove/array_append updates, never by
+# writing back a list read earlier. Changes arriving within a short window are written together
+# in one transaction, so a batch finishing on many servers doesn't take a connection per runner.
+class TagWriter:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._changes: dict[uuid.UUID, list[tuple[str, str]]] = {}
+        self._waiters: list[asyncio.Future] = []
+        self._flush: Optional[asyncio.Task] = None
+
+    async def add(self, server_id: uuid.UUID, tag: str):
+        await self.update(server_id, [(db.TAG_ADD, tag)])
+
+    async def remove(self, server_id: uuid.UUID, tag: str):
+        await self.update(server_id, [(db.TAG_REMOVE, tag)])
+
+    async def update(self, server_id: uuid.UUID, changes: list[tuple[str, str]]):
+        if not changes:
+            return
+
+        self._changes.setdefault(server_id, []).extend(changes)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+
+        if self._flush is None:
+            self._flush = asyncio.create_task(self._write())
+
+        await waiter
+
+    async def _write(self):
+        await asyncio.sleep(self.delay)
+
+        changes, self._changes = self._changes, {}
+        waiters, self._waiters = self._waiters, []
+        self._flush = None
+
+        try:
+            async with async_session_maker() as session:
+                await db.update_server_tags(changes, session)
+        except Exception as e:
+            settings.error_logger.error(f'Failed to update server tags: {e}')
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+        else:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+
+tag_writer = TagWriter(settings.tag_write_delay)
@@ -1,35 +1,13 @@
 import os
-from logging import DEBUG, getLogger, basicConfig, FileHandler, Formatter, Logger
+from logging import getLogger, Logger
 
 from pydantic_settings import BaseSettings
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
 
-'''LOGGING CONFIG'''
-log_format = '%(asctime)s:%(levelname)s:%(name)s:%(message)s'
 log_dir = base_dir + '/logs'
 
 
-def create_logger(level: str):
-    level_upper = level.upper()
-    file_handler = FileHandler(f'{log_dir}/{level_upper}.log')
-    file_handler.setFormatter(Formatter(log_format))
-    logger = getLogger(f'{level}_logger')
-    logger.setLevel(level_upper)
-    logger.addHandler(file_handler)
-
-
-# GENERAL LOGS (ALL)
-getLogger().setLevel(DEBUG)
-basicConfig(filename=log_dir + '/GENERAL.log', level=DEBUG, format=log_format)
-# ERROR LOGS
-create_logger('error')
-# INFO LOGS
-create_logger('info')
-
-'''END LOGGING CONFIG'''
-
-
 class Settings(BaseSettings):
     db_engine: str = 'postgres'
     db_port: str = '5432'
@@ -41,10 +19,32 @@ class Settings(BaseSettings):
 
     error_logger: Logger = getLogger('error_logger')
     info_logger: Logger = getLogger('info_logger')
+    log_dir: str = log_dir
+    log_level: str = 'INFO'
+    log_levels: dict[str, str] = {
+        'error_logger': 'ERROR',
+        'info_logger': 'INFO',
+        'access_logger': 'INFO',
+        'openstack': 'DEBUG',
+        'keystoneauth': 'DEBUG',
+        'urllib3': 'WARNING',
+        'asyncssh': 'WARNING',
+    }
+    # share of the records below WARNING that are kept, per logger and its children
+    log_sampling: dict[str, float] = {
+        'openstack': 0.05,
+        'keystoneauth': 0.05,
+    }
 
     secret_key: str = 'str'
 
     cloud_name: str = 'name'
+    openstack_pool_size: int = 10
+    openstack_token_refresh_margin: int = 300
+    openstack_token_cache_path: str = '/tmp/gateway_openstack_token'
+    openstack_executor_workers: int = 32
+    openstack_read_concurrency: int = 24
+    openstack_mutation_concurrency: int = 8
 
     mail_username: str = 'username'
     mail_password: str = 'password'
@@ -52,8 +52,77 @@ class Settings(BaseSettings):
     mail_server: str = 'server'
     mail_from: str = 'from@test.com'
     mail_from_name: str = 'from_name'
+    # plain SMTP without login, e.g. a local sink, needs mail_starttls and mail_use_credentials off
+    mail_starttls: bool = True
+    mail_ssl_tls: bool = False
+    mail_use_credentials: bool = True
+    mail_validate_certs: bool = True
+    mail_timeout: int = 60
+    mail_smtp_idle_timeout: int = 60
+    mail_outbox_interval: int = 10
+    mail_outbox_batch_size: int = 20
+    mail_outbox_max_attempts: int = 8
+    mail_outbox_retry_backoff: int = 30
+    mail_outbox_lease: int = 300
 
     max_server_limit: int = '10'
+    server_bulk_create_max_count: int = 50
+    server_state_concurrency: int = 10
+    server_state_max_concurrency: int = 50
+    provisioning_job_stale_after: int = 900
+    stale_job_sweep_interval: int = 60
+    server_state_poll_interval: int = 15
+    server_state_max_staleness: int = 60
+    server_state_full_sync_interval: int = 3600
+    server_config_catalog_ttl: int = 300
+    server_config_resolve_interval: int = 600
+    compute_limits_ttl: int = 120
+    ssh_port: int = 22
+    ssh_idle_timeout: int = 300
+    ssh_keepalive_interval: int = 30
+    ssh_connect_timeout: int = 30
+    ssh_ready_timeout: int = 300
+    command_batch_concurrency: int = 10
+    command_batch_max_concurrency: int = 50
+    command_output_buffer_size: int = 256 * 1024
+    command_output_chunk_size: int = 64 * 1024
+    command_output_flush_interval: float = 2
+    command_output_max_size: int = 4 * 1024 * 1024
+    command_output_retention: int = 300
+    command_output_poll_interval: float = 1
+    command_output_idle_timeout: int = 300
+    command_queue_poll_interval: float = 2
+    command_execution_timeout: int = 3600
+    # how long an execution may wait for its turn before it is given up on
+    command_queue_timeout: int = 86400
+    tag_write_delay: float = 0.05
+    image_bake_snapshot_timeout: int = 1800
+    image_bake_stale_after: int = 7200
+    warm_pool_interval: int = 30
+    warm_pool_refill_concurrency: int = 2
+    warm_pool_keypair: str = 'warm-pool'
+    warm_pool_slot_stale_after: int = 300
+    # fernet secret for the private keys in the keystore, derived from secret_key when empty
+    keystore_secret: str = ''
+    keystore_cache_size: int = 1024
+    keystore_legacy_key_dir: str = './keys'
+    # address of the artifact cache as seen from the VMs, empty to install straight from the
+    # internet
+    artifact_cache_url: str = ''
+    artifact_cache_dir: str = './artifact_cache'
+    artifact_cache_max_size: int = 20 * 1024 * 1024 * 1024
+    artifact_index_ttl: int = 300
+    artifact_upstream_timeout: int = 60
+    # tenant subnets the VMs fetch from. docker bridges, loopback and reverse proxies are left out,
+    # behind them every client would look allowed
+    artifact_allowed_networks: list[str] = ['10.0.0.0/8']
+    artifact_upstreams: dict[str, str] = {
+        'pypi': 'https://pypi.org',
+        'pypi-files': 'https://files.pythonhosted.org',
+        'pytorch': 'https://download.pytorch.org',
+        'fedora': 'https://dl.fedoraproject.org/pub/fedora/linux',
+        'mongodb': 'https://repo.mongodb.org',
+    }
 
     class Config:
         env_file = '.env'
@@ -6,6 +6,11 @@ from sqlalchemy import pool
 
 from app.config import settings
 from app.servers.models import Base
+import app.jobs.models  # noqa: F401
+import app.images.models  # noqa: F401
+import app.keystore.models  # noqa: F401
+import app.mailing.models  # noqa: F401
+import app.runner.models  # noqa: F401
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,73 @@
+import asyncio
+import contextlib
+import uuid
+import zlib
+
+import pytest
+
+import app.runner.output as output_module
+from app.runner.output import CommandOutput
+
+
+class FakeChunks:
+    # the command_output_chunk table, the next insert fails when told to
+    def __init__(self):
+        self.chunks = []
+        self.fail_next = False
+
+    async def insert(self, execution_id, server_id, offset, size, data, is_final, session):
+        if self.fail_next:
+            self.fail_next = False
+            raise RuntimeError('database is gone')
+        self.chunks.append((offset, zlib.decompress(data).decode(), is_final))
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    chunks = FakeChunks()
+    monkeypatch.setattr(output_module, 'async_session_maker', contextlib.nullcontext)
+    monkeypatch.setattr(output_module.runner_db, 'insert_output_chunk', chunks.insert)
+    return chunks
+
+
+def _output() -> CommandOutput:
+    return CommandOutput(
+        uuid.uuid4(),
+        uuid.uuid4(),
+        buffer_size=4,
+        chunk_size=1024,
+        max_size=1024,
+        flush_interval=60,
+    )
+
+
+def test_failed_flush_keeps_the_text_for_the_next_one(chunks):
+    async def run():
+        output = _output()
+        await output.write('first\n')
+        chunks.fail_next = True
+        with pytest.raises(RuntimeError):
+            await output.flush()
+
+        await output.write('second\n')
+        await output.close()
+        return output
+
+    output = asyncio.run(run())
+
+    # the stored chunks cover everything written, without gaps
+    assert chunks.chunks == [(0, 'first\nsecond\n', True)]
+    assert output._flushed == len('first\nsecond\n')
+
+
+def test_chunks_continue_at_the_stored_offset(chunks):
+    async def run():
+        output = _output()
+        await output.write('one\n')
+        await output.flush()
+        await output.write('two\n')
+        await output.close()
+
+    asyncio.run(run())
+
+    assert chunks.chunks == [(0, 'one\n', False), (4, 'two\n', True)]
@@ -0,0 +1,71 @@
+import asyncio
+import datetime
+
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BooleanClauseList
+
+import app.runner.db_service as runner_db
+from app.jobs.schemas import JobStatus
+from app.runner.models import CommandExecution
+
+EXECUTION_TIMEOUT = 3600
+QUEUE_TIMEOUT = 86400
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+
+    async def commit(self):
+        pass
+
+
+def _matches(clause, row: CommandExecution) -> bool:
+    # evaluates the and/or of column comparisons an UPDATE is filtered by against one row
+    if isinstance(clause, BooleanClauseList):
+        results = [_matches(item, row) for item in clause.clauses]
+        return all(results) if clause.operator is operators.and_ else any(results)
+    value = getattr(row, clause.left.key)
+    return value is not None and clause.operator(value, clause.right.value)
+
+
+def _execution(status: str, queued_ago: int, started_ago: int = None) -> CommandExecution:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    started_at = None
+    if started_ago is not None:
+        started_at = now - datetime.timedelta(seconds=started_ago)
+    return CommandExecution(
+        status=status,
+        queued_at=now - datetime.timedelta(seconds=queued_ago),
+        started_at=started_at,
+    )
+
+
+def _stale(execution: CommandExecution) -> bool:
+    session = RecordingSession()
+    asyncio.run(runner_db.fail_stale_executions(EXECUTION_TIMEOUT, QUEUE_TIMEOUT, session))
+    statement, = session.statements
+    return _matches(statement.whereclause, execution)
+
+
+def test_running_execution_expires_by_its_start():
+    running = JobStatus.running.value
+    assert _stale(_execution(running, queued_ago=2 * EXECUTION_TIMEOUT, started_ago=60)) is False
+    assert _stale(_execution(running, queued_ago=2 * EXECUTION_TIMEOUT,
+                             started_ago=EXECUTION_TIMEOUT + 60)) is True
+
+
+def test_pending_execution_waits_behind_long_commands():
+    # queued behind a few hour long commands is not stale, only past the queue timeout
+    pending = JobStatus.pending.value
+    assert _stale(_execution(pending, queued_ago=3 * EXECUTION_TIMEOUT)) is False
+    assert _stale(_execution(pending, queued_ago=QUEUE_TIMEOUT + 60)) is True
+
+
+def test_finished_execution_is_left_alone():
+    for status in (JobStatus.succeeded.value, JobStatus.failed.value):
+        assert _stale(_execution(status, queued_ago=2 * QUEUE_TIMEOUT,
+                                 started_ago=2 * QUEUE_TIMEOUT)) is False
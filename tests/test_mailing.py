@@ -0,0 +1,256 @@
+import asyncio
+import contextlib
+import datetime
+import json
+import socket
+import uuid
+from email import message_from_bytes, policy
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import app.mailing.service as mailing
+from app.config import settings
+from app.jobs.schemas import JobStatus
+from app.keystore.service import keystore
+from app.mailing.config import LOGO_CID, LOGO_PATH, template_env
+from app.mailing.models import OutboxMessage
+from app.mailing.service import Attachment, MailOutbox
+
+RETRY_BACKOFF = 30
+LEASE = 300
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class SmtpSink:
+    # accepts everything except recipients starting with bounce
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('bounce'):
+            return '550 Mailbox unavailable'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(message_from_bytes(envelope.content, policy=policy.default))
+        return '250 OK'
+
+
+class FakeOutboxTable:
+    # the mail_outbox table in memory. Claims follow db_service: the oldest due pending rows, each
+    # leased for `lease` seconds
+    def __init__(self):
+        self.now = datetime.datetime.now(datetime.timezone.utc)
+        self.messages: dict[uuid.UUID, OutboxMessage] = {}
+        self.claims: list[list[str]] = []
+        self.delays: list[int] = []
+
+    def add(self, recipient: str, attachments: list[Attachment] = ()) -> OutboxMessage:
+        token = None
+        if attachments:
+            token = keystore.encrypt(json.dumps([item._asdict() for item in attachments]))
+        message = OutboxMessage(
+            id=uuid.uuid4(),
+            recipient=recipient,
+            subject='Your key',
+            template_name='ssh_email.html',
+            body={'default_user': 'ubuntu', 'public_address': '203.0.113.7'},
+            attachments=token,
+            status=JobStatus.pending.value,
+            attempts=0,
+            next_attempt_at=self.now,
+            created_at=self.now + datetime.timedelta(microseconds=len(self.messages)),
+        )
+        self.messages[message.id] = message
+        return message
+
+    def advance(self, seconds: int):
+        self.now += datetime.timedelta(seconds=seconds)
+
+    async def claim(self, limit, lease, session):
+        due = sorted(
+            (
+                message for message in self.messages.values()
+                if message.status == JobStatus.pending.value and message.next_attempt_at <= self.now
+            ),
+            key=lambda message: message.created_at,
+        )[:limit]
+        for message in due:
+            message.attempts += 1
+            message.next_attempt_at = self.now + datetime.timedelta(seconds=lease)
+        self.claims.append([message.recipient for message in due])
+        return due
+
+    async def update(self, message_id, session, **values):
+        for key, value in values.items():
+            setattr(self.messages[message_id], key, value)
+
+    async def retry(self, message_id, error, delay, session):
+        self.delays.append(delay)
+        next_attempt_at = self.now + datetime.timedelta(seconds=delay)
+        await self.update(message_id, session, error=error, next_attempt_at=next_attempt_at)
+
+    async def delete(self, message_ids, session):
+        for message_id in message_ids:
+            del self.messages[message_id]
+
+
+@pytest.fixture
+def sink():
+    handler = SmtpSink()
+    controller = Controller(handler, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    yield controller
+    controller.stop()
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeOutboxTable()
+    monkeypatch.setattr(mailing, 'async_session_maker', contextlib.nullcontext)
+    monkeypatch.setattr(mailing.db, 'claim_outbox_messages', table.claim)
+    monkeypatch.setattr(mailing.db, 'update_outbox_message', table.update)
+    monkeypatch.setattr(mailing.db, 'retry_outbox_message', table.retry)
+    monkeypatch.setattr(mailing.db, 'delete_outbox_messages', table.delete)
+    return table
+
+
+@pytest.fixture
+def smtp_settings(monkeypatch, sink):
+    monkeypatch.setattr(settings, 'mail_server', sink.hostname)
+    monkeypatch.setattr(settings, 'mail_port', sink.port)
+    monkeypatch.setattr(settings, 'mail_starttls', False)
+    monkeypatch.setattr(settings, 'mail_ssl_tls', False)
+    monkeypatch.setattr(settings, 'mail_use_credentials', False)
+    monkeypatch.setattr(settings, 'mail_timeout', 5)
+
+
+def _outbox(batch_size: int = 20, max_attempts: int = 8) -> MailOutbox:
+    outbox = MailOutbox(
+        interval=10,
+        batch_size=batch_size,
+        max_attempts=max_attempts,
+        retry_backoff=RETRY_BACKOFF,
+        idle_timeout=60,
+        lease=LEASE,
+    )
+    # what start() loads, without the background task draining on its own
+    outbox._templates = {
+        name: template_env.get_template(name) for name in template_env.list_templates(['html'])
+    }
+    with open(LOGO_PATH, 'rb') as file:
+        outbox._logo = file.read()
+    return outbox
+
+
+async def _drain(outbox: MailOutbox):
+    try:
+        await outbox.drain()
+    finally:
+        await outbox.stop()
+
+
+def test_drain_sends_in_batches_over_one_connection(sink, table, smtp_settings):
+    recipients = [f'user{i}@example.com' for i in range(5)]
+    for recipient in recipients:
+        table.add(recipient)
+    outbox = _outbox(batch_size=2)
+
+    asyncio.run(_drain(outbox))
+
+    assert table.claims == [recipients[0:2], recipients[2:4], recipients[4:5], []]
+    assert [message['To'] for message in sink.handler.messages] == recipients
+    assert table.messages == {}
+    assert outbox._stats.sent == 5
+    assert outbox._stats.connections == 1
+
+
+def test_rejected_message_backs_off_exponentially_then_fails(sink, table, smtp_settings):
+    message = table.add('bounce@example.com')
+    table.add('user@example.com')
+    outbox = _outbox(max_attempts=3)
+
+    asyncio.run(_drain(outbox))
+
+    # a refused recipient doesn't stop the rest of the batch
+    assert [sent['To'] for sent in sink.handler.messages] == ['user@example.com']
+    assert table.delays == [RETRY_BACKOFF]
+    assert message.next_attempt_at == table.now + datetime.timedelta(seconds=RETRY_BACKOFF)
+
+    table.advance(RETRY_BACKOFF - 1)
+    asyncio.run(_drain(outbox))
+    assert message.attempts == 1
+
+    table.advance(1)
+    asyncio.run(_drain(outbox))
+    assert message.attempts == 2
+    assert table.delays == [RETRY_BACKOFF, 2 * RETRY_BACKOFF]
+
+    table.advance(2 * RETRY_BACKOFF)
+    asyncio.run(_drain(outbox))
+    assert message.attempts == 3
+    assert message.status == JobStatus.failed.value
+    assert message.attachments is None
+    assert '550' in message.error
+    assert table.delays == [RETRY_BACKOFF, 2 * RETRY_BACKOFF]
+    assert outbox._stats.retried == 2
+    assert outbox._stats.failed == 1
+
+
+def test_unreachable_server_leaves_the_batch_to_its_lease(sink, table, smtp_settings, monkeypatch):
+    recipients = [f'user{i}@example.com' for i in range(3)]
+    messages = [table.add(recipient) for recipient in recipients]
+    monkeypatch.setattr(settings, 'mail_port', _free_port())
+    outbox = _outbox()
+
+    asyncio.run(_drain(outbox))
+
+    # the first message backs off, the rest stays leased without another connection attempt each
+    assert table.claims == [recipients]
+    assert table.delays == [RETRY_BACKOFF]
+    assert [message.attempts for message in messages] == [1, 1, 1]
+    assert all(
+        message.next_attempt_at == table.now + datetime.timedelta(seconds=LEASE)
+        for message in messages[1:]
+    )
+
+    monkeypatch.setattr(settings, 'mail_port', sink.port)
+    table.advance(RETRY_BACKOFF)
+    asyncio.run(_drain(outbox))
+    assert [sent['To'] for sent in sink.handler.messages] == recipients[:1]
+
+    table.advance(LEASE)
+    asyncio.run(_drain(outbox))
+    assert [sent['To'] for sent in sink.handler.messages] == recipients
+    assert table.messages == {}
+
+
+def test_build_relates_the_logo_and_attaches_files(table):
+    key = Attachment('key.pem', 'private key\n', 'application', 'x-pem-file')
+    message = table.add('user@example.com', [key])
+
+    email = _outbox()._build(message)
+
+    assert email.get_content_type() == 'multipart/mixed'
+    assert email['Subject'] == 'Your key'
+    assert email['To'] == 'user@example.com'
+
+    body, attachment = email.iter_parts()
+    assert body.get_content_type() == 'multipart/related'
+    html, logo = body.iter_parts()
+    assert html.get_content_type() == 'text/html'
+    assert f'cid:{LOGO_CID}' in html.get_content()
+    assert 'ubuntu@203.0.113.7' in html.get_content()
+    assert logo.get_content_type() == 'image/png'
+    assert logo['Content-ID'] == f'<{LOGO_CID}>'
+
+    assert attachment.get_content_type() == 'application/x-pem-file'
+    assert attachment.get_filename() == 'key.pem'
+    assert attachment.get_content() == key.content.encode()
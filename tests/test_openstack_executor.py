@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.openstack.executor import CallKind, OpenStackExecutor
+
+
+class BlockingCalls:
+    # calls that hold their thread until released, counting how many run at once
+    def __init__(self):
+        self.release = threading.Event()
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def call(self, value=None):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            self.release.wait(timeout=5)
+            return value
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+async def _wait_until(condition, timeout: float = 2):
+    async def wait():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(wait(), timeout)
+
+
+def _executor(read: int = 4, mutation: int = 2) -> OpenStackExecutor:
+    limits = {CallKind.READ: read, CallKind.MUTATION: mutation}
+    return OpenStackExecutor(max_workers=8, limits=limits)
+
+
+def test_mutations_are_capped_without_blocking_reads():
+    executor = _executor()
+    calls = BlockingCalls()
+
+    async def run():
+        mutations = [
+            asyncio.create_task(executor.run(CallKind.MUTATION, calls.call, index))
+            for index in range(6)
+        ]
+        await _wait_until(lambda: calls.running == 2)
+
+        stats = executor.get_stats()['mutation']
+        assert (stats['running'], stats['queue_depth']) == (2, 4)
+        assert await executor.run(CallKind.READ, lambda: 'read') == 'read'
+
+        calls.release.set()
+        return await asyncio.gather(*mutations)
+
+    try:
+        assert asyncio.run(run()) == list(range(6))
+    finally:
+        executor.shutdown()
+
+    assert calls.peak == 2
+    stats = executor.get_stats()
+    assert (stats['mutation']['completed'], stats['mutation']['queue_depth']) == (6, 0)
+    assert stats['read']['completed'] == 1
+
+
+def test_cancelled_call_keeps_its_slot_until_the_thread_finishes():
+    executor = _executor(mutation=1)
+    calls = BlockingCalls()
+
+    async def run():
+        first = asyncio.create_task(executor.run(CallKind.MUTATION, calls.call))
+        await _wait_until(lambda: calls.running == 1)
+        first.cancel()
+
+        second = asyncio.create_task(executor.run(CallKind.MUTATION, calls.call, 'second'))
+        await asyncio.sleep(0.1)
+        # the cancelled call's thread still runs, so the second one waits for the slot
+        assert executor.get_stats()['mutation']['queue_depth'] == 1
+        assert calls.peak == 1
+
+        calls.release.set()
+        return await second
+
+    try:
+        assert asyncio.run(run()) == 'second'
+    finally:
+        executor.shutdown()
+
+    assert calls.peak == 1
+    assert executor.get_stats()['mutation']['completed'] == 2
+
+
+def test_failed_call_raises_and_is_counted():
+    executor = _executor()
+
+    def fail():
+        raise RuntimeError('quota exceeded')
+
+    try:
+        with pytest.raises(RuntimeError, match='quota exceeded'):
+            asyncio.run(executor.run(CallKind.READ, fail))
+    finally:
+        executor.shutdown()
+
+    stats = executor.get_stats()['read']
+    assert (stats['failed'], stats['completed'], stats['running']) == (1, 0, 0)
@@ -0,0 +1,111 @@
+import asyncio
+import re
+import subprocess
+
+import pytest
+
+from app.runner.script import StepMarkerParser, build_script, new_nonce
+from app.servers.schemas import ServerCommandEnum
+from app.servers.service import get_command_executor
+
+# package manager calls that ask before they change anything
+CONFIRMING_CALL = re.compile(
+    r'\b(dnf|yum|apt-get|apt)\b.*\b(install|update|upgrade|remove|erase)\b|\bpip3?\s+uninstall\b'
+)
+ASSUME_YES = re.compile(r'(^|\s)(-y|--assumeyes|--yes)(\s|$)')
+
+
+def _run_script(commands: list[str], nonce: str) -> subprocess.CompletedProcess:
+    script = build_script(commands, nonce)
+    return subprocess.run(['sh', '-s'], input=script, capture_output=True, text=True)
+
+
+def _parse(commands: list[str], nonce: str, output: str, chunk_size: int = 0) -> (str, list[dict]):
+    written = []
+
+    async def on_output(text: str):
+        written.append(text)
+
+    async def parse() -> StepMarkerParser:
+        parser = StepMarkerParser(nonce, commands, on_output)
+        size = chunk_size or len(output) or 1
+        for start in range(0, len(output), size):
+            await parser.feed(output[start:start + size])
+        await parser.finish()
+        return parser
+
+    parser = asyncio.run(parse())
+    return ''.join(written), parser.steps
+
+
+def test_new_nonce_differs_per_run():
+    assert new_nonce() != new_nonce()
+
+
+@pytest.mark.parametrize('chunk_size', [0, 1, 5])
+def test_steps_output_and_exit_codes(chunk_size):
+    commands = ['echo one', 'printf two', "sh -c 'exit 3'", 'echo never']
+    nonce = new_nonce()
+    process = _run_script(commands, nonce)
+
+    output, steps = _parse(commands, nonce, process.stdout, chunk_size)
+
+    # the script stops at the failing step and exits with its code
+    assert process.returncode == 3
+    assert output == "$ echo one\none\n$ printf two\ntwo\n$ sh -c 'exit 3'\n"
+    assert [(step['status'], step['exit_code']) for step in steps] == [
+        ('succeeded', 0),
+        ('succeeded', 0),
+        ('failed', 3),
+        ('skipped', None),
+    ]
+    assert all(step['duration_ms'] is not None for step in steps[:3])
+
+
+def test_steps_do_not_read_the_script():
+    commands = ['cat', 'echo after']
+    nonce = new_nonce()
+    process = _run_script(commands, nonce)
+
+    output, steps = _parse(commands, nonce, process.stdout)
+
+    assert output == '$ cat\n$ echo after\nafter\n'
+    assert [step['status'] for step in steps] == ['succeeded', 'succeeded']
+
+
+def test_step_that_ends_the_shell_is_failed():
+    # exit leaves the script before the end marker, the exit code only reaches the channel
+    commands = ['exit 4', 'echo never']
+    nonce = new_nonce()
+    process = _run_script(commands, nonce)
+
+    _, steps = _parse(commands, nonce, process.stdout)
+
+    assert process.returncode == 4
+    assert [(step['status'], step['exit_code']) for step in steps] == [
+        ('failed', None),
+        ('skipped', None),
+    ]
+
+
+def test_markers_of_another_nonce_are_output():
+    commands = ['true']
+    nonce = new_nonce()
+    forged = f'{new_nonce()} end 0 0\n'
+    output = f'{nonce} start 0\n{forged}{nonce} end 0 0\n'
+
+    written, steps = _parse(commands, nonce, output, chunk_size=3)
+
+    assert written == f'$ true\n{forged}'
+    assert steps[0]['status'] == 'succeeded'
+
+
+
+@pytest.mark.parametrize('command', list(ServerCommandEnum))
+def test_shipped_commands_never_ask_for_confirmation(command):
+    # steps read from /dev/null, a prompt would abort the step
+    executor = get_command_executor(command)
+    script = build_script(executor.get_commands(), new_nonce())
+
+    confirming = [line for line in script.splitlines() if CONFIRMING_CALL.search(line)]
+    assert [line for line in confirming if not ASSUME_YES.search(line)] == []
@@ -0,0 +1,189 @@
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.servers.router as servers_router
+from app.dependencies import get_async_session, get_openstack_connection
+from app.jobs.schemas import JobStatus
+from app.servers.models import Server
+
+OWNER_ID = uuid.UUID('7b8d5c3e-3b51-4a55-9a0e-0d4b7b1e9f10')
+
+
+class FakeUser:
+    id = OWNER_ID
+    is_superuser = False
+
+
+class FakeSession:
+    def __init__(self):
+        self.rollbacks = 0
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeRecord:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class FakeTargets:
+    # the user's servers, nova and the command queue, recorded in the order they were used
+    def __init__(self):
+        self.owned = [Server(openstack_id=uuid.uuid4(), owner_id=OWNER_ID) for _ in range(3)]
+        self.in_nova = {str(server.openstack_id) for server in self.owned}
+        self.failing = set()
+        self.calls = []
+        self.batch = None
+        self.started = None
+        self.state_errors = {}
+        self.forgotten = []
+
+    @property
+    def owned_ids(self) -> list[str]:
+        return [str(server.openstack_id) for server in self.owned]
+
+    async def get_owned_servers(self, user, session, server_ids=None, tag=None):
+        wanted = {str(server_id) for server_id in server_ids or []}
+        return [server for server in self.owned if str(server.openstack_id) in wanted]
+
+    async def get_openstack_servers(self, server_ids, user, conn, session, fresh=False):
+        return {
+            str(server_id): FakeRecord(addresses={})
+            for server_id in server_ids
+            if str(server_id) in self.in_nova
+        }
+
+    async def insert_command_batch(self, owner_id, command, concurrency, targets, session):
+        self.calls.append('batch')
+        self.batch = FakeRecord(id=uuid.uuid4())
+        return self.batch
+
+    async def submit_command(self, server, command, executor, ip_address, owner_id, key, session):
+        server_id = str(server.openstack_id)
+        self.calls.append(server_id)
+        if server_id in self.failing:
+            raise RuntimeError('database is gone')
+        return FakeRecord(id=uuid.uuid4()), None
+
+    def start_command_batch(self, batch_id, targets, executions, concurrency):
+        self.calls.append('start')
+        self.started = (batch_id, targets, executions)
+
+    async def apply_state_action(self, conn, server_ids, action, concurrency):
+        self.calls.append(action.value)
+        return {server_id: self.state_errors.get(server_id) for server_id in server_ids}
+
+    async def delete_server_states(self, server_ids, session):
+        self.forgotten = [str(server_id) for server_id in server_ids]
+
+
+@pytest.fixture
+def targets(monkeypatch):
+    targets = FakeTargets()
+    monkeypatch.setattr(servers_router.db, 'get_owned_servers', targets.get_owned_servers)
+    monkeypatch.setattr(servers_router, '_get_openstack_servers', targets.get_openstack_servers)
+    monkeypatch.setattr(
+        servers_router.jobs_db,
+        'insert_command_batch',
+        targets.insert_command_batch,
+    )
+    monkeypatch.setattr(servers_router, 'submit_command', targets.submit_command)
+    monkeypatch.setattr(servers_router, 'start_command_batch', targets.start_command_batch)
+    monkeypatch.setattr(servers_router, 'apply_state_action', targets.apply_state_action)
+    monkeypatch.setattr(servers_router.db, 'delete_server_states', targets.delete_server_states)
+    return targets
+
+
+@pytest.fixture
+def session():
+    return FakeSession()
+
+
+@pytest.fixture
+def client(targets, session):
+    app = FastAPI()
+    app.include_router(servers_router.router)
+    app.dependency_overrides[servers_router.current_user] = FakeUser
+    app.dependency_overrides[get_openstack_connection] = lambda: None
+    app.dependency_overrides[get_async_session] = lambda: session
+    return TestClient(app)
+
+
+def test_command_batch_reports_every_target(client, targets, session):
+    not_owned = str(uuid.uuid4())
+    not_in_nova, failing, queued = targets.owned_ids
+    targets.in_nova.discard(not_in_nova)
+    targets.failing.add(failing)
+
+    response = client.post('/servers/commands', json={
+        'command': 'install_torch',
+        'server_ids': [*targets.owned_ids, not_owned],
+    })
+
+    assert response.status_code == 202
+    assert response.json() == {'batch_id': str(targets.batch.id)}
+    # the batch exists before anything is queued and starts whatever was
+    assert targets.calls == ['batch', failing, queued, 'start']
+    assert session.rollbacks == 1
+
+    batch_id, batch_targets, executions = targets.started
+    assert batch_id == targets.batch.id
+    assert list(executions) == [queued]
+    assert batch_targets == {
+        not_in_nova: {'status': JobStatus.failed.value, 'error': 'Server not found'},
+        failing: {'status': JobStatus.failed.value, 'error': 'database is gone'},
+        queued: {
+            'status': JobStatus.pending.value,
+            'execution_id': str(executions[queued][0]),
+        },
+        not_owned: {'status': JobStatus.failed.value, 'error': 'Server not found'},
+    }
+
+
+def test_command_batch_without_owned_servers_is_not_found(client, targets):
+    response = client.post('/servers/commands', json={
+        'command': 'install_torch',
+        'server_ids': [str(uuid.uuid4())],
+    })
+
+    assert response.status_code == 404
+    assert targets.calls == []
+
+
+def test_state_action_reports_every_target(client, targets):
+    not_owned = str(uuid.uuid4())
+    stopped, refused, _ = targets.owned_ids
+    targets.state_errors[refused] = 'Cannot stop instance in state paused'
+
+    response = client.patch('/servers/state', json={
+        'action': 'stop',
+        'server_ids': [stopped, refused, not_owned],
+    })
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {'server_id': stopped, 'status': JobStatus.succeeded.value, 'error': None},
+        {
+            'server_id': refused,
+            'status': JobStatus.failed.value,
+            'error': 'Cannot stop instance in state paused',
+        },
+        {'server_id': not_owned, 'status': JobStatus.failed.value, 'error': 'Server not found'},
+    ]
+    assert targets.calls == ['stop']
+    # cached states of every target are dropped, nova is asked again next time
+    assert targets.forgotten == [stopped, refused]
+
+
+def test_state_action_without_owned_servers_is_not_found(client, targets):
+    response = client.patch('/servers/state', json={
+        'action': 'stop',
+        'server_ids': [str(uuid.uuid4())],
+    })
+
+    assert response.status_code == 404
+    assert targets.calls == []
@@ -0,0 +1,111 @@
+import asyncio
+import contextlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.servers.catalog_service as catalog_service
+import app.servers.router as servers_router
+from app.servers.catalog_service import ServerConfigCatalog, etag_matches
+from app.servers.models import ServerConfig
+
+
+def _config(name: str) -> ServerConfig:
+    return ServerConfig(
+        name=name,
+        description=name,
+        image='ubuntu-22.04',
+        flavor='m1.small',
+        networks=['private'],
+    )
+
+
+class FakeConfigs:
+    def __init__(self, configs: list[ServerConfig]):
+        self.configs = configs
+        self.loads = 0
+
+    async def get(self, session) -> list[ServerConfig]:
+        self.loads += 1
+        return list(self.configs)
+
+
+@pytest.fixture
+def configs(monkeypatch):
+    configs = FakeConfigs([_config('b'), _config('a')])
+    monkeypatch.setattr(catalog_service, 'async_session_maker', contextlib.nullcontext)
+    monkeypatch.setattr(catalog_service.db, 'get_server_configurations', configs.get)
+    return configs
+
+
+@pytest.mark.parametrize('if_none_match, matches', [
+    (None, False),
+    ('', False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", "abc"', True),
+    ('"other"', False),
+    ('abc', False),
+    ('*', True),
+])
+def test_etag_matches(if_none_match, matches):
+    assert etag_matches(if_none_match, '"abc"') is matches
+
+
+def test_catalog_is_sorted_and_its_etag_follows_the_content(configs):
+    catalog = ServerConfigCatalog(ttl=3600)
+
+    body, etag = asyncio.run(catalog.get_catalog())
+    assert body.startswith(b'[{"name": "a"')
+    assert etag.startswith('"') and etag.endswith('"')
+
+    # the same rows in another order give the same body and ETag
+    configs.configs.reverse()
+    catalog.invalidate()
+    assert asyncio.run(catalog.get_catalog()) == (body, etag)
+
+    configs.configs.append(_config('c'))
+    catalog.invalidate()
+    _, changed_etag = asyncio.run(catalog.get_catalog())
+    assert changed_etag != etag
+
+
+def test_catalog_is_loaded_once_per_ttl(configs):
+    catalog = ServerConfigCatalog(ttl=3600)
+
+    asyncio.run(catalog.get_catalog())
+    assert asyncio.run(catalog.get('a')).name == 'a'
+    assert asyncio.run(catalog.get('missing')) is None
+    assert configs.loads == 1
+
+    catalog.invalidate()
+    asyncio.run(catalog.get_catalog())
+    assert configs.loads == 2
+
+    expired = ServerConfigCatalog(ttl=0)
+    asyncio.run(expired.get_catalog())
+    asyncio.run(expired.get_catalog())
+    assert configs.loads == 4
+
+
+def test_configurations_endpoint_answers_if_none_match(configs, monkeypatch):
+    monkeypatch.setattr(servers_router, 'server_config_catalog', ServerConfigCatalog(ttl=3600))
+    app = FastAPI()
+    app.include_router(servers_router.router)
+    app.dependency_overrides[servers_router.current_user] = lambda: None
+    client = TestClient(app)
+
+    response = client.get('/servers/configurations')
+    assert response.status_code == 200
+    assert [config['name'] for config in response.json()] == ['a', 'b']
+    etag = response.headers['ETag']
+
+    response = client.get('/servers/configurations', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.content == b''
+
+    response = client.get('/servers/configurations', headers={'If-None-Match': '"stale"'})
+    assert response.status_code == 200
+    assert configs.loads == 1
@@ -0,0 +1,226 @@
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from openstack.compute.v2.server import Server as OpenStackServer
+
+import app.servers.router as servers_router
+import app.servers.service as servers_service
+from app.dependencies import get_async_session, get_openstack_connection
+from app.openstack.models import ComputeLimits
+from app.servers.models import Server, ServerConfig
+
+CONFIG = ServerConfig(
+    name='small',
+    description='small',
+    image='ubuntu-22.04',
+    flavor='m1.small',
+    networks=['private'],
+)
+
+
+class FakeUser:
+    id = uuid.UUID('7b8d5c3e-3b51-4a55-9a0e-0d4b7b1e9f10')
+    email = 'user@example.com'
+    is_superuser = False
+
+
+class FakeLimits:
+    def __init__(self):
+        self.reserved = 0
+        self.invalidated = 0
+
+    async def get_limits(self, conn) -> ComputeLimits:
+        return ComputeLimits(10, 10, 0, 20, 0, 40960, 0)
+
+    async def check_create(self, conn, flavor, count=1):
+        return None, None
+
+    def reserve(self, flavor_size, count=1):
+        self.reserved += count
+
+    def invalidate(self):
+        self.invalidated += 1
+
+
+class FakeServers:
+    # what the create endpoints read and write, recorded for the assertions
+    def __init__(self):
+        self.limits = FakeLimits()
+        self.baked_images = []
+        self.provisioned = []
+
+    async def get_user_servers(self, user, session):
+        return []
+
+    async def get_config(self, name):
+        return CONFIG if name == CONFIG.name else None
+
+    async def find_baked_image(self, configuration_name, tags, session):
+        self.baked_images.append(tags)
+        return None
+
+    async def claim_pooled(self, *args):
+        return None
+
+    async def provision(self, *args, **kwargs):
+        self.provisioned.append(args)
+        raise AssertionError('nothing may boot')
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    fakes = FakeServers()
+    monkeypatch.setattr(servers_router, 'compute_limits', fakes.limits)
+    monkeypatch.setattr(servers_router.db, 'get_user_servers', fakes.get_user_servers)
+    monkeypatch.setattr(servers_router.server_config_catalog, 'get', fakes.get_config)
+    monkeypatch.setattr(servers_router.images_db, 'find_baked_image', fakes.find_baked_image)
+    monkeypatch.setattr(servers_router.warm_pool, 'claim', fakes.claim_pooled)
+    monkeypatch.setattr(servers_router, 'provision_server', fakes.provision)
+    monkeypatch.setattr(servers_router, 'provision_servers', fakes.provision)
+    return fakes
+
+
+@pytest.fixture
+def client(fakes):
+    app = FastAPI()
+    app.include_router(servers_router.router)
+    app.dependency_overrides[servers_router.current_user] = FakeUser
+    app.dependency_overrides[get_openstack_connection] = lambda: None
+    app.dependency_overrides[get_async_session] = lambda: None
+    return TestClient(app)
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/servers/from_configuration', {}),
+    ('/servers/from_configuration?async_job=true', {}),
+    ('/servers/bulk', {'count': 3}),
+])
+def test_tools_without_a_baked_image_are_refused(client, fakes, path, body):
+    response = client.post(path, json={
+        'name': 'db',
+        'description': 'db',
+        'configuration_name': CONFIG.name,
+        'tools': ['postgres', 'grafana'],
+        **body,
+    })
+
+    assert response.status_code == 409
+    assert response.json()['detail'] == 'No baked image for these tools'
+    assert fakes.baked_images == [['postgres', 'grafana']]
+    assert fakes.provisioned == []
+    assert fakes.limits.reserved == 0
+
+
+class FakeResource:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+@pytest.fixture
+def deleted(monkeypatch):
+    deleted = []
+
+    async def delete_created_resources(conn, server_id=None, volume_ids=None, floating_ip_id=None):
+        deleted.append((server_id, floating_ip_id))
+
+    monkeypatch.setattr(servers_service, 'delete_created_resources', delete_created_resources)
+    return deleted
+
+
+async def _fail_insert(*args, **kwargs):
+    raise RuntimeError('database is gone')
+
+
+def test_server_without_its_row_is_deleted(client, fakes, deleted, monkeypatch):
+    async def provision_server(*args):
+        return (
+            FakeResource(id='server-1'),
+            FakeResource(name=str(FakeUser.id), private_key=None),
+            FakeResource(id='ip-1', floating_ip_address='203.0.113.7'),
+        )
+
+    monkeypatch.setattr(servers_router, 'provision_server', provision_server)
+    monkeypatch.setattr(servers_router.db, 'insert_user_server', _fail_insert)
+
+    response = client.post('/servers/from_configuration', json={
+        'name': 'web',
+        'description': 'web',
+        'configuration_name': CONFIG.name,
+    })
+
+    assert response.status_code == 500
+    assert response.json()['detail'] == 'Failed to create server: database is gone'
+    assert deleted == [('server-1', 'ip-1')]
+    assert fakes.limits.invalidated == 1
+
+
+def _openstack_server(status: str) -> OpenStackServer:
+    return OpenStackServer(
+        id=str(uuid.uuid4()),
+        user_id=str(FakeUser.id),
+        name='web',
+        status=status,
+        vm_state=status.lower(),
+        launched_at='2026-10-18T09:00:00',
+        addresses={},
+    )
+
+
+@pytest.fixture
+def bulk(monkeypatch):
+    # three servers are asked for, nova boots two of them
+    booted = [_openstack_server('ACTIVE') for _ in range(2)]
+    failed = [_openstack_server('ERROR')]
+    floating_ips = {booted[0].id: FakeResource(id='ip-1', floating_ip_address='203.0.113.7')}
+    key_pair = FakeResource(name=str(FakeUser.id), private_key=None)
+    bulk = FakeResource(booted=booted, failed=failed, deleted_servers=[], rows=[])
+
+    async def provision_servers(*args):
+        return booted, failed, key_pair, floating_ips
+
+    def delete_server(conn, server_id):
+        bulk.deleted_servers.append(server_id)
+
+    async def insert_user_servers(server_ids, owner_id, image, session, tags):
+        bulk.rows = [
+            Server(openstack_id=uuid.UUID(server_id), owner_id=owner_id, image=image, tags=tags)
+            for server_id in server_ids
+        ]
+
+    async def get_owned_servers(user, session, server_ids):
+        return bulk.rows
+
+    monkeypatch.setattr(servers_router, 'provision_servers', provision_servers)
+    monkeypatch.setattr(servers_router.openstack, 'delete_server', delete_server)
+    monkeypatch.setattr(servers_router.db, 'insert_user_servers', insert_user_servers)
+    monkeypatch.setattr(servers_router.db, 'get_owned_servers', get_owned_servers)
+    return bulk
+
+
+BULK_CREATE = {'name': 'web', 'description': 'web', 'configuration_name': CONFIG.name, 'count': 3}
+
+
+def test_bulk_create_keeps_the_servers_that_booted(client, fakes, deleted, bulk):
+    response = client.post('/servers/bulk', json=BULK_CREATE)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [server['id'] for server in body['servers']] == [server.id for server in bulk.booted]
+    assert body['failed'] == 1
+    assert bulk.deleted_servers == [bulk.failed[0].id]
+    assert deleted == []
+    assert fakes.limits.reserved == 3
+    assert fakes.limits.invalidated == 1
+
+
+def test_bulk_create_deletes_every_server_without_its_row(
+        client, fakes, deleted, bulk, monkeypatch,
+):
+    monkeypatch.setattr(servers_router.db, 'insert_user_servers', _fail_insert)
+
+    response = client.post('/servers/bulk', json=BULK_CREATE)
+
+    assert response.status_code == 500
+    assert deleted == [(bulk.booted[0].id, 'ip-1'), (bulk.booted[1].id, None)]
@@ -0,0 +1,83 @@
+import uuid
+
+import pytest
+from openstack.exceptions import HttpException, ResourceNotFound
+
+from app.openstack.compute_service import SERVER_LOOKUP_FILTER_MAX, get_servers_by_ids
+
+
+class FakeServer:
+    def __init__(self, server_id: str):
+        self.id = server_id
+
+
+class FakeCompute:
+    # a project's servers. like nova for a token without admin rights, the listing ignores filters
+    def __init__(self, server_ids: list[str]):
+        self.servers_by_id = {server_id: FakeServer(server_id) for server_id in server_ids}
+        self.gets = []
+        self.listings = 0
+        self.error = None
+
+    def get_server(self, server_id: str) -> FakeServer:
+        self.gets.append(server_id)
+        if self.error is not None:
+            raise self.error
+        if server_id not in self.servers_by_id:
+            raise ResourceNotFound(f'No Server found for {server_id}')
+        return self.servers_by_id[server_id]
+
+    def servers(self, **filters):
+        self.listings += 1
+        return iter(self.servers_by_id.values())
+
+
+class FakeConnection:
+    def __init__(self, server_ids: list[str]):
+        self.compute = FakeCompute(server_ids)
+
+
+def _ids(count: int) -> list[str]:
+    return [str(uuid.uuid4()) for _ in range(count)]
+
+
+def test_few_ids_are_fetched_one_by_one():
+    existing = _ids(3)
+    missing = _ids(2)
+    conn = FakeConnection(existing + _ids(5))
+
+    lookup = get_servers_by_ids(conn, [existing[0], missing[0], existing[1], missing[1]])
+
+    assert [server.id for server in lookup.servers] == existing[:2]
+    assert lookup.missing_ids == missing
+    assert sorted(conn.compute.gets) == sorted([*existing[:2], *missing])
+    assert conn.compute.listings == 0
+
+
+def test_lookup_error_is_not_a_missing_server():
+    existing = _ids(2)
+    conn = FakeConnection(existing)
+    conn.compute.error = HttpException('Policy does not allow this request')
+
+    with pytest.raises(HttpException):
+        get_servers_by_ids(conn, existing)
+
+
+def test_many_ids_come_from_the_listing():
+    existing = _ids(SERVER_LOOKUP_FILTER_MAX + 2)
+    missing = _ids(1)
+    conn = FakeConnection(existing + _ids(3))
+
+    lookup = get_servers_by_ids(conn, [*missing, *existing])
+
+    assert [server.id for server in lookup.servers] == existing
+    assert lookup.missing_ids == missing
+    assert conn.compute.gets == []
+    assert conn.compute.listings == 1
+
+
+def test_no_ids_make_no_request():
+    conn = FakeConnection(_ids(2))
+
+    assert get_servers_by_ids(conn, []) == ([], [])
+    assert (conn.compute.gets, conn.compute.listings) == ([], 0)
@@ -0,0 +1,164 @@
+import asyncio
+import contextlib
+import datetime
+import uuid
+
+import pytest
+
+import app.servers.sync_service as sync_service
+from app.openstack.models import ServerLookup
+from app.servers.models import ServerSyncState
+from app.servers.sync_service import ServerStateSynchronizer
+
+
+class FakeServer:
+    def __init__(self, server_id: str, updated_at: str, status: str = 'ACTIVE'):
+        self.id = server_id
+        self.updated_at = updated_at
+        self.status = status
+
+
+class FakeSyncTables:
+    # server, server_state and server_sync_state as the synchronizer sees them
+    def __init__(self, server_ids: list[str]):
+        self.server_ids = [uuid.UUID(server_id) for server_id in server_ids]
+        self.state = None
+        self.upserted = []
+        self.deleted = []
+
+    async def try_lock(self, session) -> bool:
+        return True
+
+    async def get_state(self, session):
+        return self.state
+
+    async def save_state(self, session, **values):
+        if self.state is None:
+            self.state = ServerSyncState(name='nova')
+        for key, value in values.items():
+            setattr(self.state, key, value)
+
+    async def get_all_server_ids(self, session):
+        return list(self.server_ids)
+
+    async def upsert(self, servers, session):
+        self.upserted.append([server.id for server in servers])
+
+    async def mark_deleted(self, server_ids, session):
+        self.deleted.append(list(server_ids))
+
+    async def delete_orphans(self, session):
+        pass
+
+
+class FakeNova:
+    def __init__(self, servers: list[FakeServer]):
+        self.servers = {server.id: server for server in servers}
+        self.calls = []
+
+    def get_servers_by_ids(self, conn, server_ids):
+        self.calls.append('full')
+        wanted = [str(server_id) for server_id in server_ids]
+        return ServerLookup(
+            [self.servers[server_id] for server_id in wanted if server_id in self.servers],
+            [server_id for server_id in wanted if server_id not in self.servers],
+        )
+
+    def get_servers_changed_since(self, conn, changes_since):
+        self.calls.append(changes_since)
+        since = datetime.datetime.fromisoformat(changes_since)
+        return [
+            server for server in self.servers.values()
+            if datetime.datetime.fromisoformat(server.updated_at) >= since
+        ]
+
+
+class FakeConnectionManager:
+    def get_connection(self):
+        return None
+
+
+def _ids(count: int) -> list[str]:
+    return [str(uuid.uuid4()) for _ in range(count)]
+
+
+@pytest.fixture
+def sync(monkeypatch):
+    def setup(server_ids: list[str], servers: list[FakeServer]) -> (FakeSyncTables, FakeNova):
+        tables = FakeSyncTables(server_ids)
+        nova = FakeNova(servers)
+        monkeypatch.setattr(sync_service, 'async_session_maker', contextlib.nullcontext)
+        monkeypatch.setattr(sync_service, 'connection_manager', FakeConnectionManager())
+        monkeypatch.setattr(sync_service.db, 'try_lock_server_sync', tables.try_lock)
+        monkeypatch.setattr(sync_service.db, 'get_server_sync_state', tables.get_state)
+        monkeypatch.setattr(sync_service.db, 'save_server_sync_state', tables.save_state)
+        monkeypatch.setattr(sync_service.db, 'get_all_server_ids', tables.get_all_server_ids)
+        monkeypatch.setattr(sync_service.db, 'upsert_server_states', tables.upsert)
+        monkeypatch.setattr(sync_service.db, 'mark_server_states_deleted', tables.mark_deleted)
+        monkeypatch.setattr(sync_service.db, 'delete_orphan_server_states', tables.delete_orphans)
+        monkeypatch.setattr(sync_service.openstack, 'get_servers_by_ids', nova.get_servers_by_ids)
+        monkeypatch.setattr(
+            sync_service.openstack,
+            'get_servers_changed_since',
+            nova.get_servers_changed_since,
+        )
+        return tables, nova
+
+    return setup
+
+
+def _synchronizer() -> ServerStateSynchronizer:
+    # every call is a cycle of its own
+    return ServerStateSynchronizer(interval=0, full_sync_interval=3600)
+
+
+def test_empty_project_moves_on_to_changes_since(sync):
+    tables, nova = sync([], [])
+    synchronizer = _synchronizer()
+
+    asyncio.run(synchronizer.sync())
+    assert nova.calls == ['full']
+    assert tables.state.high_water_mark == tables.state.last_full_sync_at
+
+    asyncio.run(synchronizer.sync())
+    assert nova.calls == ['full', tables.state.high_water_mark.isoformat()]
+
+
+def test_full_sync_tombstones_servers_nova_no_longer_has(sync):
+    live, gone = _ids(2), _ids(1)
+    tables, nova = sync(live + gone, [
+        FakeServer(live[0], '2026-10-18T09:00:00+00:00'),
+        FakeServer(live[1], '2026-10-18T09:30:00+00:00'),
+    ])
+
+    asyncio.run(_synchronizer().sync())
+
+    assert tables.upserted == [live]
+    assert tables.deleted == [gone]
+    assert tables.state.high_water_mark.isoformat() == '2026-10-18T09:30:00+00:00'
+
+
+def test_changes_since_sync_follows_the_high_water_mark(sync):
+    known, other_project = _ids(2), _ids(1)
+    tables, nova = sync(known, [
+        FakeServer(known[0], '2026-10-18T09:00:00+00:00'),
+        FakeServer(known[1], '2026-10-18T09:30:00+00:00'),
+    ])
+    synchronizer = _synchronizer()
+    asyncio.run(synchronizer.sync())
+
+    # one server is deleted, another project's server changes later still
+    nova.servers[known[0]] = FakeServer(known[0], '2026-10-18T10:00:00+00:00', 'DELETED')
+    nova.servers[other_project[0]] = FakeServer(other_project[0], '2026-10-18T10:15:00+00:00')
+    asyncio.run(synchronizer.sync())
+
+    assert nova.calls == ['full', '2026-10-18T09:30:00+00:00']
+    # changes-since is inclusive, the server at the old mark comes again
+    assert tables.upserted == [known, known]
+    assert tables.deleted == [[]]
+    assert tables.state.high_water_mark.isoformat() == '2026-10-18T10:15:00+00:00'
+
+    asyncio.run(synchronizer.sync())
+    assert nova.calls[-1] == '2026-10-18T10:15:00+00:00'
+    assert tables.upserted[-1] == []
+    assert tables.state.high_water_mark.isoformat() == '2026-10-18T10:15:00+00:00'
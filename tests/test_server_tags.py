@@ -0,0 +1,136 @@
+import asyncio
+import contextlib
+import uuid
+
+import pytest
+from sqlalchemy.sql.elements import BindParameter, Cast
+from sqlalchemy.sql.functions import FunctionElement
+
+import app.servers.db_service as db
+import app.servers.tag_service as tag_service
+from app.servers.db_service import TAG_ADD, TAG_REMOVE
+from app.servers.tag_service import TagWriter
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+
+    async def commit(self):
+        self.commits += 1
+
+
+def _evaluate(expression, stored: list[str]):
+    # what postgres makes of the SET expression for a row holding `stored`
+    if isinstance(expression, BindParameter):
+        return expression.value
+    if isinstance(expression, Cast):
+        return _evaluate(expression.clause, stored)
+    if not isinstance(expression, FunctionElement):
+        return stored
+
+    args = [_evaluate(argument, stored) for argument in expression.clauses]
+    if expression.name == 'coalesce':
+        return next((argument for argument in args if argument is not None), None)
+    tags, tag = args
+    if tags is None:
+        return None
+    if expression.name == 'array_remove':
+        return [item for item in tags if item != tag]
+    if expression.name == 'array_append':
+        return [*tags, tag]
+    raise AssertionError(f'unexpected function {expression.name}')
+
+
+def _tag_updates(changes: dict) -> RecordingSession:
+    session = RecordingSession()
+    asyncio.run(db.update_server_tags(changes, session))
+    return session
+
+
+def test_tag_changes_apply_to_the_stored_row():
+    server_id = uuid.uuid4()
+    session = _tag_updates({server_id: [
+        (TAG_ADD, 'loading'),
+        (TAG_REMOVE, 'error'),
+        (TAG_ADD, 'torch'),
+        (TAG_REMOVE, 'loading'),
+    ]})
+
+    statement, = session.statements
+    tags = statement._values[db.Server.tags.property.columns[0]]
+    # the update holds no list read earlier, it works on whatever the row has by then
+    assert _evaluate(tags, ['error', 'grafana']) == ['grafana', 'torch']
+    assert _evaluate(tags, ['torch']) == ['torch']
+    assert _evaluate(tags, None) == ['torch']
+    assert session.commits == 1
+
+
+def test_every_server_gets_its_own_update_in_one_transaction():
+    session = _tag_updates({
+        uuid.uuid4(): [(TAG_ADD, 'grafana')],
+        uuid.uuid4(): [(TAG_REMOVE, 'grafana')],
+    })
+
+    assert len(session.statements) == 2
+    assert session.commits == 1
+
+
+class FakeTagTable:
+    def __init__(self):
+        self.writes = []
+        self.error = None
+
+    async def update_server_tags(self, changes, session):
+        if self.error is not None:
+            raise self.error
+        self.writes.append(changes)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeTagTable()
+    monkeypatch.setattr(tag_service, 'async_session_maker', contextlib.nullcontext)
+    monkeypatch.setattr(tag_service.db, 'update_server_tags', table.update_server_tags)
+    return table
+
+
+def test_changes_within_the_window_are_written_together(table):
+    first, second = uuid.uuid4(), uuid.uuid4()
+
+    async def run():
+        writer = TagWriter(delay=0.01)
+        await asyncio.gather(
+            writer.add(first, 'loading'),
+            writer.update(second, [(TAG_ADD, 'torch'), (TAG_REMOVE, 'loading')]),
+            writer.remove(first, 'loading'),
+        )
+        await writer.add(first, 'error')
+
+    asyncio.run(run())
+
+    assert table.writes == [
+        {
+            first: [(TAG_ADD, 'loading'), (TAG_REMOVE, 'loading')],
+            second: [(TAG_ADD, 'torch'), (TAG_REMOVE, 'loading')],
+        },
+        {first: [(TAG_ADD, 'error')]},
+    ]
+
+
+def test_failed_write_reaches_every_waiter(table):
+    table.error = RuntimeError('database is gone')
+
+    async def run():
+        writer = TagWriter(delay=0.01)
+        return await asyncio.gather(
+            writer.add(uuid.uuid4(), 'loading'),
+            writer.add(uuid.uuid4(), 'loading'),
+            return_exceptions=True,
+        )
+
+    assert [str(result) for result in asyncio.run(run())] == ['database is gone'] * 2